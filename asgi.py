@@ -0,0 +1,11 @@
+import uvicorn
+
+from controller.async_book_controller import AsyncBookController
+
+# The same API as main.py, served by an ASGI server on the async repositories
+app = AsyncBookController().app
+HOST = "0.0.0.0"
+PORT = 8574
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=HOST, port=PORT)
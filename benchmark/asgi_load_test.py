@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from benchmark.load_test import (AUTHORS_COUNT, DEFAULT_WORKLOAD_MIX, GENRES, LIST_PAGE_SIZE, SEED_CHUNK_SIZE,
+                                 get_endpoint_results, get_random_book, parse_workload_mix)
+from benchmark.local_databases import (RESET_HELP, connect_async_mongo, connect_mongo, reset_mongo,
+                                       reset_postgres, start_postgres)
+
+
+# The workload of load_test.py as coroutines on one event loop, each worker awaits one request at a time
+class AsyncWorker:
+    def __init__(self, client: httpx.AsyncClient, worker_index: int, operations: int, workload_mix: dict[str, int],
+                 read_methods: list[str], book_ids: list[int], seed: int):
+        self.client = client
+        self.worker_index = worker_index
+        self.operations = operations
+        self.operation_names = list(workload_mix)
+        self.operation_weights = list(workload_mix.values())
+        self.read_methods = read_methods
+        # Shared by the workers, a single event loop needs no lock around it
+        self.book_ids = book_ids
+        self.rng = random.Random(seed * 1000 + worker_index)
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def run(self):
+        for operation_index in range(self.operations):
+            operation = self.rng.choices(self.operation_names, self.operation_weights)[0]
+            await getattr(self, f"run_{operation}")(operation_index)
+
+    async def request(self, endpoint: str, method: str, url: str, json_body=None, ok_statuses=(200,)):
+        start = time.perf_counter()
+        response = await self.client.request(method, url, json=json_body)
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if response.status_code not in ok_statuses:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+    async def run_create(self, operation_index: int):
+        book = get_random_book(self.rng, f"Load test book {self.worker_index}-{operation_index}")
+        response = await self.request("POST /book", "POST", "/book", book)
+        if response.status_code == 200:
+            self.book_ids.append(response.json()["result"])
+
+    async def run_get(self, operation_index: int):
+        persistence_method = self.rng.choice(self.read_methods)
+        if self.book_ids:
+            book_id = self.rng.choice(self.book_ids)
+            await self.request(f"GET /book {persistence_method}", "GET",
+                               f"/book?id={book_id}&persistenceMethod={persistence_method}")
+
+    async def run_list(self, operation_index: int):
+        persistence_method = self.rng.choice(self.read_methods)
+        filters = [f"persistenceMethod={persistence_method}", f"limit={LIST_PAGE_SIZE}"]
+        filter_kind = self.rng.randrange(3)
+        if filter_kind == 0:
+            filters.append(f"author=Author%20{self.rng.randrange(AUTHORS_COUNT)}")
+        elif filter_kind == 1:
+            price_from = self.rng.randint(0, 450)
+            filters += [f"price-bigger-than={price_from}", f"price-less-than={price_from + 50}"]
+        else:
+            filters.append(f"genres={self.rng.choice(GENRES)}")
+        await self.request(f"GET /books {persistence_method}", "GET", "/books?" + "&".join(filters))
+
+    async def run_update(self, operation_index: int):
+        if self.book_ids:
+            book_id = self.rng.choice(self.book_ids)
+            await self.request("PUT /book", "PUT", f"/book?id={book_id}&price={self.rng.randint(0, 500)}",
+                               ok_statuses=(200, 404))
+
+    async def run_delete(self, operation_index: int):
+        if self.book_ids:
+            index = self.rng.randrange(len(self.book_ids))
+            self.book_ids[index], self.book_ids[-1] = self.book_ids[-1], self.book_ids[index]
+            await self.request("DELETE /book", "DELETE", f"/book?id={self.book_ids.pop()}")
+
+
+async def seed_catalogue(client: httpx.AsyncClient, books: int, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    book_ids = []
+    for chunk_start in range(0, books, SEED_CHUNK_SIZE):
+        chunk = [get_random_book(rng, f"Seed book {index}")
+                 for index in range(chunk_start, min(books, chunk_start + SEED_CHUNK_SIZE))]
+        response = await client.post("/books/bulk", json=chunk)
+        book_ids.extend(item["result"] for item in response.json()["result"] if "result" in item)
+    return book_ids
+
+
+async def run_load_test(arguments: argparse.Namespace, postgres_url: str) -> dict:
+    from controller.async_book_controller import AsyncBookController
+
+    book_controller = AsyncBookController()
+    app = book_controller.app
+    workload_mix = parse_workload_mix(arguments.mix)
+    read_methods = (arguments.read_methods.split(",") if arguments.read_methods
+                    else ["POSTGRES", "MEMORY"] if arguments.mongomock else ["POSTGRES", "MONGO", "MEMORY"])
+
+    # In-process like the Flask test client of load_test.py, through the app's lifespan. App errors are 500s.
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://book-store") as client:
+        await asyncio.to_thread(book_controller.book_logic.wait_until_ready)
+
+        seed_start = time.perf_counter()
+        book_ids = await seed_catalogue(client, arguments.books, arguments.seed)
+        seed_seconds = time.perf_counter() - seed_start
+
+        workers = [AsyncWorker(client, worker_index, arguments.operations, workload_mix, read_methods, book_ids,
+                               arguments.seed)
+                   for worker_index in range(arguments.concurrency)]
+        start = time.perf_counter()
+        await asyncio.gather(*(worker.run() for worker in workers))
+        elapsed_seconds = time.perf_counter() - start
+
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for worker in workers:
+        for endpoint, endpoint_latencies in worker.latencies.items():
+            latencies.setdefault(endpoint, []).extend(endpoint_latencies)
+        for endpoint, endpoint_errors in worker.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + endpoint_errors
+
+    all_latencies = [latency for endpoint_latencies in latencies.values() for latency in endpoint_latencies]
+    return {
+        "config": {
+            "app": "asgi",
+            "books": arguments.books,
+            "operationsPerWorker": arguments.operations,
+            "concurrency": arguments.concurrency,
+            "mix": workload_mix,
+            "readMethods": read_methods,
+            "seed": arguments.seed,
+            "postgres": postgres_url.split("@")[-1],
+            "mongo": "mongomock" if arguments.mongomock else "MONGO_URL"
+        },
+        "seedSeconds": seed_seconds,
+        "elapsedSeconds": elapsed_seconds,
+        "total": get_endpoint_results(all_latencies, sum(errors.values()), elapsed_seconds),
+        "endpoints": {endpoint: get_endpoint_results(endpoint_latencies, errors.get(endpoint, 0), elapsed_seconds)
+                      for endpoint, endpoint_latencies in sorted(latencies.items())}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="The mixed workload of load_test.py against the ASGI app on local "
+                                                 "databases, prints throughput and latency percentiles as JSON")
+    parser.add_argument("--books", type=int, default=10000, help="catalogue size seeded before the run")
+    parser.add_argument("--operations", type=int, default=2000, help="operations per worker")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent workers")
+    parser.add_argument("--mix", default=DEFAULT_WORKLOAD_MIX, help="operation weights, e.g. " + DEFAULT_WORKLOAD_MIX)
+    parser.add_argument("--read-methods", default=None,
+                        help="comma-separated persistence methods for reads, "
+                             "POSTGRES,MEMORY with mongomock and POSTGRES,MONGO,MEMORY otherwise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use in-process mongomock clients instead of MONGO_URL "
+                             "(they have no collations, so Mongo listings can't be read from them)")
+    parser.add_argument("--reset", action="store_true", help=RESET_HELP)
+    arguments = parser.parse_args()
+
+    # POSTGRES_URL has to be set before the app modules are imported
+    postgres_url = start_postgres()
+    connect_mongo(arguments.mongomock)
+    connect_async_mongo(arguments.mongomock)
+    reset_postgres(arguments.reset)
+    reset_mongo(arguments.reset)
+
+    print(json.dumps(asyncio.run(run_load_test(arguments, postgres_url)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+from benchmark.load_test import GENRES, get_random_book, seed_catalogue
+from benchmark.local_databases import (RESET_HELP, connect_async_mongo, connect_mongo, reset_mongo,
+                                       reset_postgres, start_postgres)
+
+# Sleep of the probe measuring how long the event loop is kept from running during a warm-up
+LOOP_PROBE_SECONDS = 0.001
+SERVER_ERROR_STATUS = 500
+
+
+def get_read_urls(rng: random.Random, book_ids: list[int], books: int, read_methods: list[str],
+                  listing_methods: list[str]) -> list[str]:
+    book_id = rng.choice(book_ids)
+    author = get_random_book(rng, "")["author"].replace(" ", "%20")
+    genre = rng.choice(GENRES)
+    query = f"book%20{rng.randrange(books)}"
+    urls = ["/books/stats?source=summary&top=5", "/books/stats?top=0", "/books/total?persistenceMethod=X",
+            "/books?persistenceMethod=X", f"/book?id={book_id}&persistenceMethod=X",
+            "/books/search?q=ab&persistenceMethod=POSTGRES"]
+    for persistence_method in read_methods:
+        urls += [f"/book?id={book_id}&persistenceMethod={persistence_method}",
+                 f"/books/total?persistenceMethod={persistence_method}",
+                 f"/books/stats?persistenceMethod={persistence_method}&top=5"]
+    for persistence_method in listing_methods:
+        urls += [f"/books?persistenceMethod={persistence_method}&author={author}&limit=20",
+                 f"/books?persistenceMethod={persistence_method}&genres={genre}&price-less-than=100"
+                 f"&fields=id,title,price",
+                 f"/books?persistenceMethod={persistence_method}&author={author}&stream=true&fields=id,genres",
+                 f"/books/search?q={query}&persistenceMethod={persistence_method}&limit=10"]
+    return urls
+
+
+async def get_mismatches(client: httpx.AsyncClient, urls: list[str], flask_responses: dict) -> list[dict]:
+    mismatches = []
+    for url in urls:
+        response = await client.get(url)
+        asgi_response = (response.status_code, response.content, response.headers.get("content-type"))
+        # Each framework renders its own error page, only their statuses are compared
+        if response.status_code >= SERVER_ERROR_STATUS:
+            is_same = response.status_code == flask_responses[url][0]
+        else:
+            is_same = asgi_response == flask_responses[url]
+        if not is_same:
+            mismatches.append({"url": url,
+                               "flask": [flask_responses[url][0], flask_responses[url][1][:200].decode()],
+                               "asgi": [asgi_response[0], asgi_response[1][:200].decode()]})
+    return mismatches
+
+
+# The longest the loop went without running the probe until `task` is done
+async def get_max_loop_stall_seconds(task: asyncio.Task) -> float:
+    max_stall_seconds = 0.0
+    while not task.done():
+        probe_start = time.perf_counter()
+        await asyncio.sleep(LOOP_PROBE_SECONDS)
+        max_stall_seconds = max(max_stall_seconds, time.perf_counter() - probe_start - LOOP_PROBE_SECONDS)
+    return max_stall_seconds
+
+
+# Runs the warm-up again while the memory reads are repeated
+async def check_during_warm_up(client: httpx.AsyncClient, book_logic, urls: list[str],
+                               flask_responses: dict) -> tuple[list[dict], float]:
+    warm_up = asyncio.create_task(book_logic.warm_up_memory_book_repository())
+    max_stall_seconds, mismatches = await asyncio.gather(get_max_loop_stall_seconds(warm_up),
+                                                         get_mismatches(client, urls, flask_responses))
+    await warm_up
+    return mismatches, max_stall_seconds
+
+
+async def run_parity_check(urls: list[str], memory_urls: list[str], flask_responses: dict) -> dict:
+    from controller.async_book_controller import AsyncBookController
+
+    book_controller = AsyncBookController()
+    app = book_controller.app
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://book-store") as client:
+        await asyncio.to_thread(book_controller.book_logic.wait_until_ready)
+        mismatches = await get_mismatches(client, urls, flask_responses)
+        warm_up_mismatches, max_stall_seconds = await check_during_warm_up(client, book_controller.book_logic,
+                                                                           memory_urls, flask_responses)
+
+    return {
+        "checkedUrls": len(urls),
+        "mismatches": mismatches,
+        "warmUpMismatches": warm_up_mismatches,
+        "warmUpMaxLoopStallMs": max_stall_seconds * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the responses of the Flask and the ASGI app to the same "
+                                                 "reads on local databases, prints the mismatches as JSON and "
+                                                 "exits with 1 when there are any")
+    parser.add_argument("--books", type=int, default=10000, help="catalogue size seeded before the check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use in-process mongomock clients instead of MONGO_URL "
+                             "(they have no collations, so Mongo listings and searches aren't compared)")
+    parser.add_argument("--reset", action="store_true", help=RESET_HELP)
+    arguments = parser.parse_args()
+
+    # POSTGRES_URL has to be set before the app modules are imported
+    start_postgres()
+    from flask import Flask
+    from controller.book_controller import BookController
+
+    connect_mongo(arguments.mongomock)
+    connect_async_mongo(arguments.mongomock)
+    reset_postgres(arguments.reset)
+    reset_mongo(arguments.reset)
+
+    app = Flask(__name__)
+    BookController(app).book_logic.wait_until_ready()
+    book_ids = seed_catalogue(app, arguments.books, arguments.seed)
+
+    # AUTO is left out of the listings, with mongomock it can be routed to Mongo
+    listing_methods = ["POSTGRES", "MEMORY"] if arguments.mongomock else ["POSTGRES", "MONGO", "MEMORY", "AUTO"]
+    urls = get_read_urls(random.Random(arguments.seed), book_ids, arguments.books,
+                         ["POSTGRES", "MONGO", "MEMORY", "AUTO"], listing_methods)
+    memory_urls = [url for url in urls if "persistenceMethod=MEMORY" in url]
+    client = app.test_client()
+    flask_responses = {url: (response.status_code, response.data, response.content_type)
+                       for url in urls for response in [client.get(url)]}
+
+    results = asyncio.run(run_parity_check(urls, memory_urls, flask_responses))
+    print(json.dumps(results, indent=2))
+    if results["mismatches"] or results["warmUpMismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
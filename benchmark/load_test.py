@@ -0,0 +1,239 @@
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+
+from benchmark.local_databases import RESET_HELP, connect_mongo, reset_mongo, reset_postgres, start_postgres
+
+# Relative weights of the workload operations
+DEFAULT_WORKLOAD_MIX = "create=1,get=5,list=3,update=1,delete=1"
+SEED_CHUNK_SIZE = 1000
+LIST_PAGE_SIZE = 50
+GENRES = ["SCI_FI", "NOVEL", "HISTORY", "MANGA", "ROMANCE", "PROFESSIONAL"]
+AUTHORS_COUNT = 200
+
+
+def parse_workload_mix(workload_mix: str) -> dict[str, int]:
+    return {operation: int(weight)
+            for operation, weight in (item.split("=") for item in workload_mix.split(","))}
+
+
+def get_percentile(sorted_latencies: list[float], percentile: float) -> float:
+    index = min(len(sorted_latencies) - 1, int(round(percentile / 100 * (len(sorted_latencies) - 1))))
+    return sorted_latencies[index]
+
+
+def get_random_book(rng: random.Random, title: str) -> dict:
+    return {
+        "title": title,
+        "author": f"Author {rng.randrange(AUTHORS_COUNT)}",
+        "year": rng.randint(1940, 2100),
+        "price": rng.randint(0, 500),
+        "genres": rng.sample(GENRES, rng.randint(1, 2))
+    }
+
+
+# Ids of the live books, shared by the workers so lookups, updates and deletes hit existing books
+class BookIds:
+    def __init__(self, ids: list[int]):
+        self.ids = ids
+        self.lock = threading.Lock()
+
+    def add(self, id: int):
+        with self.lock:
+            self.ids.append(id)
+
+    def choose(self, rng: random.Random) -> int | None:
+        with self.lock:
+            return rng.choice(self.ids) if self.ids else None
+
+    def pop(self, rng: random.Random) -> int | None:
+        with self.lock:
+            if not self.ids:
+                return None
+            index = rng.randrange(len(self.ids))
+            self.ids[index], self.ids[-1] = self.ids[-1], self.ids[index]
+            return self.ids.pop()
+
+
+class Worker(threading.Thread):
+    def __init__(self, app, worker_index: int, operations: int, workload_mix: dict[str, int],
+                 read_methods: list[str], book_ids: BookIds, seed: int, start_barrier: threading.Barrier):
+        super().__init__(name=f"load-test-worker-{worker_index}")
+        self.client = app.test_client()
+        self.worker_index = worker_index
+        self.operations = operations
+        self.operation_names = list(workload_mix)
+        self.operation_weights = list(workload_mix.values())
+        self.read_methods = read_methods
+        self.book_ids = book_ids
+        self.rng = random.Random(seed * 1000 + worker_index)
+        self.start_barrier = start_barrier
+        # endpoint -> latencies in seconds, and endpoint -> failed requests
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def run(self):
+        self.start_barrier.wait()
+        for operation_index in range(self.operations):
+            operation = self.rng.choices(self.operation_names, self.operation_weights)[0]
+            getattr(self, f"run_{operation}")(operation_index)
+
+    def request(self, endpoint: str, method: str, url: str, json_body=None, ok_statuses=(200,)):
+        start = time.perf_counter()
+        response = self.client.open(url, method=method, json=json_body)
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if response.status_code not in ok_statuses:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+    def run_create(self, operation_index: int):
+        book = get_random_book(self.rng, f"Load test book {self.worker_index}-{operation_index}")
+        response = self.request("POST /book", "POST", "/book", book)
+        if response.status_code == 200:
+            self.book_ids.add(response.json["result"])
+
+    def run_get(self, operation_index: int):
+        book_id = self.book_ids.choose(self.rng)
+        persistence_method = self.rng.choice(self.read_methods)
+        if book_id is not None:
+            self.request(f"GET /book {persistence_method}", "GET",
+                         f"/book?id={book_id}&persistenceMethod={persistence_method}")
+
+    def run_list(self, operation_index: int):
+        persistence_method = self.rng.choice(self.read_methods)
+        filters = [f"persistenceMethod={persistence_method}", f"limit={LIST_PAGE_SIZE}"]
+        filter_kind = self.rng.randrange(3)
+        if filter_kind == 0:
+            filters.append(f"author=Author%20{self.rng.randrange(AUTHORS_COUNT)}")
+        elif filter_kind == 1:
+            price_from = self.rng.randint(0, 450)
+            filters += [f"price-bigger-than={price_from}", f"price-less-than={price_from + 50}"]
+        else:
+            filters.append(f"genres={self.rng.choice(GENRES)}")
+        self.request(f"GET /books {persistence_method}", "GET", "/books?" + "&".join(filters))
+
+    def run_update(self, operation_index: int):
+        book_id = self.book_ids.choose(self.rng)
+        if book_id is not None:
+            # A concurrent delete may win the race, so 404 is an expected answer
+            self.request("PUT /book", "PUT", f"/book?id={book_id}&price={self.rng.randint(0, 500)}",
+                         ok_statuses=(200, 404))
+
+    def run_delete(self, operation_index: int):
+        book_id = self.book_ids.pop(self.rng)
+        if book_id is not None:
+            self.request("DELETE /book", "DELETE", f"/book?id={book_id}")
+
+
+def seed_catalogue(app, books: int, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    client = app.test_client()
+    book_ids = []
+    for chunk_start in range(0, books, SEED_CHUNK_SIZE):
+        chunk = [get_random_book(rng, f"Seed book {index}")
+                 for index in range(chunk_start, min(books, chunk_start + SEED_CHUNK_SIZE))]
+        response = client.post("/books/bulk", json=chunk)
+        book_ids.extend(item["result"] for item in response.json["result"] if "result" in item)
+    return book_ids
+
+
+def get_endpoint_results(latencies: list[float], errors: int, elapsed_seconds: float) -> dict:
+    sorted_latencies = sorted(latencies)
+    return {
+        "requests": len(sorted_latencies),
+        "errors": errors,
+        "throughputPerSecond": len(sorted_latencies) / elapsed_seconds,
+        "meanMs": statistics.fmean(sorted_latencies) * 1000,
+        "p50Ms": get_percentile(sorted_latencies, 50) * 1000,
+        "p95Ms": get_percentile(sorted_latencies, 95) * 1000,
+        "p99Ms": get_percentile(sorted_latencies, 99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed workload against the Flask app on local databases, "
+                                                 "prints throughput and latency percentiles per endpoint as JSON")
+    parser.add_argument("--books", type=int, default=10000, help="catalogue size seeded before the run")
+    parser.add_argument("--operations", type=int, default=2000, help="operations per worker")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent workers")
+    parser.add_argument("--mix", default=DEFAULT_WORKLOAD_MIX, help="operation weights, e.g. " + DEFAULT_WORKLOAD_MIX)
+    parser.add_argument("--read-methods", default=None,
+                        help="comma-separated persistence methods for reads, "
+                             "POSTGRES,MEMORY with mongomock and POSTGRES,MONGO,MEMORY otherwise")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use an in-process mongomock client instead of MONGO_URL "
+                             "(it has no collations, so Mongo listings can't be read from it)")
+    parser.add_argument("--reset", action="store_true", help=RESET_HELP)
+    arguments = parser.parse_args()
+
+    # POSTGRES_URL has to be set before the app modules are imported
+    postgres_url = start_postgres()
+    from flask import Flask
+    from controller.book_controller import BookController
+
+    connect_mongo(arguments.mongomock)
+    reset_postgres(arguments.reset)
+    reset_mongo(arguments.reset)
+
+    app = Flask(__name__)
+    book_controller = BookController(app)
+    book_controller.book_logic.wait_until_ready()
+
+    workload_mix = parse_workload_mix(arguments.mix)
+    read_methods = (arguments.read_methods.split(",") if arguments.read_methods
+                    else ["POSTGRES", "MEMORY"] if arguments.mongomock else ["POSTGRES", "MONGO", "MEMORY"])
+
+    seed_start = time.perf_counter()
+    book_ids = BookIds(seed_catalogue(app, arguments.books, arguments.seed))
+    seed_seconds = time.perf_counter() - seed_start
+
+    start_barrier = threading.Barrier(arguments.concurrency + 1)
+    workers = [Worker(app, worker_index, arguments.operations, workload_mix, read_methods, book_ids,
+                      arguments.seed, start_barrier)
+               for worker_index in range(arguments.concurrency)]
+    for worker in workers:
+        worker.start()
+
+    start_barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed_seconds = time.perf_counter() - start
+
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for worker in workers:
+        for endpoint, endpoint_latencies in worker.latencies.items():
+            latencies.setdefault(endpoint, []).extend(endpoint_latencies)
+        for endpoint, endpoint_errors in worker.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + endpoint_errors
+
+    all_latencies = [latency for endpoint_latencies in latencies.values() for latency in endpoint_latencies]
+    results = {
+        "config": {
+            "books": arguments.books,
+            "operationsPerWorker": arguments.operations,
+            "concurrency": arguments.concurrency,
+            "mix": workload_mix,
+            "readMethods": read_methods,
+            "seed": arguments.seed,
+            # Without the credentials
+            "postgres": postgres_url.split("@")[-1],
+            "mongo": "mongomock" if arguments.mongomock else "MONGO_URL"
+        },
+        "seedSeconds": seed_seconds,
+        "elapsedSeconds": elapsed_seconds,
+        "total": get_endpoint_results(all_latencies, sum(errors.values()), elapsed_seconds),
+        "endpoints": {endpoint: get_endpoint_results(endpoint_latencies, errors.get(endpoint, 0), elapsed_seconds)
+                      for endpoint, endpoint_latencies in sorted(latencies.items())}
+    }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+
+import mongoengine as me
+
+# Local stand-ins for the compose services. Postgres is a given POSTGRES_URL or an embedded server
+# (the pgserver package), Mongo a given MONGO_URL or an in-process mongomock client. The benchmarks reset
+# the databases they seed, a given POSTGRES_URL or MONGO_URL only with --reset.
+POSTGRES_DATA_DIR = os.environ.get("BENCHMARK_POSTGRES_DATA_DIR",
+                                   os.path.join(tempfile.gettempdir(), "book-store-benchmark-pgdata"))
+RESET_HELP = ("drop the books tables and collections even of a POSTGRES_URL or MONGO_URL database, "
+              "without it only the embedded Postgres and mongomock are reset")
+
+# Whether the databases are the throwaway ones started here, the only ones reset without --reset
+is_local_postgres = False
+is_local_mongo = False
+
+
+def start_postgres() -> str:
+    global is_local_postgres
+
+    # Must run before the repository modules are imported, they create the engine from POSTGRES_URL
+    if "POSTGRES_URL" not in os.environ:
+        import pgserver
+        postgres_server = pgserver.get_server(POSTGRES_DATA_DIR, cleanup_mode=None)
+        os.environ["POSTGRES_URL"] = postgres_server.get_uri()
+        is_local_postgres = True
+    return os.environ["POSTGRES_URL"]
+
+
+def connect_mongo(use_mongomock: bool):
+    global is_local_mongo
+    from repository.mongo_book_repository import DB_NAME, MONGO_URL, Book
+
+    is_local_mongo = use_mongomock
+    me.disconnect()
+    if use_mongomock:
+        import mongomock
+        me.connect(DB_NAME, host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    else:
+        me.connect(host=MONGO_URL)
+    Book._collection = None
+
+
+def connect_async_mongo(use_mongomock: bool):
+    # After connect_mongo, the mongomock stand-in of the motor client shares the synchronous client's data
+    from repository import async_mongo_book_repository
+    from repository.mongo_book_repository import Book
+
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        async_mongo_book_repository.client = AsyncMongoMockClient(mock_mongo_client=Book._get_db().client)
+
+
+def reset_postgres(allow_external: bool = False):
+    if not is_local_postgres and not allow_external:
+        sys.exit("Not resetting the POSTGRES_URL database, pass --reset to drop its books tables")
+
+    # An empty books table in the pre-migration schema the compose image ships with
+    from sqlalchemy import text
+    from repository.postgres_book_repository import DB_TABLE_NAME, engine
+    from repository.postgres_id_allocator import ID_SEQUENCE_NAME
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {DB_TABLE_NAME}, book_totals, book_outbox, "
+                                f"book_outbox_dead_letters CASCADE"))
+        connection.execute(text(f"DROP SEQUENCE IF EXISTS {ID_SEQUENCE_NAME}"))
+        connection.execute(text(
+            f"CREATE TABLE {DB_TABLE_NAME} (rawid integer PRIMARY KEY, title varchar NOT NULL, "
+            f"author varchar NOT NULL, year integer NOT NULL, price integer NOT NULL, genres varchar NOT NULL)"
+        ))
+
+
+def reset_mongo(allow_external: bool = False):
+    if not is_local_mongo and not allow_external:
+        sys.exit("Not resetting the MONGO_URL database, pass --reset to drop its books collections")
+
+    from repository.mongo_book_repository import Book, get_totals_collection
+
+    Book.drop_collection()
+    get_totals_collection().drop()
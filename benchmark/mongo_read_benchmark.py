@@ -0,0 +1,107 @@
+import argparse
+import json
+import random
+import time
+
+from benchmark.local_databases import RESET_HELP, connect_mongo, reset_mongo
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.genres_dto import Genres
+from repository.mongo_book_repository import Book, MongoBookRepository, get_book_dto
+
+# Runs against mongomock, or against MONGO_URL with --reset since the books collection is dropped
+GENRES = [genre.value for genre in Genres]
+
+
+def seed_books(books_count: int, allow_reset: bool) -> list[BookDTO]:
+    reset_mongo(allow_reset)
+    book_repository = MongoBookRepository()
+    book_repository.prepare()
+
+    book_dtos = [
+        BookDTO(id=rawid,
+                title=f"Book {rawid}",
+                author=f"Author {rawid % 100}",
+                year=random.randint(1940, 2100),
+                price=random.randint(0, 500),
+                genres=random.sample(GENRES, 2))
+        for rawid in range(1, books_count + 1)
+    ]
+    book_repository.create_books(book_dtos)
+    return book_dtos
+
+
+# The read path before the raw documents: full mongoengine documents copied into DTOs
+def odm_get_book_by_id(id: int):
+    return get_book_dto(Book.objects(rawid=id).first())
+
+
+def odm_get_book_by_title(title: str):
+    return get_book_dto(Book.objects(title__icontains=title).first())
+
+
+def odm_get_books(author: str):
+    return [get_book_dto(book) for book in Book.objects(author__iexact=author)]
+
+
+def time_per_request_us(function, arguments: list) -> float:
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start) / len(arguments) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of the Mongo read path, ODM vs raw documents")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-process mongomock client")
+    parser.add_argument("--reset", action="store_true", help=RESET_HELP)
+    arguments = parser.parse_args()
+
+    connect_mongo(arguments.mongomock)
+    book_dtos = seed_books(arguments.books, arguments.reset)
+    book_repository = MongoBookRepository()
+
+    sample = random.choices(book_dtos, k=arguments.requests)
+    ids = [book_dto.id for book_dto in sample]
+    titles = [book_dto.title.upper() for book_dto in sample]
+    authors = [book_dto.author for book_dto in sample[:max(1, arguments.requests // 10)]]
+
+    def raw_get_books(author: str):
+        book_filter_parameters = BookFilterParametersDTO(author=author,
+                                                         price_bigger_than=None,
+                                                         price_less_than=None,
+                                                         year_bigger_than=None,
+                                                         year_less_than=None,
+                                                         genres=None)
+        return book_repository.get_books(book_filter_parameters)
+
+    results = {
+        "books": arguments.books,
+        "requests": arguments.requests,
+        "mongomock": arguments.mongomock,
+        "perRequestMicroseconds": {
+            "getBookById": {
+                "odm": time_per_request_us(odm_get_book_by_id, ids),
+                "raw": time_per_request_us(book_repository.get_book_by_id, ids)
+            },
+            "getBookByTitle": {
+                "odm": time_per_request_us(odm_get_book_by_title, titles),
+                "raw": time_per_request_us(book_repository.get_book_by_title, titles)
+            }
+        }
+    }
+
+    # mongomock has no cursor collations, which the listing query needs
+    if not arguments.mongomock:
+        results["perRequestMicroseconds"]["getBooksByAuthor"] = {
+            "odm": time_per_request_us(odm_get_books, authors),
+            "raw": time_per_request_us(raw_get_books, authors)
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
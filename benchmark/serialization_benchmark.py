@@ -0,0 +1,97 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from controller.book_controller import RESULT_KEY, get_book_response
+from controller.book_json_provider import BookJSONProvider, orjson
+from dto.book_dto import BookDTO
+from dto.genres_dto import Genres
+
+# Runs in process, no database needed
+GENRES = [genre.value for genre in Genres]
+
+
+# The DTO before __slots__, every instance carries its own attribute dict
+class DictBookDTO:
+    def __init__(self, id: int | None, title: str, author: str, year: int, price: int, genres: list):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.year = year
+        self.price = price
+        self.genres = genres
+
+
+def get_book_rows(books_count: int) -> list[tuple]:
+    return [(rawid, f"Book {rawid}", f"Author {rawid % 100}", random.randint(1940, 2100),
+             random.randint(0, 500), random.sample(GENRES, 2))
+            for rawid in range(1, books_count + 1)]
+
+
+def get_bytes_per_book(dto_class, book_rows: list[tuple]) -> float:
+    # The rows' values already exist, only the DTOs themselves are counted
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    book_dtos = [dto_class(*book_row) for book_row in book_rows]
+    end_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end_size - start_size) / len(book_dtos)
+
+
+def get_books_per_second(render, book_dtos: list, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        render(book_dtos)
+    return len(book_dtos) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Book listing serialization throughput and DTO memory, "
+                                                 "dict-backed DTOs and the stdlib provider vs slotted DTOs "
+                                                 "and the app's JSON provider")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=5)
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+    default_json_provider = DefaultJSONProvider(app)
+    book_json_provider = BookJSONProvider(app)
+    book_rows = get_book_rows(arguments.books)
+
+    # The listing response as GET /books builds it, before and after
+    def render_dict_books(book_dtos: list[DictBookDTO]):
+        return default_json_provider.response({RESULT_KEY: [book_dto.__dict__ for book_dto in book_dtos]})
+
+    def render_slotted_books(book_dtos: list[BookDTO]):
+        return book_json_provider.response({RESULT_KEY: [get_book_response(book_dto, None)
+                                                         for book_dto in book_dtos]})
+
+    with app.app_context():
+        dict_books = [DictBookDTO(*book_row) for book_row in book_rows]
+        slotted_books = [BookDTO(*book_row) for book_row in book_rows]
+        if render_dict_books(dict_books).get_json() != render_slotted_books(slotted_books).get_json():
+            raise AssertionError("Both paths should render the same listing")
+
+        results = {
+            "books": arguments.books,
+            "orjson": orjson is not None,
+            "bytesPerBook": {
+                "dict": get_bytes_per_book(DictBookDTO, book_rows),
+                "slotted": get_bytes_per_book(BookDTO, book_rows)
+            },
+            "serializedBooksPerSecond": {
+                "dict": get_books_per_second(render_dict_books, dict_books, arguments.repeats),
+                "slotted": get_books_per_second(render_slotted_books, slotted_books, arguments.repeats)
+            }
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import time
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from controller.book_controller import (ERROR_MESSAGE_KEY, MEMORY_LOADING_ERROR, MIN_SEARCH_QUERY_LENGTH,
+                                        NDJSON_MIMETYPE, RESULT_KEY, STATS_DATABASE_SOURCE, STATS_SUMMARY_SOURCE,
+                                        UNMATCHED_ENDPOINT, convert_persistence_method, get_book_not_found_error,
+                                        get_book_response, get_book_stats_response, get_books_page_response,
+                                        get_books_query, get_bulk_books_to_create, get_bulk_request_error,
+                                        get_new_book_error, get_search_limit, get_title_exists_error,
+                                        get_top_authors, is_memory_loading, request_duration_histogram,
+                                        set_bulk_created_books)
+from controller.book_json_provider import encode_json_body, encode_json_line
+from dto.book_dto import BookDTO
+from enums.persistence_method import PersistenceMethod
+from logic.async_book_logic import AsyncBookLogic
+from metrics.metrics_registry import PROMETHEUS_CONTENT_TYPE, metrics_registry
+
+JSON_MIMETYPE = "application/json"
+
+
+def json_response(body, status: int = 200) -> Response:
+    return Response(encode_json_body(body), status, media_type=JSON_MIMETYPE)
+
+
+def is_stream_requested(request: Request) -> bool:
+    return (request.query_params.get('stream', '').lower() == "true"
+            or parse_accept_header(request.headers.get("accept"), MIMEAccept).best == NDJSON_MIMETYPE)
+
+
+def get_persistence_method(request: Request) -> PersistenceMethod | None:
+    # A missing parameter is a 400, like a missing key of Flask's request.args
+    if "persistenceMethod" not in request.query_params:
+        raise HTTPException(400)
+    return convert_persistence_method(request.query_params["persistenceMethod"])
+
+
+# Records every request in the same histogram as the Flask app, until the response starts
+class RequestDurationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                # The router puts the matched route in the scope, its path pattern keeps the series bounded
+                route = scope.get("route")
+                endpoint = route.path if route is not None else UNMATCHED_ENDPOINT
+                request_duration_histogram.observe((scope["method"], endpoint, message["status"]),
+                                                   time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+
+
+# The routes and responses of BookController as a Starlette (ASGI) app, on AsyncBookLogic
+class AsyncBookController:
+    def __init__(self):
+        self.book_logic = AsyncBookLogic()
+        self.app = Starlette(routes=self.get_routes(),
+                             middleware=[Middleware(RequestDurationMiddleware)],
+                             lifespan=self.lifespan)
+
+    @asynccontextmanager
+    async def lifespan(self, app: Starlette):
+        self.book_logic.start()
+        yield
+        await self.book_logic.close()
+
+    def get_routes(self) -> list[Route]:
+        return [
+            Route("/books/health", self.get_health, methods=["GET"]),
+            Route("/books/metrics", self.get_metrics, methods=["GET"]),
+            Route("/books/cache", self.get_cache_stats, methods=["GET"]),
+            Route("/books/routing", self.get_read_routing_stats, methods=["GET"]),
+            Route("/books/replication", self.get_replication_status, methods=["GET"]),
+            Route("/books/reconcile", self.reconcile_books, methods=["POST"]),
+            Route("/book", self.create_book, methods=["POST"]),
+            Route("/books/bulk", self.create_books, methods=["POST"]),
+            Route("/books/total", self.get_books_total, methods=["GET"]),
+            Route("/books", self.get_books, methods=["GET"]),
+            Route("/books/search", self.search_books, methods=["GET"]),
+            Route("/books/stats", self.get_book_stats, methods=["GET"]),
+            Route("/book", self.get_book, methods=["GET"]),
+            Route("/book", self.update_book_price, methods=["PUT"]),
+            Route("/book", self.delete_book, methods=["DELETE"])
+        ]
+
+    async def get_health(self, request: Request) -> Response:
+        # Readiness of every backend, 503 until all of them are prepared
+        readiness = self.book_logic.get_readiness()
+        status = 200 if all(backend["ready"] for backend in readiness.values()) else 503
+        return json_response({RESULT_KEY: readiness}, status)
+
+    async def get_metrics(self, request: Request) -> Response:
+        return Response(metrics_registry.render(), 200, media_type=PROMETHEUS_CONTENT_TYPE)
+
+    async def get_cache_stats(self, request: Request) -> Response:
+        return json_response({RESULT_KEY: self.book_logic.get_cache_stats()})
+
+    async def get_read_routing_stats(self, request: Request) -> Response:
+        return json_response({RESULT_KEY: self.book_logic.get_read_routing_stats()})
+
+    async def get_replication_status(self, request: Request) -> Response:
+        return json_response({RESULT_KEY: await self.book_logic.get_replication_status()})
+
+    async def reconcile_books(self, request: Request) -> Response:
+        # Repairs Mongo from Postgres, returns what was compared and repaired
+        return json_response({RESULT_KEY: await self.book_logic.reconcile()})
+
+    async def create_book(self, request: Request) -> Response:
+        response = {}
+        status = 200
+
+        book_json = await request.json()
+        title = book_json["title"]
+        author = book_json["author"]
+        year = book_json["year"]
+        price = book_json["price"]
+        genres = book_json["genres"]
+
+        error_msg = get_new_book_error(year, price)
+        if error_msg is not None:
+            response[ERROR_MESSAGE_KEY] = error_msg
+            status = 409
+        else:
+            book_dto = BookDTO(id=None,
+                               title=title,
+                               author=author,
+                               year=int(year),
+                               price=int(price),
+                               genres=genres)
+
+            book = await self.book_logic.create_book(book_dto)
+            if book is None:
+                response[ERROR_MESSAGE_KEY] = get_title_exists_error(title)
+                status = 409
+            else:
+                response[RESULT_KEY] = book.id
+
+        return json_response(response, status)
+
+    async def create_books(self, request: Request) -> Response:
+        books_json = await request.json()
+        request_error = get_bulk_request_error(books_json)
+        if request_error is not None:
+            return json_response({ERROR_MESSAGE_KEY: request_error}, 400)
+
+        item_responses = [{} for _ in books_json]
+        books_to_create = get_bulk_books_to_create(books_json, item_responses)
+        created_books = await self.book_logic.create_books([book_dto for _, book_dto in books_to_create])
+        set_bulk_created_books(item_responses, books_to_create, created_books)
+
+        return json_response({RESULT_KEY: item_responses})
+
+    async def get_books_total(self, request: Request) -> Response:
+        persistence_method = get_persistence_method(request)
+        if is_memory_loading(self.book_logic, persistence_method):
+            return json_response({ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503)
+        if persistence_method:
+            total_books = await self.book_logic.get_books_total(persistence_method)
+            return json_response({RESULT_KEY: total_books})
+
+        return json_response({ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404)
+
+    async def get_books(self, request: Request) -> Response:
+        persistence_method = get_persistence_method(request)
+        if persistence_method is None:
+            return json_response({ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404)
+        if is_memory_loading(self.book_logic, persistence_method):
+            return json_response({ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503)
+
+        try:
+            book_filter_params_dto, book_page_params_dto = get_books_query(request.query_params)
+        except ValueError as error:
+            return json_response({"error": str(error)}, 400)
+        fields = book_page_params_dto.fields
+
+        if is_stream_requested(request):
+            # A stream is not paged, limit only caps the number of books in it
+            books = self.book_logic.iter_filtered_books(book_filter_params_dto, persistence_method,
+                                                        book_page_params_dto)
+
+            async def generate_books_ndjson():
+                async for book in books:
+                    yield encode_json_line(get_book_response(book, fields))
+
+            return StreamingResponse(generate_books_ndjson(), 200, media_type=NDJSON_MIMETYPE)
+
+        page_size = book_page_params_dto.limit
+        # One extra row tells whether there is a next page
+        book_page_params_dto.limit = page_size + 1 if page_size is not None else None
+        read_method, filtered_books = await self.book_logic.get_books_page(book_filter_params_dto, persistence_method,
+                                                                           book_page_params_dto)
+
+        return json_response(get_books_page_response(filtered_books, page_size, fields, read_method))
+
+    async def search_books(self, request: Request) -> Response:
+        query = request.query_params.get('q', '').strip()
+        limit = request.query_params.get('limit')
+        persistence_method = get_persistence_method(request)
+
+        if persistence_method is None:
+            return json_response({ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404)
+        if is_memory_loading(self.book_logic, persistence_method):
+            return json_response({ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503)
+        if len(query) < MIN_SEARCH_QUERY_LENGTH:
+            return json_response({"error": f"q must have at least {MIN_SEARCH_QUERY_LENGTH} characters"}, 400)
+
+        try:
+            limit = get_search_limit(limit)
+        except ValueError:
+            return json_response({"error": "limit must be a positive integer"}, 400)
+
+        books = await self.book_logic.search_books(query, persistence_method, limit)
+        return json_response({RESULT_KEY: [get_book_response(book, None) for book in books]})
+
+    async def get_book_stats(self, request: Request) -> Response:
+        top_authors = request.query_params.get('top')
+        source = request.query_params.get('source', STATS_DATABASE_SOURCE)
+
+        if source not in (STATS_DATABASE_SOURCE, STATS_SUMMARY_SOURCE):
+            return json_response({"error": f"source must be {STATS_DATABASE_SOURCE} or {STATS_SUMMARY_SOURCE}"}, 400)
+
+        try:
+            top_authors = get_top_authors(top_authors)
+        except ValueError:
+            return json_response({"error": "top must be a positive integer"}, 400)
+
+        if source == STATS_SUMMARY_SOURCE:
+            if not self.book_logic.is_ready(PersistenceMethod.MEMORY):
+                return json_response({ERROR_MESSAGE_KEY: "The stats summary is not loaded yet"}, 503)
+            book_stats = await self.book_logic.get_book_stats(PersistenceMethod.MEMORY, top_authors,
+                                                              use_summary=True)
+        else:
+            persistence_method = get_persistence_method(request)
+            if persistence_method is None:
+                return json_response({ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404)
+            if is_memory_loading(self.book_logic, persistence_method):
+                return json_response({ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503)
+            book_stats = await self.book_logic.get_book_stats(persistence_method, top_authors)
+
+        return json_response({RESULT_KEY: get_book_stats_response(book_stats)})
+
+    async def get_book(self, request: Request) -> Response:
+        book_id = int(request.query_params.get('id'))
+        persistence_method = get_persistence_method(request)
+        if persistence_method is None:
+            return json_response({ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404)
+        if is_memory_loading(self.book_logic, persistence_method):
+            return json_response({ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503)
+
+        existing_book = await self.book_logic.get_book_by_id(book_id, persistence_method)
+        if existing_book is None:
+            return json_response(*get_book_not_found_error(book_id))
+
+        return json_response({RESULT_KEY: existing_book.to_dict()})
+
+    async def update_book_price(self, request: Request) -> Response:
+        book_id = int(request.query_params.get('id'))
+        new_price = int(request.query_params.get('price'))
+        response = {}
+        status = 200
+        existing_book = await self.book_logic.get_book_by_id(book_id, PersistenceMethod.POSTGRES)
+
+        if existing_book is not None:
+            if new_price < 0:
+                error_msg = f"Error: price update for book {book_id} must be a positive integer"
+                response[ERROR_MESSAGE_KEY] = error_msg
+                status = 409
+            else:
+                response[RESULT_KEY] = existing_book.price
+                await self.book_logic.update_book_price(book_id, new_price)
+
+        if len(response) == 0:
+            response, status = get_book_not_found_error(book_id)
+
+        return json_response(response, status)
+
+    async def delete_book(self, request: Request) -> Response:
+        book_id = int(request.query_params.get('id'))
+        total_books = await self.book_logic.delete_book_by_id(book_id)
+
+        if total_books is not None:
+            return json_response({RESULT_KEY: total_books})
+
+        return json_response(*get_book_not_found_error(book_id))
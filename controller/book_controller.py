@@ -1,13 +1,44 @@
-from flask import Flask, request, jsonify
+import base64
+import binascii
+import json
+import time
+from typing import List, Mapping
 
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+
+from controller.book_json_provider import BookJSONProvider
 from dto.book_dto import BookDTO
 from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
 from dto.genres_dto import Genres
 from enums.persistence_method import PersistenceMethod
 from logic.book_logic import BookLogic
+from logic.book_stats_summary import (DEFAULT_TOP_AUTHORS, MAX_TOP_AUTHORS, STATS_PRICE_BUCKET_WIDTH,
+                                      STATS_YEAR_BUCKET_WIDTH)
+from metrics.metrics_registry import PROMETHEUS_CONTENT_TYPE, metrics_registry
 
 RESULT_KEY = "result"
 ERROR_MESSAGE_KEY = "errorMessage"
+START_YEAR = 1940
+END_YEAR = 2100
+BOOK_FIELDS = ["title", "author", "year", "price", "genres"]
+BOOK_DTO_FIELDS = ["id"] + BOOK_FIELDS
+NEXT_CURSOR_KEY = "nextCursor"
+MAX_PAGE_SIZE = 1000
+MIN_SEARCH_QUERY_LENGTH = 3
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+NDJSON_MIMETYPE = "application/x-ndjson"
+UNMATCHED_ENDPOINT = "unmatched"
+STATS_SUMMARY_SOURCE = "summary"
+STATS_DATABASE_SOURCE = "database"
+MEMORY_LOADING_ERROR = "The memory repository is not loaded yet"
+
+request_duration_histogram = metrics_registry.histogram("book_http_request_duration_seconds",
+                                                        "Request latency by endpoint, streamed responses "
+                                                        "until their first byte",
+                                                        ("method", "endpoint", "status"))
 
 
 def get_book_not_found_error(book_id: int):
@@ -15,6 +46,260 @@ def get_book_not_found_error(book_id: int):
     return {ERROR_MESSAGE_KEY: error_msg}, 404
 
 
+def get_title_exists_error(title: str) -> str:
+    return f"Error: Book with the title {title} already exists in the system"
+
+
+def get_new_book_error(year, price) -> str | None:
+    if int(year) < START_YEAR or int(year) > END_YEAR:
+        return (f"Error: Can't create new Book that its year {year} is not in the accepted range ["
+                f"{START_YEAR} -> {END_YEAR}]")
+    elif int(price) < 0:
+        return f"Error: Can't create new Book with negative price"
+
+    return None
+
+
+# Type errors of a bulk item that would fail further down, None when its fields have the right types
+def get_book_type_error(book_json) -> str | None:
+    if not isinstance(book_json, dict):
+        return "expected a JSON object"
+    for field in ("title", "author"):
+        if field in book_json and not isinstance(book_json[field], str):
+            return f"{field} must be a string"
+    if "genres" in book_json and (not isinstance(book_json["genres"], list)
+                                  or not all(isinstance(genre, str) for genre in book_json["genres"])):
+        return "genres must be a list of strings"
+
+    return None
+
+
+def get_books_type_error(books_json: list) -> str | None:
+    for index, book_json in enumerate(books_json):
+        type_error = get_book_type_error(book_json)
+        if type_error is not None:
+            return f"Error: book at index {index}: {type_error}"
+
+    return None
+
+
+# Checks of a POST /books/bulk body shared by both apps. Returns the error that rejects the whole request, or
+# None.
+def get_bulk_request_error(books_json) -> str | None:
+    if not isinstance(books_json, list):
+        return "Error: expected a JSON array of books"
+
+    # A malformed item rejects the whole request, before anything is written
+    return get_books_type_error(books_json)
+
+
+# The books of a bulk request to create, with their index in the request. The other items get their error in
+# `item_responses`: missing fields, an invalid year or price, or a title repeated within the request.
+def get_bulk_books_to_create(books_json: list, item_responses: List[dict]) -> List[tuple[int, BookDTO]]:
+    valid_books: list[tuple[int, BookDTO]] = []
+
+    for index, book_json in enumerate(books_json):
+        missing_fields = [field for field in BOOK_FIELDS if field not in book_json]
+        if missing_fields:
+            item_responses[index][ERROR_MESSAGE_KEY] = f"Error: missing fields {', '.join(missing_fields)}"
+            continue
+
+        try:
+            error_msg = get_new_book_error(book_json["year"], book_json["price"])
+        except (TypeError, ValueError):
+            error_msg = "Error: year and price must be integers"
+
+        if error_msg is not None:
+            item_responses[index][ERROR_MESSAGE_KEY] = error_msg
+            continue
+
+        valid_books.append((index, BookDTO(id=None,
+                                           title=book_json["title"],
+                                           author=book_json["author"],
+                                           year=int(book_json["year"]),
+                                           price=int(book_json["price"]),
+                                           genres=book_json["genres"])))
+
+    # Titles repeated within the request are rejected here, titles already in the store by the insert itself
+    request_titles = set()
+    books_to_create: list[tuple[int, BookDTO]] = []
+    for index, book_dto in valid_books:
+        lower_title = book_dto.title.lower()
+        if lower_title in request_titles:
+            item_responses[index][ERROR_MESSAGE_KEY] = get_title_exists_error(book_dto.title)
+        else:
+            request_titles.add(lower_title)
+            books_to_create.append((index, book_dto))
+
+    return books_to_create
+
+
+def set_bulk_created_books(item_responses: List[dict], books_to_create: List[tuple[int, BookDTO]],
+                           created_books: List[BookDTO | None]):
+    for (index, book_dto), created_book in zip(books_to_create, created_books):
+        if created_book is None:
+            item_responses[index][ERROR_MESSAGE_KEY] = get_title_exists_error(book_dto.title)
+        else:
+            item_responses[index][RESULT_KEY] = created_book.id
+
+
+# Cursors name the backend that read their page, AUTO listings read the next pages from it
+def encode_books_cursor(book: BookDTO, persistence_method: PersistenceMethod) -> str:
+    cursor_json = json.dumps([book.title.lower(), book.id, persistence_method.value])
+    return base64.urlsafe_b64encode(cursor_json.encode()).decode()
+
+
+# Cursors issued before they named a backend have none
+def decode_books_cursor(cursor: str) -> tuple[str, int, PersistenceMethod | None]:
+    try:
+        cursor_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, TypeError, UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise ValueError(f"Invalid cursor {cursor}") from error
+
+    if not isinstance(cursor_values, list) or len(cursor_values) not in (2, 3):
+        raise ValueError(f"Invalid cursor {cursor}")
+
+    after_title, after_id = cursor_values[:2]
+    if not isinstance(after_title, str) or not isinstance(after_id, int):
+        raise ValueError(f"Invalid cursor {cursor}")
+
+    after_persistence_method = None
+    if len(cursor_values) == 3:
+        after_persistence_method = convert_persistence_method(cursor_values[2])
+        if after_persistence_method is None:
+            raise ValueError(f"Invalid cursor {cursor}")
+
+    return after_title, after_id, after_persistence_method
+
+
+def is_stream_requested() -> bool:
+    return (request.args.get('stream', '').lower() == "true"
+            or request.accept_mimetypes.best == NDJSON_MIMETYPE)
+
+
+# The size of a page or a stream, capped at MAX_PAGE_SIZE. Raises ValueError for a limit that is not a
+# positive integer.
+def get_page_size(limit: str | None) -> int | None:
+    if not limit:
+        return None
+
+    page_size = int(limit)
+    if page_size < 1:
+        raise ValueError(f"Invalid limit {limit}")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+# The number of top authors in the stats, capped at MAX_TOP_AUTHORS. Raises ValueError for a top that is not a
+# positive integer.
+def get_top_authors(top: str | None) -> int:
+    if not top:
+        return DEFAULT_TOP_AUTHORS
+
+    top_authors = int(top)
+    if top_authors < 1:
+        raise ValueError(f"Invalid top {top}")
+    return min(top_authors, MAX_TOP_AUTHORS)
+
+
+# The number of search results, capped at MAX_SEARCH_LIMIT. Raises ValueError for a limit that is not a
+# positive integer.
+def get_search_limit(limit: str | None) -> int:
+    if not limit:
+        return DEFAULT_SEARCH_LIMIT
+
+    search_limit = int(limit)
+    if search_limit < 1:
+        raise ValueError(f"Invalid limit {limit}")
+    return min(search_limit, MAX_SEARCH_LIMIT)
+
+
+# Filters and page of a GET /books request, from the query parameters of either app. The page's limit is the
+# requested one. Raises ValueError with the error of the 400 response.
+def get_books_query(args: Mapping[str, str]) -> tuple[BookFilterParametersDTO, BookPageParametersDTO]:
+    genres = args.get('genres')
+
+    # if genres was inserted not properly, case-sensitive
+    if genres is not None:
+        genres = list(genres.split(','))
+        if not all(genre in Genres for genre in genres):
+            raise ValueError("Invalid genres provided")
+
+    try:
+        book_filter_params_dto = BookFilterParametersDTO(
+            author=args.get('author') or None,
+            price_bigger_than=int(args['price-bigger-than']) if args.get('price-bigger-than') else None,
+            price_less_than=int(args['price-less-than']) if args.get('price-less-than') else None,
+            year_bigger_than=int(args['year-bigger-than']) if args.get('year-bigger-than') else None,
+            year_less_than=int(args['year-less-than']) if args.get('year-less-than') else None,
+            genres=genres if genres else None
+        )
+    except ValueError as error:
+        raise ValueError("price and year filters must be integers") from error
+
+    fields = args.get('fields')
+    if fields is not None:
+        fields = list(fields.split(','))
+        if not all(field in BOOK_DTO_FIELDS for field in fields):
+            raise ValueError("Invalid fields provided")
+
+    after_title, after_id, after_persistence_method = None, None, None
+    after = args.get('after')
+    if after:
+        try:
+            after_title, after_id, after_persistence_method = decode_books_cursor(after)
+        except ValueError as error:
+            raise ValueError("Invalid cursor provided") from error
+
+    try:
+        page_size = get_page_size(args.get('limit'))
+    except ValueError as error:
+        raise ValueError("limit must be a positive integer") from error
+
+    return book_filter_params_dto, BookPageParametersDTO(limit=page_size,
+                                                         after_title=after_title,
+                                                         after_id=after_id,
+                                                         fields=fields,
+                                                         after_persistence_method=after_persistence_method)
+
+
+# A page of a listing read by `persistence_method`, fetched with one row more than `page_size` to tell whether
+# there is a next page
+def get_books_page_response(books: List[BookDTO], page_size: int | None, fields: list | None,
+                            persistence_method: PersistenceMethod) -> dict:
+    response = {RESULT_KEY: []}
+
+    if page_size is not None and len(books) > page_size:
+        books = books[:page_size]
+        response[NEXT_CURSOR_KEY] = encode_books_cursor(books[-1], persistence_method)
+
+    for book in books:
+        response[RESULT_KEY].append(get_book_response(book, fields))
+
+    return response
+
+
+def get_book_response(book: BookDTO, fields: list | None) -> dict:
+    if fields is None:
+        return book.to_dict()
+
+    return {field: getattr(book, field) for field in fields}
+
+
+def get_buckets_response(bucket_counts: dict[int, int], bucket_width: int) -> list:
+    return [{"from": bucket_start, "to": bucket_start + bucket_width, "count": count}
+            for bucket_start, count in sorted(bucket_counts.items())]
+
+
+def get_book_stats_response(book_stats: BookStatsDTO) -> dict:
+    return {
+        "total": book_stats.total,
+        "genres": dict(sorted(book_stats.genre_counts.items())),
+        "prices": get_buckets_response(book_stats.price_counts, STATS_PRICE_BUCKET_WIDTH),
+        "years": get_buckets_response(book_stats.year_counts, STATS_YEAR_BUCKET_WIDTH),
+        "topAuthors": [{"author": author, "count": count} for author, count in book_stats.top_authors]
+    }
+
+
 def convert_persistence_method(persistence_method: str) -> PersistenceMethod | None:
     try:
         return PersistenceMethod(persistence_method)
@@ -22,6 +307,12 @@ def convert_persistence_method(persistence_method: str) -> PersistenceMethod | N
         return None
 
 
+# MEMORY reads answer 503 until the warm-up loaded the memory repository, its empty content isn't the catalogue.
+# `book_logic` is a BookLogic or an AsyncBookLogic.
+def is_memory_loading(book_logic, persistence_method: PersistenceMethod | None) -> bool:
+    return persistence_method == PersistenceMethod.MEMORY and not book_logic.is_ready(PersistenceMethod.MEMORY)
+
+
 def get_persistence_method() -> PersistenceMethod | None:
     persistence_method_str = request.args["persistenceMethod"]
     return convert_persistence_method(persistence_method_str)
@@ -30,13 +321,55 @@ def get_persistence_method() -> PersistenceMethod | None:
 class BookController:
     def __init__(self, app: Flask):
         self.app = app
+        self.app.json = BookJSONProvider(app)
         self.book_logic = BookLogic()
         self.setup_routes()  # Ensure routes are set up during initialization
+        self.app.teardown_appcontext(self.close_sessions)
+        self.app.before_request(self.start_request_timer)
+        self.app.after_request(self.record_request_duration)
+
+    def start_request_timer(self):
+        g.request_start = time.perf_counter()
+
+    def record_request_duration(self, response: Response) -> Response:
+        # The route pattern, not the path, keeps the number of series bounded
+        endpoint = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ENDPOINT
+        request_duration_histogram.observe((request.method, endpoint, response.status_code),
+                                           time.perf_counter() - g.request_start)
+        return response
+
+    def close_sessions(self, exception: BaseException | None = None):
+        # Runs after every request, also after a streamed response is fully sent
+        self.book_logic.close_sessions()
 
     def setup_routes(self):
         @self.app.route("/books/health", methods=["GET"])
         def get_health():
-            return "OK", 200
+            # Readiness of every backend, 503 until all of them are prepared
+            readiness = self.book_logic.get_readiness()
+            status = 200 if all(backend["ready"] for backend in readiness.values()) else 503
+            return {RESULT_KEY: readiness}, status
+
+        @self.app.route("/books/metrics", methods=["GET"])
+        def get_metrics():
+            return Response(metrics_registry.render(), 200, content_type=PROMETHEUS_CONTENT_TYPE)
+
+        @self.app.route("/books/cache", methods=["GET"])
+        def get_cache_stats():
+            return {RESULT_KEY: self.book_logic.get_cache_stats()}, 200
+
+        @self.app.route("/books/routing", methods=["GET"])
+        def get_read_routing_stats():
+            return {RESULT_KEY: self.book_logic.get_read_routing_stats()}, 200
+
+        @self.app.route("/books/replication", methods=["GET"])
+        def get_replication_status():
+            return {RESULT_KEY: self.book_logic.get_replication_status()}, 200
+
+        @self.app.route("/books/reconcile", methods=["POST"])
+        def reconcile_books():
+            # Repairs Mongo from Postgres, returns what was compared and repaired
+            return {RESULT_KEY: self.book_logic.reconcile()}, 200
 
         @self.app.route("/book", methods=["POST"])
         def create_book():
@@ -49,39 +382,47 @@ class BookController:
             price = request.json["price"]
             genres = request.json["genres"]
 
-            existing_book = self.book_logic.get_book_by_title(title.lower(), PersistenceMethod.POSTGRES)
-            if existing_book is not None:
-                error_msg = f"Error: Book with the title {title} already exists in the system"
+            error_msg = get_new_book_error(year, price)
+            if error_msg is not None:
                 response[ERROR_MESSAGE_KEY] = error_msg
                 status = 409
-
             else:
-                start_year = 1940
-                end_year = 2100
-                if int(year) < start_year or int(year) > end_year:
-                    error_msg = (f"Error: Can't create new Book that its year {year} is not in the accepted range ["
-                                 f"{start_year} -> {end_year}]")
-                    response[ERROR_MESSAGE_KEY] = error_msg
-                    status = 409
-                elif int(price) < 0:
-                    error_msg = f"Error: Can't create new Book with negative price"
-                    response[ERROR_MESSAGE_KEY] = error_msg
+                book_dto = BookDTO(id=None,
+                                   title=title,
+                                   author=author,
+                                   year=int(year),
+                                   price=int(price),
+                                   genres=genres)
+
+                # The unique title index rejects existing titles as part of the insert itself
+                book = self.book_logic.create_book(book_dto)
+                if book is None:
+                    response[ERROR_MESSAGE_KEY] = get_title_exists_error(title)
                     status = 409
                 else:
-                    book_dto = BookDTO(id=None,
-                                       title=title,
-                                       author=author,
-                                       year=int(year),
-                                       price=int(price),
-                                       genres=genres)
-                    book = self.book_logic.create_book(book_dto)
                     response[RESULT_KEY] = book.id
 
             return response, status
 
+        @self.app.route("/books/bulk", methods=["POST"])
+        def create_books():
+            books_json = request.json
+            request_error = get_bulk_request_error(books_json)
+            if request_error is not None:
+                return {ERROR_MESSAGE_KEY: request_error}, 400
+
+            item_responses = [{} for _ in books_json]
+            books_to_create = get_bulk_books_to_create(books_json, item_responses)
+            created_books = self.book_logic.create_books([book_dto for _, book_dto in books_to_create])
+            set_bulk_created_books(item_responses, books_to_create, created_books)
+
+            return {RESULT_KEY: item_responses}, 200
+
         @self.app.route("/books/total", methods=["GET"])
         def get_books_total():
             persistence_method = get_persistence_method()
+            if is_memory_loading(self.book_logic, persistence_method):
+                return {ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503
             if persistence_method:
                 total_books = self.book_logic.get_books_total(persistence_method)
                 response, status = {RESULT_KEY: total_books}, 200
@@ -92,51 +433,100 @@ class BookController:
 
         @self.app.route("/books", methods=["GET"])
         def get_books():
-            author = request.args.get('author')
-            price_bigger_than = request.args.get('price-bigger-than')
-            price_less_than = request.args.get('price-less-than')
-            year_bigger_than = request.args.get('year-bigger-than')
-            year_less_than = request.args.get('year-less-than')
-            genres = request.args.get('genres')
+            persistence_method = get_persistence_method()
+            if persistence_method is None:
+                return {ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404
+            if is_memory_loading(self.book_logic, persistence_method):
+                return {ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503
+
+            try:
+                book_filter_params_dto, book_page_params_dto = get_books_query(request.args)
+            except ValueError as error:
+                return jsonify({"error": str(error)}), 400
+            fields = book_page_params_dto.fields
+
+            if is_stream_requested():
+                # A stream is not paged, limit only caps the number of books in it
+                books = self.book_logic.iter_filtered_books(book_filter_params_dto, persistence_method,
+                                                            book_page_params_dto)
+
+                def generate_books_ndjson():
+                    for book in books:
+                        yield self.app.json.dumps_line(get_book_response(book, fields))
+
+                return Response(stream_with_context(generate_books_ndjson()), 200, mimetype=NDJSON_MIMETYPE)
+
+            page_size = book_page_params_dto.limit
+            # One extra row tells whether there is a next page
+            book_page_params_dto.limit = page_size + 1 if page_size is not None else None
+            read_method, filtered_books = self.book_logic.get_books_page(book_filter_params_dto, persistence_method,
+                                                                         book_page_params_dto)
+
+            return get_books_page_response(filtered_books, page_size, fields, read_method), 200
+
+        @self.app.route("/books/search", methods=["GET"])
+        def search_books():
+            query = request.args.get('q', '').strip()
+            limit = request.args.get('limit')
             persistence_method = get_persistence_method()
 
-            # if genres was inserted not properly, case-sensitive
-            if genres is not None:
-                genres = list(genres.split(','))
-                if not all(genre in Genres for genre in genres):
-                    return jsonify({"error": "Invalid genres provided"}), 400
-
-            book_filter_params_dto = BookFilterParametersDTO(
-                author=author if author else None,
-                price_bigger_than=int(price_bigger_than) if price_bigger_than else None,
-                price_less_than=int(price_less_than) if price_less_than else None,
-                year_bigger_than=int(year_bigger_than) if year_bigger_than else None,
-                year_less_than=int(year_less_than) if year_less_than else None,
-                genres=genres if genres else None
-            )
-
-            filtered_books = self.book_logic.get_filtered_books(book_filter_params_dto, persistence_method)
-            filtered_books.sort(key=lambda filtered_book: filtered_book.title.lower())
-
-            response = {RESULT_KEY: []}
-
-            for filtered_book in filtered_books:
-                response[RESULT_KEY].append(filtered_book.__dict__)
+            if persistence_method is None:
+                return {ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404
+            if is_memory_loading(self.book_logic, persistence_method):
+                return {ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503
+            if len(query) < MIN_SEARCH_QUERY_LENGTH:
+                return jsonify({"error": f"q must have at least {MIN_SEARCH_QUERY_LENGTH} characters"}), 400
+
+            try:
+                limit = get_search_limit(limit)
+            except ValueError:
+                return jsonify({"error": "limit must be a positive integer"}), 400
+
+            books = self.book_logic.search_books(query, persistence_method, limit)
+            return {RESULT_KEY: [get_book_response(book, None) for book in books]}, 200
+
+        @self.app.route("/books/stats", methods=["GET"])
+        def get_book_stats():
+            top_authors = request.args.get('top')
+            source = request.args.get('source', STATS_DATABASE_SOURCE)
+
+            if source not in (STATS_DATABASE_SOURCE, STATS_SUMMARY_SOURCE):
+                return jsonify({"error": f"source must be {STATS_DATABASE_SOURCE} or {STATS_SUMMARY_SOURCE}"}), 400
+
+            try:
+                top_authors = get_top_authors(top_authors)
+            except ValueError:
+                return jsonify({"error": "top must be a positive integer"}), 400
+
+            if source == STATS_SUMMARY_SOURCE:
+                # The summary is filled by the memory repository's warm-up
+                if not self.book_logic.is_ready(PersistenceMethod.MEMORY):
+                    return {ERROR_MESSAGE_KEY: "The stats summary is not loaded yet"}, 503
+                book_stats = self.book_logic.get_book_stats(PersistenceMethod.MEMORY, top_authors, use_summary=True)
+            else:
+                persistence_method = get_persistence_method()
+                if persistence_method is None:
+                    return {ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404
+                if is_memory_loading(self.book_logic, persistence_method):
+                    return {ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503
+                book_stats = self.book_logic.get_book_stats(persistence_method, top_authors)
 
-            return response, 200
+            return {RESULT_KEY: get_book_stats_response(book_stats)}, 200
 
         @self.app.route("/book", methods=["GET"])
         def get_book():
             book_id = int(request.args.get('id'))
-            status = 200
-            existing_book: BookDTO = self.book_logic.get_book_by_id(book_id, get_persistence_method())
+            persistence_method = get_persistence_method()
+            if persistence_method is None:
+                return {ERROR_MESSAGE_KEY: "Invalid persistence method"}, 404
+            if is_memory_loading(self.book_logic, persistence_method):
+                return {ERROR_MESSAGE_KEY: MEMORY_LOADING_ERROR}, 503
 
-            if existing_book.id == book_id:
-                response = {RESULT_KEY: existing_book.__dict__}
-            else:
-                response, status = {}, get_book_not_found_error(book_id)
+            existing_book = self.book_logic.get_book_by_id(book_id, persistence_method)
+            if existing_book is None:
+                return get_book_not_found_error(book_id)
 
-            return response, status
+            return {RESULT_KEY: existing_book.to_dict()}, 200
 
         @self.app.route("/book", methods=["PUT"])
         def update_book_price():
@@ -165,11 +555,10 @@ class BookController:
             book_id = int(request.args.get('id'))
             response = {}
             status = 200
-            existing_book = self.book_logic.get_book_by_id(book_id, PersistenceMethod.POSTGRES)
+            # One DELETE ... RETURNING tells whether the book existed and gives the new total
+            total_books = self.book_logic.delete_book_by_id(book_id)
 
-            if existing_book is not None:
-                self.book_logic.delete_book_by_id(book_id)
-                total_books = self.book_logic.get_books_total(PersistenceMethod.POSTGRES)
+            if total_books is not None:
                 response[RESULT_KEY] = total_books
             else:
                 response, status = get_book_not_found_error(book_id)
@@ -0,0 +1,67 @@
+import json
+import typing as t
+
+from flask.json.provider import DefaultJSONProvider
+
+from dto.book_dto import BookDTO
+
+# orjson is optional, without it responses are encoded by the stdlib json module as before
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Same key order as the default provider, and dicts keyed by numbers still encode
+ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def encode_default(obj: t.Any) -> t.Any:
+    if isinstance(obj, BookDTO):
+        return obj.to_dict()
+    return DefaultJSONProvider.default(obj)
+
+
+# A response body as BookJSONProvider.response encodes it, for the ASGI app
+def encode_json_body(obj: t.Any) -> bytes:
+    if orjson is None:
+        return (json.dumps(obj, default=encode_default, sort_keys=True, separators=(",", ":")) + "\n").encode()
+    return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+# One JSON document per line, for NDJSON streams
+def encode_json_line(obj: t.Any) -> bytes:
+    if orjson is None:
+        return (json.dumps(obj, default=encode_default, sort_keys=True) + "\n").encode()
+    return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+# Flask JSON provider encoding with orjson when it is installed. Responses are built from the encoded
+# bytes directly, and BookDTOs can be returned without converting them first.
+class BookJSONProvider(DefaultJSONProvider):
+    default = staticmethod(encode_default)
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    # One JSON document per line, for NDJSON streams
+    def dumps_line(self, obj: t.Any) -> bytes:
+        if orjson is None:
+            return (self.dumps(obj) + "\n").encode()
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+    def response(self, *args: t.Any, **kwargs: t.Any):
+        # orjson has no indentation setting beyond 2 spaces, debug responses keep the default provider's output
+        if orjson is None or self._app.debug or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=encode_default,
+                                                     option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE),
+                                        mimetype=self.mimetype)
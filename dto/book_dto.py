@@ -1,4 +1,7 @@
 class BookDTO:
+    # No per-instance __dict__, a listing holds one of these per book
+    __slots__ = ("id", "title", "author", "year", "price", "genres")
+
     def __init__(self, id: int | None, title: str, author: str, year: int, price: int, genres: list):
         self.id = id
         self.title = title
@@ -6,3 +9,13 @@ class BookDTO:
         self.year = year
         self.price = price
         self.genres = genres
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "author": self.author,
+            "year": self.year,
+            "price": self.price,
+            "genres": self.genres
+        }
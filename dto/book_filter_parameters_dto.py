@@ -1,4 +1,6 @@
 class BookFilterParametersDTO:
+    __slots__ = ("author", "price_bigger_than", "price_less_than", "year_bigger_than", "year_less_than", "genres")
+
     def __init__(self, author: str,
                  price_bigger_than: int,
                  price_less_than: int,
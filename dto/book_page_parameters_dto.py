@@ -0,0 +1,16 @@
+from enums.persistence_method import PersistenceMethod
+
+
+class BookPageParametersDTO:
+    def __init__(self, limit: int | None,
+                 after_title: str | None,
+                 after_id: int | None,
+                 fields: list | None,
+                 after_persistence_method: PersistenceMethod | None = None):
+
+        self.limit = limit
+        self.after_title = after_title
+        self.after_id = after_id
+        self.fields = fields
+        # The backend that read the page the cursor continues
+        self.after_persistence_method = after_persistence_method
@@ -0,0 +1,14 @@
+class BookStatsDTO:
+    def __init__(self, total: int,
+                 genre_counts: dict[str, int],
+                 price_counts: dict[int, int],
+                 year_counts: dict[int, int],
+                 top_authors: list[tuple[str, int]]):
+
+        self.total = total
+        self.genre_counts = genre_counts
+        # Bucket start -> number of books
+        self.price_counts = price_counts
+        self.year_counts = year_counts
+        # (author, number of books), most books first
+        self.top_authors = top_authors
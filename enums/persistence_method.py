@@ -4,3 +4,6 @@ from enum import Enum
 class PersistenceMethod(Enum):
     POSTGRES = "POSTGRES"
     MONGO = "MONGO"
+    MEMORY = "MEMORY"
+    # Reads only, routed to the faster healthy database by BookReadRouter
+    AUTO = "AUTO"
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+# Reads AUTO routing measures separately, their latencies are too far apart to share a hedge delay
+class ReadKind(Enum):
+    LOOKUP = "lookup"
+    LISTING = "listing"
+    SEARCH = "search"
+    STATS = "stats"
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class WriteMode(Enum):
+    SEQUENTIAL = "sequential"
+    PARALLEL = "parallel"
+    ASYNC_REPLICA = "async-replica"
@@ -0,0 +1,360 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, TypeVar
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from enums.persistence_method import PersistenceMethod
+from enums.read_kind import ReadKind
+from logic.async_book_write_pipeline import AsyncBookWritePipeline
+from logic.book_cache import BookCache
+from logic.book_logic import (ID_CACHE_KEY, SEARCH_CACHE_KEY, TITLE_CACHE_KEY, ListingBooks,
+                              get_listing_method)
+from logic.book_query_cache import BookQueryCache, get_filter_cache_key, get_page_cache_key
+from logic.book_read_router import AsyncBookReadRouter
+from logic.book_reconciler import RECONCILE_INTERVAL_SECONDS, BookReconciler, ReconciliationJob
+from logic.book_startup import BookStartup
+from logic.book_stats_summary import STATS_PRICE_BUCKET_WIDTH, STATS_YEAR_BUCKET_WIDTH, BookStatsSummary
+from metrics.instrumented_book_repository import InstrumentedBookRepository
+from metrics.metrics_registry import metrics_registry
+from repository import async_mongo_book_repository, async_postgres_book_repository
+from repository.async_mongo_book_repository import AsyncMongoBookRepository
+from repository.async_postgres_book_repository import AsyncPostgresBookRepository
+from repository.memory_book_repository import MemoryBookRepository
+from repository.mongo_book_repository import MongoBookRepository
+from repository.postgres_book_repository import PostgresBookRepository
+from repository.postgres_id_allocator import PostgresIdAllocator
+
+T = TypeVar("T")
+
+
+# BookLogic for the asyncio app. Postgres and Mongo are read and written through the async repositories,
+# the memory repository, caches, stats summary and AUTO routing work as in BookLogic. The warm-up and the
+# reconciler run on worker threads through the synchronous repositories.
+class AsyncBookLogic:
+    def __init__(self):
+        self.postgres_book_repository = InstrumentedBookRepository(AsyncPostgresBookRepository(),
+                                                                   PersistenceMethod.POSTGRES)
+        self.mongo_book_repository = InstrumentedBookRepository(AsyncMongoBookRepository(),
+                                                                PersistenceMethod.MONGO)
+        self.memory_book_repository = InstrumentedBookRepository(MemoryBookRepository(), PersistenceMethod.MEMORY)
+        # The backends read through read_books, MEMORY reads never go through it
+        self.book_repositories: dict[PersistenceMethod, InstrumentedBookRepository] = {
+            PersistenceMethod.POSTGRES: self.postgres_book_repository,
+            PersistenceMethod.MONGO: self.mongo_book_repository
+        }
+        self.sync_postgres_book_repository = InstrumentedBookRepository(PostgresBookRepository(),
+                                                                        PersistenceMethod.POSTGRES)
+        self.book_reconciler = BookReconciler(
+            self.sync_postgres_book_repository,
+            InstrumentedBookRepository(MongoBookRepository(), PersistenceMethod.MONGO)
+        )
+        self.reconciliation_job = None
+        if RECONCILE_INTERVAL_SECONDS > 0:
+            self.reconciliation_job = ReconciliationJob(self.book_reconciler, self.clear_caches)
+            self.reconciliation_job.start()
+        self.id_allocator = PostgresIdAllocator()
+        self.book_cache = BookCache()
+        self.book_query_cache = BookQueryCache()
+        self.book_stats_summary = BookStatsSummary()
+        self.write_pipeline = AsyncBookWritePipeline(self.postgres_book_repository, self.mongo_book_repository,
+                                                     on_replicated=self.invalidate_replicated_books)
+        # Writes apply to the memory repository and the summary under this lock, the warm-up holds it
+        # from its Postgres query until the loaded books replaced the old content. Both take threading
+        # locks that a load or a scan holds for long, so every call to them runs on a worker thread.
+        self.memory_lock = asyncio.Lock()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.register_metrics()
+
+        self.startup = BookStartup(
+            prepare_steps={
+                PersistenceMethod.POSTGRES: self.prepare_postgres,
+                PersistenceMethod.MONGO: self.mongo_book_repository.prepare,
+                PersistenceMethod.MEMORY: self.run_memory_warm_up
+            },
+            dependencies={PersistenceMethod.MEMORY: [PersistenceMethod.POSTGRES]}
+        )
+        self.book_read_router = AsyncBookReadRouter(self.is_ready)
+
+    # Starts preparing the backends, from the event loop the app runs on
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.startup.start()
+
+    async def close(self):
+        self.startup.stop()
+        if self.reconciliation_job is not None:
+            self.reconciliation_job.stop()
+        if self.write_pipeline.replicator is not None:
+            self.write_pipeline.replicator.stop()
+        await self.postgres_book_repository.close()
+        self.mongo_book_repository.close()
+
+    # The schema, id sequence and outbox are set up by the synchronous code, on the start-up thread
+    def prepare_postgres(self):
+        self.postgres_book_repository.prepare()
+        self.id_allocator.prepare()
+        self.write_pipeline.prepare()
+
+    def run_memory_warm_up(self):
+        asyncio.run_coroutine_threadsafe(self.warm_up_memory_book_repository(), self.loop).result()
+
+    async def warm_up_memory_book_repository(self):
+        async with self.memory_lock:
+            await asyncio.to_thread(self.load_memory_book_repository)
+
+    def load_memory_book_repository(self):
+        all_books_filter = BookFilterParametersDTO(author=None,
+                                                   price_bigger_than=None,
+                                                   price_less_than=None,
+                                                   year_bigger_than=None,
+                                                   year_less_than=None,
+                                                   genres=None)
+        try:
+            self.memory_book_repository.load(
+                self.book_stats_summary.load(self.sync_postgres_book_repository.iter_books(all_books_filter))
+            )
+        finally:
+            self.sync_postgres_book_repository.close_session()
+
+    def wait_until_ready(self, timeout_seconds: float | None = None) -> bool:
+        return self.startup.wait_until_ready(timeout_seconds)
+
+    def get_readiness(self) -> dict:
+        return self.startup.get_readiness()
+
+    def is_ready(self, persistence_method: PersistenceMethod) -> bool:
+        return self.startup.ready[persistence_method]
+
+    async def allocate_ids(self, count: int) -> List[int]:
+        # Ids mostly come from the reserved block, a new block is a round trip through the sync engine
+        return await asyncio.to_thread(self.id_allocator.allocate_ids, count)
+
+    async def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        return (await self.create_books([book_dto]))[0]
+
+    async def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        for book_dto, book_id in zip(book_dtos, await self.allocate_ids(len(book_dtos))):
+            book_dto.id = book_id
+        books = await self.write_pipeline.create_books(book_dtos)
+        created_books = [book for book in books if book is not None]
+        if created_books:
+            async with self.memory_lock:
+                await asyncio.to_thread(self.add_memory_books, created_books)
+            self.book_query_cache.bump_version()
+        return books
+
+    def add_memory_books(self, books: List[BookDTO]):
+        for book in self.memory_book_repository.create_books(books):
+            if book is not None:
+                self.book_stats_summary.add_book(book)
+
+    async def update_book_price(self, book_id: int, price: int):
+        await self.write_pipeline.update_book_price(book_id, price)
+        async with self.memory_lock:
+            await asyncio.to_thread(self.update_memory_book_price, book_id, price)
+        self.book_cache.invalidate_book(book_id)
+        self.book_query_cache.bump_version()
+
+    def update_memory_book_price(self, book_id: int, price: int):
+        book = self.memory_book_repository.get_book_by_id(book_id)
+        self.memory_book_repository.update_book_price(book_id, price)
+        if book is not None:
+            self.book_stats_summary.update_price(book.price, price)
+
+    async def delete_book_by_id(self, id):
+        result = await self.write_pipeline.delete_book_by_id(id)
+        async with self.memory_lock:
+            await asyncio.to_thread(self.delete_memory_book, id)
+        self.book_cache.invalidate_book(id)
+        self.book_query_cache.bump_version()
+        return result
+
+    def delete_memory_book(self, id):
+        book = self.memory_book_repository.get_book_by_id(id)
+        if self.memory_book_repository.delete_book_by_id(id) is not None:
+            self.book_stats_summary.remove_book(book)
+
+    # Runs `read` on the repository of the persistence method, AUTO reads go through the read router
+    async def read_books(self, persistence_method: PersistenceMethod, read_kind: ReadKind,
+                         read: Callable[[InstrumentedBookRepository], Awaitable[T]]) -> T:
+        if persistence_method == PersistenceMethod.AUTO:
+            return await self.book_read_router.read(read_kind,
+                                                    lambda routed_method: read(self.book_repositories[routed_method]))
+        return await read(self.book_repositories[persistence_method])
+
+    async def get_book_by_id(self, id, persistence_method: PersistenceMethod):
+        if persistence_method == PersistenceMethod.MEMORY:
+            return await asyncio.to_thread(self.memory_book_repository.get_book_by_id, id)
+
+        cache_key = (ID_CACHE_KEY, persistence_method, id)
+        generation = self.book_cache.get_generation()
+        book = self.book_cache.get(cache_key)
+        if book is not None:
+            return book
+
+        book = await self.read_books(persistence_method, ReadKind.LOOKUP,
+                                     lambda book_repository: book_repository.get_book_by_id(id))
+
+        if book is not None:
+            self.book_cache.put(cache_key, book, generation)
+        return book
+
+    async def get_book_by_title(self, title, persistence_method: PersistenceMethod):
+        if persistence_method == PersistenceMethod.MEMORY:
+            return await asyncio.to_thread(self.memory_book_repository.get_book_by_title, title)
+
+        cache_key = (TITLE_CACHE_KEY, persistence_method, title.lower())
+        generation = self.book_cache.get_generation()
+        book = self.book_cache.get(cache_key)
+        if book is not None:
+            return book
+
+        book = await self.read_books(persistence_method, ReadKind.LOOKUP,
+                                     lambda book_repository: book_repository.get_book_by_title(title))
+
+        if book is not None:
+            self.book_cache.put(cache_key, book, generation)
+        return book
+
+    async def get_books_total(self, persistence_method: PersistenceMethod):
+        if persistence_method == PersistenceMethod.MEMORY:
+            return await asyncio.to_thread(self.memory_book_repository.get_books_total)
+        return await self.read_books(persistence_method, ReadKind.LOOKUP,
+                                     lambda book_repository: book_repository.get_books_total())
+
+    async def get_filtered_books(self, book_filter_parameters: BookFilterParametersDTO,
+                                 persistence_method: PersistenceMethod,
+                                 book_page_parameters: BookPageParametersDTO | None = None):
+        return (await self.get_books_page(book_filter_parameters, persistence_method, book_page_parameters))[1]
+
+    # The books of a listing and the backend that read them, which the page's cursor names
+    async def get_books_page(self, book_filter_parameters: BookFilterParametersDTO,
+                             persistence_method: PersistenceMethod,
+                             book_page_parameters: BookPageParametersDTO | None = None
+                             ) -> tuple[PersistenceMethod, List[BookDTO]]:
+        if persistence_method == PersistenceMethod.MEMORY:
+            return persistence_method, await asyncio.to_thread(self.memory_book_repository.get_books,
+                                                               book_filter_parameters, book_page_parameters)
+
+        persistence_method = get_listing_method(persistence_method, book_page_parameters)
+
+        async def read_page(read_method: PersistenceMethod) -> ListingBooks:
+            return ListingBooks(read_method, await self.book_repositories[read_method].get_books(
+                book_filter_parameters, book_page_parameters
+            ))
+
+        async def load_page() -> ListingBooks:
+            if persistence_method == PersistenceMethod.AUTO:
+                return await self.book_read_router.read(ReadKind.LISTING, read_page)
+            return await read_page(persistence_method)
+
+        cache_key = (persistence_method,
+                     get_filter_cache_key(book_filter_parameters),
+                     get_page_cache_key(book_page_parameters))
+        books = await self.book_query_cache.get_or_load_async(cache_key, load_page)
+        return books.persistence_method, list(books)
+
+    async def search_books(self, query: str, persistence_method: PersistenceMethod, limit: int) -> List[BookDTO]:
+        if persistence_method == PersistenceMethod.MEMORY:
+            return await asyncio.to_thread(self.memory_book_repository.search_books, query, limit)
+
+        cache_key = (SEARCH_CACHE_KEY, persistence_method, query.lower(), limit)
+        books = await self.book_query_cache.get_or_load_async(
+            cache_key, lambda: self.read_books(persistence_method, ReadKind.SEARCH,
+                                               lambda book_repository: book_repository.search_books(query, limit))
+        )
+        return list(books)
+
+    async def get_book_stats(self, persistence_method: PersistenceMethod, top_authors: int,
+                             use_summary: bool = False) -> BookStatsDTO:
+        if use_summary:
+            return await asyncio.to_thread(self.book_stats_summary.get_stats, top_authors)
+        if persistence_method == PersistenceMethod.MEMORY:
+            return await asyncio.to_thread(self.memory_book_repository.get_book_stats, STATS_PRICE_BUCKET_WIDTH,
+                                           STATS_YEAR_BUCKET_WIDTH, top_authors)
+
+        return await self.read_books(persistence_method, ReadKind.STATS,
+                                     lambda book_repository: book_repository.get_book_stats(
+                                         STATS_PRICE_BUCKET_WIDTH, STATS_YEAR_BUCKET_WIDTH, top_authors
+                                     ))
+
+    def iter_filtered_books(self, book_filter_parameters: BookFilterParametersDTO,
+                            persistence_method: PersistenceMethod,
+                            book_page_parameters: BookPageParametersDTO | None = None) -> AsyncIterator[BookDTO]:
+        if persistence_method == PersistenceMethod.MEMORY:
+            return self.iter_memory_books(book_filter_parameters, book_page_parameters)
+
+        persistence_method = get_listing_method(persistence_method, book_page_parameters)
+        if persistence_method == PersistenceMethod.AUTO:
+            # A stream can't be hedged once it started sending, it goes to the best backend as a whole
+            persistence_method = self.book_read_router.get_order(ReadKind.LISTING)[0]
+        return self.book_repositories[persistence_method].iter_books(book_filter_parameters, book_page_parameters)
+
+    async def iter_memory_books(self, book_filter_parameters: BookFilterParametersDTO,
+                                book_page_parameters: BookPageParametersDTO | None) -> AsyncIterator[BookDTO]:
+        for book in await asyncio.to_thread(self.memory_book_repository.get_books, book_filter_parameters,
+                                            book_page_parameters):
+            yield book
+
+    async def reconcile(self) -> dict:
+        return await asyncio.to_thread(self.run_reconciliation)
+
+    def run_reconciliation(self) -> dict:
+        try:
+            report = self.book_reconciler.reconcile()
+        finally:
+            self.sync_postgres_book_repository.close_session()
+        if report["inserted"] or report["updated"] or report["deleted"]:
+            self.clear_caches()
+        return report
+
+    def clear_caches(self):
+        # Repairs bypass the write path, cached Mongo reads may be stale
+        self.book_cache.clear()
+        self.book_query_cache.bump_version()
+
+    async def get_replication_status(self) -> dict:
+        return await self.write_pipeline.get_replication_status()
+
+    def invalidate_replicated_books(self, book_ids: List[int]):
+        # Called from the replicator thread once Mongo caught up, both caches are thread-safe
+        for book_id in book_ids:
+            self.book_cache.invalidate_book(book_id)
+        self.book_query_cache.bump_version()
+
+    def get_read_routing_stats(self) -> dict:
+        return self.book_read_router.get_stats()
+
+    def get_cache_stats(self) -> dict:
+        return {
+            "books": self.book_cache.get_stats(),
+            "queries": self.book_query_cache.get_stats()
+        }
+
+    def register_metrics(self):
+        metrics_registry.gauge("book_postgres_pool_connections", "Postgres connection pool connections",
+                               ("state",), lambda: [((state,), count) for state, count
+                                                    in async_postgres_book_repository.get_pool_stats().items()])
+        metrics_registry.gauge("book_mongo_pool_connections", "Mongo connection pool connections",
+                               ("state",), lambda: [((state,), count) for state, count
+                                                    in async_mongo_book_repository.get_pool_stats().items()])
+        metrics_registry.gauge("book_cache_entries", "Entries held by the book caches",
+                               ("cache",), lambda: [((cache,), stats["size"]) for cache, stats
+                                                    in self.get_cache_stats().items()])
+        metrics_registry.gauge("book_cache_hit_ratio", "Hit ratio of the book caches since start",
+                               ("cache",), lambda: [((cache,), stats["hitRatio"]) for cache, stats
+                                                    in self.get_cache_stats().items()])
+        metrics_registry.gauge("book_auto_latency_ewma_seconds", "Moving read latency used by AUTO routing",
+                               ("kind", "backend"),
+                               lambda: [((read_kind.value, backend.value.lower()), stats.latency_ewma or 0.0)
+                                        for read_kind, kind_stats in self.book_read_router.stats.items()
+                                        for backend, stats in kind_stats.items()])
+        metrics_registry.gauge("book_auto_error_rate", "Moving read error rate used by AUTO routing",
+                               ("kind", "backend"),
+                               lambda: [((read_kind.value, backend.value.lower()), stats.error_rate)
+                                        for read_kind, kind_stats in self.book_read_router.stats.items()
+                                        for backend, stats in kind_stats.items()])
+        metrics_registry.gauge("book_memory_books", "Books held by the in-memory repository",
+                               (), lambda: [((), self.memory_book_repository.get_books_total())])
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Callable, List
+
+from dto.book_dto import BookDTO
+from enums.write_mode import WriteMode
+from logic.book_write_pipeline import WRITE_MODE
+from logic.outbox_replicator import (CREATE_OPERATION, DELETE_OPERATION, UPDATE_PRICE_OPERATION, OutboxReplicator,
+                                     get_book_payload)
+from repository.async_mongo_book_repository import AsyncMongoBookRepository
+from repository.async_postgres_book_repository import AsyncPostgresBookRepository
+from repository.async_postgres_outbox_repository import AsyncPostgresOutboxRepository
+from repository.mongo_book_repository import MongoBookRepository
+from repository.postgres_outbox_repository import PostgresOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+
+# BookWritePipeline for the asyncio app, with the same write modes:
+# SEQUENTIAL    - Postgres then Mongo
+# PARALLEL      - Postgres and Mongo concurrently
+# ASYNC_REPLICA - Postgres and an outbox row in one transaction, Mongo later by the OutboxReplicator thread
+class AsyncBookWritePipeline:
+    def __init__(self, postgres_book_repository: AsyncPostgresBookRepository,
+                 mongo_book_repository: AsyncMongoBookRepository,
+                 write_mode: WriteMode = WRITE_MODE,
+                 on_replicated: Callable[[List[int]], None] | None = None):
+        self.postgres_book_repository = postgres_book_repository
+        self.mongo_book_repository = mongo_book_repository
+        self.write_mode = write_mode
+        self.outbox_repository = None
+        self.outbox_replicator_repository = None
+        self.replicator = None
+
+        if write_mode == WriteMode.ASYNC_REPLICA:
+            self.outbox_repository = AsyncPostgresOutboxRepository()
+            # The replicator is the synchronous one, it drains the outbox from its own thread
+            self.outbox_replicator_repository = PostgresOutboxRepository()
+            self.replicator = OutboxReplicator(self.outbox_replicator_repository, MongoBookRepository(),
+                                              on_replicated)
+
+    # Creates the outbox and starts replicating it, run by the start-up thread once Postgres is reachable.
+    # The start-up retries a failed step, the replicator is only started the first time.
+    def prepare(self):
+        if self.replicator is not None:
+            self.outbox_replicator_repository.prepare()
+            if self.replicator.ident is None:
+                self.replicator.start()
+
+    async def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        return (await self.create_books([book_dto]))[0]
+
+    async def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        if self.write_mode == WriteMode.PARALLEL:
+            postgres_books, mongo_books = await asyncio.gather(self.postgres_book_repository.create_books(book_dtos),
+                                                               self.mongo_book_repository.create_books(book_dtos))
+
+            # Postgres decides whether the book exists, undo a Mongo insert it rejected
+            for book_dto, postgres_book, mongo_book in zip(book_dtos, postgres_books, mongo_books):
+                if postgres_book is None and mongo_book is not None:
+                    await self.mongo_book_repository.delete_book_by_id(book_dto.id)
+                elif postgres_book is not None and mongo_book is None:
+                    logger.warning("Book %s was created in Postgres but its title already exists in Mongo",
+                                   book_dto.id)
+            return postgres_books
+
+        if self.write_mode == WriteMode.ASYNC_REPLICA:
+            async with self.postgres_book_repository.begin() as connection:
+                postgres_books = await self.postgres_book_repository.create_books(book_dtos, connection)
+                await self.outbox_repository.add_events(connection, CREATE_OPERATION,
+                                                        [get_book_payload(book) for book in postgres_books
+                                                         if book is not None])
+            return postgres_books
+
+        postgres_books = await self.postgres_book_repository.create_books(book_dtos)
+        created_books = [book for book in postgres_books if book is not None]
+        if created_books:
+            await self.mongo_book_repository.create_books(created_books)
+        return postgres_books
+
+    async def update_book_price(self, book_id: int, price: int):
+        if self.write_mode == WriteMode.PARALLEL:
+            await asyncio.gather(self.postgres_book_repository.update_book_price(book_id, price),
+                                 self.mongo_book_repository.update_book_price(book_id, price))
+
+        elif self.write_mode == WriteMode.ASYNC_REPLICA:
+            async with self.postgres_book_repository.begin() as connection:
+                await self.postgres_book_repository.update_book_price(book_id, price, connection)
+                await self.outbox_repository.add_events(connection, UPDATE_PRICE_OPERATION,
+                                                        [{"id": book_id, "price": price}])
+
+        else:
+            await self.postgres_book_repository.update_book_price(book_id, price)
+            await self.mongo_book_repository.update_book_price(book_id, price)
+
+    async def delete_book_by_id(self, book_id: int):
+        if self.write_mode == WriteMode.PARALLEL:
+            result, _ = await asyncio.gather(self.postgres_book_repository.delete_book_by_id(book_id),
+                                             self.mongo_book_repository.delete_book_by_id(book_id))
+            return result
+
+        if self.write_mode == WriteMode.ASYNC_REPLICA:
+            async with self.postgres_book_repository.begin() as connection:
+                result = await self.postgres_book_repository.delete_book_by_id(book_id, connection)
+                await self.outbox_repository.add_events(connection, DELETE_OPERATION, [{"id": book_id}])
+            return result
+
+        await self.mongo_book_repository.delete_book_by_id(book_id)
+        return await self.postgres_book_repository.delete_book_by_id(book_id)
+
+    async def get_replication_status(self) -> dict:
+        status = {"writeMode": self.write_mode.value}
+        if self.outbox_repository is not None:
+            status.update(await self.outbox_repository.get_lag())
+        return status
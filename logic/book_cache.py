@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from dto.book_dto import BookDTO
+
+# Cache configuration
+BOOK_CACHE_MAX_SIZE = int(os.environ.get("BOOK_CACHE_MAX_SIZE", "1024"))
+BOOK_CACHE_TTL_SECONDS = float(os.environ.get("BOOK_CACHE_TTL_SECONDS", "60"))
+
+
+# Bounded LRU cache of books with a per-entry TTL. Every key is also indexed by the id of the
+# book it holds, so all the keys pointing at one book (by id and by title) can be dropped together.
+class BookCache:
+    def __init__(self, max_size: int = BOOK_CACHE_MAX_SIZE, ttl_seconds: float = BOOK_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, BookDTO]] = OrderedDict()
+        self._keys_by_book_id: dict[int, set] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> BookDTO | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, book_dto = entry
+            if expires_at < time.monotonic():
+                self._remove_key(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return book_dto
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    # `generation` is the value of get_generation() taken before the book was read, so a read that
+    # raced with a write can't put the pre-write book back after the write invalidated it
+    def put(self, key: Hashable, book_dto: BookDTO, generation: int):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            if key in self._entries:
+                self._remove_key(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, book_dto)
+            self._keys_by_book_id.setdefault(book_dto.id, set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                oldest_key = next(iter(self._entries))
+                self._remove_key(oldest_key)
+
+    def invalidate_book(self, book_id: int):
+        with self._lock:
+            self._generation += 1
+            for key in list(self._keys_by_book_id.get(book_id, ())):
+                self._remove_key(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_book_id.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": self.hits / lookups if lookups else 0.0
+            }
+
+    def _remove_key(self, key: Hashable):
+        _, book_dto = self._entries.pop(key)
+        keys = self._keys_by_book_id.get(book_dto.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_book_id[book_dto.id]
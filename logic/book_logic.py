@@ -1,49 +1,338 @@
+import os
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
 from dto.book_dto import BookDTO
 from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
 from enums.persistence_method import PersistenceMethod
+from enums.read_kind import ReadKind
+from logic.book_cache import BookCache
+from logic.book_query_cache import BookQueryCache, get_filter_cache_key, get_page_cache_key
+from logic.book_read_router import AUTO_BACKENDS, BookReadRouter
+from logic.book_reconciler import RECONCILE_INTERVAL_SECONDS, BookReconciler, ReconciliationJob
+from logic.book_startup import BookStartup
+from logic.book_stats_summary import STATS_PRICE_BUCKET_WIDTH, STATS_YEAR_BUCKET_WIDTH, BookStatsSummary
+from logic.book_write_pipeline import BookWritePipeline
+from metrics.instrumented_book_repository import InstrumentedBookRepository
+from metrics.metrics_registry import metrics_registry
+from repository import mongo_book_repository, postgres_book_repository
+from repository.abstract_book_repository import AbstractBookRepository
+from repository.memory_book_repository import MemoryBookRepository
 from repository.mongo_book_repository import MongoBookRepository
 from repository.postgres_book_repository import PostgresBookRepository
+from repository.postgres_id_allocator import PostgresIdAllocator
+
+ID_CACHE_KEY = "id"
+TITLE_CACHE_KEY = "title"
+SEARCH_CACHE_KEY = "search"
+# Pre-opens the connection pools as part of the start-up
+WARM_UP = os.environ.get("BOOK_WARM_UP", "false").lower() == "true"
+
+T = TypeVar("T")
+
+
+# Books of a listing with the backend that read them, cached like any other list of books
+class ListingBooks(list):
+    def __init__(self, persistence_method: PersistenceMethod, books: Iterable[BookDTO]):
+        super().__init__(books)
+        self.persistence_method = persistence_method
+
+
+# AUTO listings that continue a cursor are read by the backend of the page before: the backends order titles
+# with their own collations, so a cursor from one could skip or repeat books on another
+def get_listing_method(persistence_method: PersistenceMethod,
+                       book_page_parameters: BookPageParametersDTO | None) -> PersistenceMethod:
+    if (persistence_method == PersistenceMethod.AUTO and book_page_parameters is not None
+            and book_page_parameters.after_persistence_method in AUTO_BACKENDS):
+        return book_page_parameters.after_persistence_method
+    return persistence_method
 
 
 class BookLogic:
     def __init__(self):
-        self.postgres_book_repository = PostgresBookRepository()
-        self.mongo_book_repository = MongoBookRepository()
+        # Every repository call is timed per backend for the metrics endpoint
+        self.postgres_book_repository = InstrumentedBookRepository(PostgresBookRepository(),
+                                                                   PersistenceMethod.POSTGRES)
+        self.mongo_book_repository = InstrumentedBookRepository(MongoBookRepository(), PersistenceMethod.MONGO)
+        self.memory_book_repository = InstrumentedBookRepository(MemoryBookRepository(), PersistenceMethod.MEMORY)
+        self.book_repositories: dict[PersistenceMethod, AbstractBookRepository] = {
+            PersistenceMethod.POSTGRES: self.postgres_book_repository,
+            PersistenceMethod.MONGO: self.mongo_book_repository,
+            PersistenceMethod.MEMORY: self.memory_book_repository
+        }
+        # One id per book for both stores, allocated in blocks from a Postgres sequence
+        self.id_allocator = PostgresIdAllocator()
+        self.book_cache = BookCache()
+        self.book_query_cache = BookQueryCache()
+        # Kept up to date together with the memory repository, under its lock
+        self.book_stats_summary = BookStatsSummary()
+        self.write_pipeline = BookWritePipeline(self.postgres_book_repository, self.mongo_book_repository,
+                                                on_replicated=self.invalidate_replicated_books)
+        self.book_reconciler = BookReconciler(self.postgres_book_repository, self.mongo_book_repository)
+        self.reconciliation_job = None
+        if RECONCILE_INTERVAL_SECONDS > 0:
+            self.reconciliation_job = ReconciliationJob(self.book_reconciler, self.clear_caches)
+            self.reconciliation_job.start()
+        self.register_metrics()
+
+        # Nothing above connects to a database, the backends are prepared in the background
+        self.startup = BookStartup(
+            prepare_steps={
+                PersistenceMethod.POSTGRES: self.prepare_postgres,
+                PersistenceMethod.MONGO: self.prepare_mongo,
+                PersistenceMethod.MEMORY: self.warm_up_memory_book_repository
+            },
+            dependencies={PersistenceMethod.MEMORY: [PersistenceMethod.POSTGRES]}
+        )
+        self.startup.start()
+        self.book_read_router = BookReadRouter(self.is_ready)
+
+    def prepare_postgres(self):
+        self.postgres_book_repository.prepare()
+        self.id_allocator.prepare()
+        if WARM_UP:
+            postgres_book_repository.warm_up_pool()
+        # Last, it starts the replicator once everything before it succeeded
+        self.write_pipeline.prepare()
+
+    def prepare_mongo(self):
+        self.mongo_book_repository.prepare()
+        if WARM_UP:
+            mongo_book_repository.warm_up_pool()
 
-    def create_book(self, book_dto: BookDTO):
-        postgres_book: BookDTO = self.postgres_book_repository.create_book(book_dto)
-        self.mongo_book_repository.create_book(book_dto)
-        return postgres_book
+    def wait_until_ready(self, timeout_seconds: float | None = None) -> bool:
+        return self.startup.wait_until_ready(timeout_seconds)
+
+    def get_readiness(self) -> dict:
+        return self.startup.get_readiness()
+
+    def is_ready(self, persistence_method: PersistenceMethod) -> bool:
+        return self.startup.ready[persistence_method]
+
+    def warm_up_memory_book_repository(self):
+        all_books_filter = BookFilterParametersDTO(author=None,
+                                                   price_bigger_than=None,
+                                                   price_less_than=None,
+                                                   year_bigger_than=None,
+                                                   year_less_than=None,
+                                                   genres=None)
+        self.memory_book_repository.load(
+            self.book_stats_summary.load(self.postgres_book_repository.iter_books(all_books_filter))
+        )
+        self.postgres_book_repository.close_session()
+
+    # Returns None when a book with the same title (case-insensitively) already exists
+    def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        book_dto.id = self.id_allocator.allocate_id()
+        book = self.write_pipeline.create_book(book_dto)
+        if book is not None:
+            with self.memory_book_repository.lock:
+                if self.memory_book_repository.create_book(book) is not None:
+                    self.book_stats_summary.add_book(book)
+            self.book_query_cache.bump_version()
+        return book
+
+    # Returns one item per book, None for books whose title already exists
+    def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        for book_dto, book_id in zip(book_dtos, self.id_allocator.allocate_ids(len(book_dtos))):
+            book_dto.id = book_id
+        books = self.write_pipeline.create_books(book_dtos)
+        created_books = [book for book in books if book is not None]
+        if created_books:
+            with self.memory_book_repository.lock:
+                for book in self.memory_book_repository.create_books(created_books):
+                    if book is not None:
+                        self.book_stats_summary.add_book(book)
+            self.book_query_cache.bump_version()
+        return books
 
     def update_book_price(self, book_id: int, price: int):
-        self.postgres_book_repository.update_book_price(book_id, price)
-        self.mongo_book_repository.update_book_price(book_id, price)
+        self.write_pipeline.update_book_price(book_id, price)
+        with self.memory_book_repository.lock:
+            book = self.memory_book_repository.get_book_by_id(book_id)
+            self.memory_book_repository.update_book_price(book_id, price)
+            if book is not None:
+                self.book_stats_summary.update_price(book.price, price)
+        self.book_cache.invalidate_book(book_id)
+        self.book_query_cache.bump_version()
+
+    # Runs `read` on the repository of the persistence method, AUTO reads go through the read router
+    def read_books(self, persistence_method: PersistenceMethod, read_kind: ReadKind,
+                   read: Callable[[AbstractBookRepository], T]) -> T:
+        if persistence_method == PersistenceMethod.AUTO:
+            return self.book_read_router.read(read_kind,
+                                              lambda routed_method: read(self.book_repositories[routed_method]))
+        return read(self.book_repositories[persistence_method])
 
     def get_book_by_id(self, id, persistence_method: PersistenceMethod):
-        if persistence_method == PersistenceMethod.POSTGRES:
-            return self.postgres_book_repository.get_book_by_id(id)
-        elif persistence_method == PersistenceMethod.MONGO:
-            return self.mongo_book_repository.get_book_by_id(id)
+        if persistence_method == PersistenceMethod.MEMORY:
+            return self.memory_book_repository.get_book_by_id(id)
+
+        cache_key = (ID_CACHE_KEY, persistence_method, id)
+        generation = self.book_cache.get_generation()
+        book = self.book_cache.get(cache_key)
+        if book is not None:
+            return book
+
+        book = self.read_books(persistence_method, ReadKind.LOOKUP,
+                               lambda book_repository: book_repository.get_book_by_id(id))
+
+        # Only hits are cached, so a create never has to look for a stale "not found"
+        if book is not None:
+            self.book_cache.put(cache_key, book, generation)
+        return book
 
     def get_book_by_title(self, title, persistence_method: PersistenceMethod):
-        if persistence_method == PersistenceMethod.POSTGRES:
-            return self.postgres_book_repository.get_book_by_title(title)
-        elif persistence_method == PersistenceMethod.MONGO:
-            return self.mongo_book_repository.get_book_by_title(title)
+        if persistence_method == PersistenceMethod.MEMORY:
+            return self.memory_book_repository.get_book_by_title(title)
+
+        cache_key = (TITLE_CACHE_KEY, persistence_method, title.lower())
+        generation = self.book_cache.get_generation()
+        book = self.book_cache.get(cache_key)
+        if book is not None:
+            return book
+
+        book = self.read_books(persistence_method, ReadKind.LOOKUP,
+                               lambda book_repository: book_repository.get_book_by_title(title))
+
+        if book is not None:
+            self.book_cache.put(cache_key, book, generation)
+        return book
 
     def get_books_total(self, persistence_method: PersistenceMethod):
-        if persistence_method == PersistenceMethod.POSTGRES:
-            return self.postgres_book_repository.get_books_total()
-        elif persistence_method == PersistenceMethod.MONGO:
-            return self.mongo_book_repository.get_books_total()
+        return self.read_books(persistence_method, ReadKind.LOOKUP,
+                               lambda book_repository: book_repository.get_books_total())
 
     def delete_book_by_id(self, id):
-        self.mongo_book_repository.delete_book_by_id(id)
-        return self.postgres_book_repository.delete_book_by_id(id)
+        result = self.write_pipeline.delete_book_by_id(id)
+        with self.memory_book_repository.lock:
+            book = self.memory_book_repository.get_book_by_id(id)
+            if self.memory_book_repository.delete_book_by_id(id) is not None:
+                self.book_stats_summary.remove_book(book)
+        self.book_cache.invalidate_book(id)
+        self.book_query_cache.bump_version()
+        return result
 
     def get_filtered_books(self, book_filter_parameters: BookFilterParametersDTO,
-                           persistence_method: PersistenceMethod):
-        if persistence_method == PersistenceMethod.POSTGRES:
-            return self.postgres_book_repository.get_books(book_filter_parameters)
-        elif persistence_method == PersistenceMethod.MONGO:
-            return self.mongo_book_repository.get_books(book_filter_parameters)
+                           persistence_method: PersistenceMethod,
+                           book_page_parameters: BookPageParametersDTO | None = None):
+        return self.get_books_page(book_filter_parameters, persistence_method, book_page_parameters)[1]
+
+    # The books of a listing and the backend that read them, which the page's cursor names
+    def get_books_page(self, book_filter_parameters: BookFilterParametersDTO,
+                       persistence_method: PersistenceMethod,
+                       book_page_parameters: BookPageParametersDTO | None = None
+                       ) -> tuple[PersistenceMethod, List[BookDTO]]:
+        if persistence_method == PersistenceMethod.MEMORY:
+            return persistence_method, self.memory_book_repository.get_books(book_filter_parameters,
+                                                                             book_page_parameters)
+
+        persistence_method = get_listing_method(persistence_method, book_page_parameters)
+
+        def read_page(read_method: PersistenceMethod) -> ListingBooks:
+            return ListingBooks(read_method, self.book_repositories[read_method].get_books(book_filter_parameters,
+                                                                                           book_page_parameters))
+
+        def load_page() -> ListingBooks:
+            if persistence_method == PersistenceMethod.AUTO:
+                return self.book_read_router.read(ReadKind.LISTING, read_page)
+            return read_page(persistence_method)
+
+        cache_key = (persistence_method,
+                     get_filter_cache_key(book_filter_parameters),
+                     get_page_cache_key(book_page_parameters))
+        books = self.book_query_cache.get_or_load(cache_key, load_page)
+        # The cached list is shared, callers get their own copy
+        return books.persistence_method, list(books)
+
+    def search_books(self, query: str, persistence_method: PersistenceMethod, limit: int) -> List[BookDTO]:
+        if persistence_method == PersistenceMethod.MEMORY:
+            return self.memory_book_repository.search_books(query, limit)
+
+        # Cached like listings, every write makes older results unreachable
+        cache_key = (SEARCH_CACHE_KEY, persistence_method, query.lower(), limit)
+        books = self.book_query_cache.get_or_load(
+            cache_key, lambda: self.read_books(persistence_method, ReadKind.SEARCH,
+                                               lambda book_repository: book_repository.search_books(query, limit))
+        )
+        return list(books)
+
+    # With `use_summary` the statistics come from the incrementally maintained summary instead of a query,
+    # which needs the memory repository to be ready
+    def get_book_stats(self, persistence_method: PersistenceMethod, top_authors: int,
+                       use_summary: bool = False) -> BookStatsDTO:
+        if use_summary:
+            return self.book_stats_summary.get_stats(top_authors)
+
+        return self.read_books(persistence_method, ReadKind.STATS,
+                               lambda book_repository: book_repository.get_book_stats(
+                                   STATS_PRICE_BUCKET_WIDTH, STATS_YEAR_BUCKET_WIDTH, top_authors
+                               ))
+
+    def iter_filtered_books(self, book_filter_parameters: BookFilterParametersDTO,
+                            persistence_method: PersistenceMethod,
+                            book_page_parameters: BookPageParametersDTO | None = None) -> Iterator[BookDTO]:
+        persistence_method = get_listing_method(persistence_method, book_page_parameters)
+        if persistence_method == PersistenceMethod.AUTO:
+            # A stream can't be hedged once it started sending, it goes to the best backend as a whole
+            persistence_method = self.book_read_router.get_order(ReadKind.LISTING)[0]
+        return self.book_repositories[persistence_method].iter_books(book_filter_parameters, book_page_parameters)
+
+    def reconcile(self) -> dict:
+        report = self.book_reconciler.reconcile()
+        if report["inserted"] or report["updated"] or report["deleted"]:
+            self.clear_caches()
+        return report
+
+    def clear_caches(self):
+        # Repairs bypass the write path, cached Mongo reads may be stale
+        self.book_cache.clear()
+        self.book_query_cache.bump_version()
+
+    def invalidate_replicated_books(self, book_ids: List[int]):
+        # Called from the replicator thread once Mongo caught up, Mongo reads cached before are stale
+        for book_id in book_ids:
+            self.book_cache.invalidate_book(book_id)
+        self.book_query_cache.bump_version()
+
+    def close_sessions(self):
+        self.postgres_book_repository.close_session()
+
+    def get_replication_status(self) -> dict:
+        return self.write_pipeline.get_replication_status()
+
+    def get_read_routing_stats(self) -> dict:
+        return self.book_read_router.get_stats()
+
+    def register_metrics(self):
+        metrics_registry.gauge("book_postgres_pool_connections", "Postgres connection pool connections",
+                               ("state",), lambda: [((state,), count) for state, count
+                                                    in postgres_book_repository.get_pool_stats().items()])
+        metrics_registry.gauge("book_mongo_pool_connections", "Mongo connection pool connections",
+                               ("state",), lambda: [((state,), count) for state, count
+                                                    in mongo_book_repository.get_pool_stats().items()])
+        metrics_registry.gauge("book_cache_entries", "Entries held by the book caches",
+                               ("cache",), lambda: [((cache,), stats["size"]) for cache, stats
+                                                    in self.get_cache_stats().items()])
+        metrics_registry.gauge("book_cache_hit_ratio", "Hit ratio of the book caches since start",
+                               ("cache",), lambda: [((cache,), stats["hitRatio"]) for cache, stats
+                                                    in self.get_cache_stats().items()])
+        metrics_registry.gauge("book_auto_latency_ewma_seconds", "Moving read latency used by AUTO routing",
+                               ("kind", "backend"),
+                               lambda: [((read_kind.value, backend.value.lower()), stats.latency_ewma or 0.0)
+                                        for read_kind, kind_stats in self.book_read_router.stats.items()
+                                        for backend, stats in kind_stats.items()])
+        metrics_registry.gauge("book_auto_error_rate", "Moving read error rate used by AUTO routing",
+                               ("kind", "backend"),
+                               lambda: [((read_kind.value, backend.value.lower()), stats.error_rate)
+                                        for read_kind, kind_stats in self.book_read_router.stats.items()
+                                        for backend, stats in kind_stats.items()])
+        metrics_registry.gauge("book_memory_books", "Books held by the in-memory repository",
+                               (), lambda: [((), self.memory_book_repository.get_books_total())])
+
+    def get_cache_stats(self) -> dict:
+        return {
+            "books": self.book_cache.get_stats(),
+            "queries": self.book_query_cache.get_stats()
+        }
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable, List
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+
+# Query cache configuration
+BOOK_QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("BOOK_QUERY_CACHE_MAX_ENTRIES", "256"))
+BOOK_QUERY_CACHE_MAX_BOOKS = int(os.environ.get("BOOK_QUERY_CACHE_MAX_BOOKS", "100000"))
+BOOK_QUERY_CACHE_TTL_SECONDS = float(os.environ.get("BOOK_QUERY_CACHE_TTL_SECONDS", "30"))
+
+
+def get_filter_cache_key(book_filter_parameters: BookFilterParametersDTO) -> tuple:
+    # Filters that select the same books get the same key: authors match case-insensitively
+    # and genres are a set
+    return (
+        book_filter_parameters.author.lower() if book_filter_parameters.author else None,
+        book_filter_parameters.price_bigger_than,
+        book_filter_parameters.price_less_than,
+        book_filter_parameters.year_bigger_than,
+        book_filter_parameters.year_less_than,
+        tuple(sorted({genre.upper() for genre in book_filter_parameters.genres}))
+        if book_filter_parameters.genres else None
+    )
+
+
+def get_page_cache_key(book_page_parameters: BookPageParametersDTO | None) -> tuple | None:
+    if book_page_parameters is None:
+        return None
+
+    return (
+        book_page_parameters.limit,
+        book_page_parameters.after_title,
+        book_page_parameters.after_id,
+        tuple(book_page_parameters.fields) if book_page_parameters.fields else None
+    )
+
+
+# LRU cache of filtered listings, bounded both by entries and by the total number of books held.
+# Every key includes the catalogue version, which every write bumps, so a write makes all older
+# entries unreachable at once. Concurrent misses on the same key share a single backend query.
+class BookQueryCache:
+    def __init__(self, max_entries: int = BOOK_QUERY_CACHE_MAX_ENTRIES,
+                 max_books: int = BOOK_QUERY_CACHE_MAX_BOOKS,
+                 ttl_seconds: float = BOOK_QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_books = max_books
+        self.ttl_seconds = ttl_seconds
+        self.catalogue_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[Hashable, tuple[float, List[BookDTO]]] = OrderedDict()
+        self._cached_books = 0
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def bump_version(self):
+        with self._lock:
+            self.catalogue_version += 1
+            # Entries of older versions can't be hit any more, free them now instead of waiting for the LRU
+            self._entries.clear()
+            self._cached_books = 0
+
+    def get_or_load(self, key: Hashable, load: Callable[[], List[BookDTO]]) -> List[BookDTO]:
+        books, versioned_key, version, in_flight, is_loader = self._start_load(key)
+        if books is not None:
+            return books
+        if not is_loader:
+            return in_flight.result()
+
+        try:
+            books = load()
+        except BaseException as error:
+            self._fail_load(versioned_key, in_flight, error)
+            raise
+
+        self._finish_load(versioned_key, version, in_flight, books)
+        return books
+
+    # get_or_load for the asyncio app, coalesced misses wait without blocking the event loop
+    async def get_or_load_async(self, key: Hashable, load: Callable[[], Awaitable[List[BookDTO]]]) -> List[BookDTO]:
+        books, versioned_key, version, in_flight, is_loader = self._start_load(key)
+        if books is not None:
+            return books
+        if not is_loader:
+            # Shielded, a waiter that is cancelled must not cancel the query the others wait for
+            return await asyncio.shield(asyncio.wrap_future(in_flight))
+
+        try:
+            books = await load()
+        except BaseException as error:
+            self._fail_load(versioned_key, in_flight, error)
+            raise
+
+        self._finish_load(versioned_key, version, in_flight, books)
+        return books
+
+    # Returns the cached books on a hit, otherwise the future of the query loading them and whether
+    # the caller is the one running it
+    def _start_load(self, key: Hashable) -> tuple[List[BookDTO] | None, Hashable, int, Future | None, bool]:
+        with self._lock:
+            version = self.catalogue_version
+            versioned_key = (version, key)
+
+            entry = self._entries.get(versioned_key)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._entries.move_to_end(versioned_key)
+                self.hits += 1
+                return entry[1], versioned_key, version, None, False
+
+            in_flight = self._in_flight.get(versioned_key)
+            is_loader = in_flight is None
+            if is_loader:
+                self.misses += 1
+                in_flight = Future()
+                self._in_flight[versioned_key] = in_flight
+            else:
+                self.coalesced += 1
+
+            return None, versioned_key, version, in_flight, is_loader
+
+    def _finish_load(self, versioned_key: Hashable, version: int, in_flight: Future, books: List[BookDTO]):
+        with self._lock:
+            del self._in_flight[versioned_key]
+            # A write during the query may have changed its result, don't keep it
+            if version == self.catalogue_version:
+                self._put(versioned_key, books)
+
+        in_flight.set_result(books)
+
+    def _fail_load(self, versioned_key: Hashable, in_flight: Future, error: BaseException):
+        with self._lock:
+            del self._in_flight[versioned_key]
+        in_flight.set_exception(error)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_entries,
+                "cachedBooks": self._cached_books,
+                "maxBooks": self.max_books,
+                "ttlSeconds": self.ttl_seconds,
+                "catalogueVersion": self.catalogue_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hitRatio": (self.hits + self.coalesced) / lookups if lookups else 0.0
+            }
+
+    def _put(self, versioned_key: Hashable, books: List[BookDTO]):
+        if self.max_entries <= 0 or len(books) > self.max_books:
+            return
+
+        if versioned_key in self._entries:
+            self._cached_books -= len(self._entries.pop(versioned_key)[1])
+
+        self._entries[versioned_key] = (time.monotonic() + self.ttl_seconds, books)
+        self._cached_books += len(books)
+
+        while len(self._entries) > self.max_entries or self._cached_books > self.max_books:
+            _, (_, evicted_books) = self._entries.popitem(last=False)
+            self._cached_books -= len(evicted_books)
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError, wait
+from typing import Awaitable, Callable, TypeVar
+
+from enums.persistence_method import PersistenceMethod
+from enums.read_kind import ReadKind
+from repository.postgres_book_repository import remove_session
+
+T = TypeVar("T")
+
+# AUTO read routing configuration
+AUTO_BACKENDS = [PersistenceMethod.POSTGRES, PersistenceMethod.MONGO]
+AUTO_EWMA_ALPHA = float(os.environ.get("BOOK_AUTO_EWMA_ALPHA", "0.2"))
+AUTO_MAX_ERROR_RATE = float(os.environ.get("BOOK_AUTO_MAX_ERROR_RATE", "0.5"))
+AUTO_EXPLORE_RATE = float(os.environ.get("BOOK_AUTO_EXPLORE_RATE", "0.02"))
+AUTO_LATENCY_WINDOW = int(os.environ.get("BOOK_AUTO_LATENCY_WINDOW", "200"))
+AUTO_MIN_HEDGE_DELAY_SECONDS = float(os.environ.get("BOOK_AUTO_MIN_HEDGE_DELAY_MS", "2")) / 1000
+AUTO_DEFAULT_HEDGE_DELAY_SECONDS = float(os.environ.get("BOOK_AUTO_DEFAULT_HEDGE_DELAY_MS", "50")) / 1000
+AUTO_WORKERS = int(os.environ.get("BOOK_AUTO_WORKERS", "32"))
+# Share of reads that may be hedged, on top of a burst of AUTO_HEDGE_BURST hedges
+AUTO_HEDGE_BUDGET = float(os.environ.get("BOOK_AUTO_HEDGE_BUDGET", "0.05"))
+AUTO_HEDGE_BURST = float(os.environ.get("BOOK_AUTO_HEDGE_BURST", "10"))
+# The p95 is recomputed every this many samples instead of on every read
+P95_REFRESH_SAMPLES = 20
+
+
+# Moving latency and error rate of one backend, plus a window of recent latencies for its p95
+class BackendStats:
+    def __init__(self):
+        self.latency_ewma: float | None = None
+        self.error_rate = 0.0
+        self.latencies: deque[float] = deque(maxlen=AUTO_LATENCY_WINDOW)
+        self.p95: float | None = None
+        self.samples_since_p95 = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_seconds: float, failed: bool):
+        with self.lock:
+            self.error_rate += AUTO_EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate)
+            if failed:
+                return
+
+            self.latency_ewma = latency_seconds if self.latency_ewma is None else \
+                self.latency_ewma + AUTO_EWMA_ALPHA * (latency_seconds - self.latency_ewma)
+            self.latencies.append(latency_seconds)
+            self.samples_since_p95 += 1
+            if self.samples_since_p95 >= P95_REFRESH_SAMPLES:
+                sorted_latencies = sorted(self.latencies)
+                self.p95 = sorted_latencies[int(0.95 * (len(sorted_latencies) - 1))]
+                self.samples_since_p95 = 0
+
+    def get_hedge_delay(self) -> float:
+        if self.p95 is None:
+            return AUTO_DEFAULT_HEDGE_DELAY_SECONDS
+        return max(self.p95, AUTO_MIN_HEDGE_DELAY_SECONDS)
+
+
+# Routes AUTO reads to the ready backend with the lowest moving latency for their kind of read,
+# backends whose moving error rate is above AUTO_MAX_ERROR_RATE go last. A read that hasn't answered
+# within the p95 of its backend is hedged: the next backend is asked too and the first answer wins.
+# Every read earns AUTO_HEDGE_BUDGET of a hedge, so a slow backend can't double the load on the other
+# one. A read that fails fails over to the next backend. A small share of reads goes to another backend
+# than the best one, so a slow or failing backend gets measured again and can win its traffic back.
+class BookReadRouter:
+    def __init__(self, is_ready: Callable[[PersistenceMethod], bool],
+                 backends: list[PersistenceMethod] = AUTO_BACKENDS):
+        self.is_ready = is_ready
+        self.backends = backends
+        self.stats = {read_kind: {backend: BackendStats() for backend in backends} for read_kind in ReadKind}
+        self.executor = ThreadPoolExecutor(max_workers=AUTO_WORKERS, thread_name_prefix="book-auto-read")
+        self.hedge_tokens = AUTO_HEDGE_BURST
+        self.hedge_lock = threading.Lock()
+        self.hedged_reads = 0
+        self.hedges_over_budget = 0
+        self.failovers = 0
+
+    def get_order(self, read_kind: ReadKind) -> list[PersistenceMethod]:
+        def get_rank(backend: PersistenceMethod) -> tuple:
+            stats = self.stats[read_kind][backend]
+            is_healthy = self.is_ready(backend) and stats.error_rate <= AUTO_MAX_ERROR_RATE
+            # Not measured yet sorts first, so it gets measured
+            return not is_healthy, stats.latency_ewma or 0.0
+
+        order = sorted(self.backends, key=get_rank)
+        if len(order) > 1 and random.random() < AUTO_EXPLORE_RATE:
+            order[0], order[1] = order[1], order[0]
+        return order
+
+    def read(self, read_kind: ReadKind, read: Callable[[PersistenceMethod], T]) -> T:
+        order = self.get_order(read_kind)
+        if len(order) == 1:
+            return self._timed_read(read_kind, order[0], read)
+
+        # A read on the calling thread can't be abandoned for a faster hedge, so only reads that can't be
+        # hedged run there, the others run on a worker
+        if not self._earn_hedge_budget():
+            try:
+                return self._timed_read(read_kind, order[0], read)
+            except Exception:
+                self.failovers += 1
+                return self._timed_read(read_kind, order[1], read)
+
+        primary_started = threading.Event()
+        primary_future = self._submit_read(read_kind, order[0], read, primary_started)
+        # Time spent waiting for a free worker doesn't count towards the hedge delay
+        primary_started.wait()
+        try:
+            return primary_future.result(timeout=self.stats[read_kind][order[0]].get_hedge_delay())
+        except TimeoutError:
+            if not self._spend_hedge_budget():
+                return primary_future.result()
+            hedge_future = self._submit_read(read_kind, order[1], read)
+            return self._get_first_result([primary_future, hedge_future])
+        except Exception:
+            self.failovers += 1
+            return self._timed_read(read_kind, order[1], read)
+
+    def get_stats(self) -> dict:
+        return {
+            "hedgedReads": self.hedged_reads,
+            "hedgesOverBudget": self.hedges_over_budget,
+            "failovers": self.failovers,
+            "kinds": {
+                read_kind.value: {
+                    "order": [backend.value for backend in self.get_order(read_kind)],
+                    "backends": {
+                        backend.value: {
+                            "ready": self.is_ready(backend),
+                            "latencyEwmaMs": stats.latency_ewma * 1000 if stats.latency_ewma is not None else None,
+                            "p95Ms": stats.p95 * 1000 if stats.p95 is not None else None,
+                            "errorRate": stats.error_rate
+                        }
+                        for backend, stats in kind_stats.items()
+                    }
+                }
+                for read_kind, kind_stats in self.stats.items()
+            }
+        }
+
+    # Returns whether the budget holds a hedge after this read's share was added
+    def _earn_hedge_budget(self) -> bool:
+        with self.hedge_lock:
+            self.hedge_tokens = min(AUTO_HEDGE_BURST, self.hedge_tokens + AUTO_HEDGE_BUDGET)
+            return self.hedge_tokens >= 1
+
+    def _spend_hedge_budget(self) -> bool:
+        with self.hedge_lock:
+            if self.hedge_tokens < 1:
+                self.hedges_over_budget += 1
+                return False
+            self.hedge_tokens -= 1
+            self.hedged_reads += 1
+            return True
+
+    def _timed_read(self, read_kind: ReadKind, backend: PersistenceMethod,
+                    read: Callable[[PersistenceMethod], T]) -> T:
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = read(backend)
+            failed = False
+            return result
+        finally:
+            self.stats[read_kind][backend].record(time.perf_counter() - start, failed)
+
+    def _submit_read(self, read_kind: ReadKind, backend: PersistenceMethod, read: Callable[[PersistenceMethod], T],
+                     started: threading.Event | None = None) -> Future:
+        def read_on_worker():
+            if started is not None:
+                started.set()
+            try:
+                return self._timed_read(read_kind, backend, read)
+            finally:
+                # Each worker thread has its own scoped Postgres session, give its connection back
+                remove_session()
+
+        return self.executor.submit(read_on_worker)
+
+    def _get_first_result(self, futures: list[Future]):
+        # The first read to succeed wins, the other one finishes in the background and is still measured
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+# BookReadRouter for the asyncio app, the same routing, hedging and failover with reads that are coroutines.
+# Reads already run on the calling event loop, there is no worker to wait for.
+class AsyncBookReadRouter(BookReadRouter):
+    async def read(self, read_kind: ReadKind, read: Callable[[PersistenceMethod], Awaitable[T]]) -> T:
+        order = self.get_order(read_kind)
+        if len(order) == 1:
+            return await self._timed_read(read_kind, order[0], read)
+
+        self._earn_hedge_budget()
+        primary_task = asyncio.ensure_future(self._timed_read(read_kind, order[0], read))
+        try:
+            # shield() keeps the primary read running when the hedge delay times out
+            return await asyncio.wait_for(asyncio.shield(primary_task),
+                                          self.stats[read_kind][order[0]].get_hedge_delay())
+        except asyncio.TimeoutError:
+            if not self._spend_hedge_budget():
+                return await primary_task
+            hedge_task = asyncio.ensure_future(self._timed_read(read_kind, order[1], read))
+            return await self._get_first_result([primary_task, hedge_task])
+        except Exception:
+            self.failovers += 1
+            return await self._timed_read(read_kind, order[1], read)
+
+    async def _timed_read(self, read_kind: ReadKind, backend: PersistenceMethod,
+                          read: Callable[[PersistenceMethod], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await read(backend)
+            failed = False
+            return result
+        finally:
+            self.stats[read_kind][backend].record(time.perf_counter() - start, failed)
+
+    async def _get_first_result(self, tasks: list[asyncio.Future]):
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
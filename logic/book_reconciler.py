@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+import time
+from typing import List
+
+from dto.book_dto import BookDTO
+from repository.book_range_checksum import get_content_hash
+from repository.mongo_book_repository import MongoBookRepository
+from repository.postgres_book_repository import PostgresBookRepository, remove_session
+
+logger = logging.getLogger(__name__)
+
+# Reconciliation configuration
+RECONCILE_FANOUT = int(os.environ.get("BOOK_RECONCILE_FANOUT", "16"))
+RECONCILE_LEAF_SIZE = int(os.environ.get("BOOK_RECONCILE_LEAF_SIZE", "256"))
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get("BOOK_RECONCILE_INTERVAL_SECONDS", "0"))
+
+
+def get_book_fields(book_dto: BookDTO) -> tuple:
+    return book_dto.id, book_dto.title, book_dto.author, book_dto.year, book_dto.price, list(book_dto.genres or [])
+
+
+# Brings Mongo back in line with Postgres, which is the source of truth.
+# The rawid space is split into RECONCILE_FANOUT ranges whose (count, checksum) is computed inside
+# each store, only ranges whose checksums differ are split again, and only ranges of at most
+# RECONCILE_LEAF_SIZE ids are read row by row and repaired. An in-sync catalogue costs one
+# round of checksums, a few drifted rows cost a handful of rounds and leaves.
+# Writes racing with a run may be repaired from a stale read, the next run fixes them.
+class BookReconciler:
+    def __init__(self, postgres_book_repository: PostgresBookRepository,
+                 mongo_book_repository: MongoBookRepository,
+                 fanout: int = RECONCILE_FANOUT,
+                 leaf_size: int = RECONCILE_LEAF_SIZE):
+        self.postgres_book_repository = postgres_book_repository
+        self.mongo_book_repository = mongo_book_repository
+        self.fanout = max(2, fanout)
+        self.leaf_size = max(1, leaf_size)
+        self.lock = threading.Lock()
+
+    def reconcile(self) -> dict:
+        with self.lock:
+            start = time.perf_counter()
+            report = {"rangesCompared": 0, "rowsCompared": 0, "inserted": 0, "updated": 0, "deleted": 0,
+                      "failed": 0}
+
+            bounds = [bound for bound in (*self.postgres_book_repository.get_id_bounds(),
+                                          *self.mongo_book_repository.get_id_bounds())
+                      if bound is not None]
+            pending_ranges = [(min(bounds), max(bounds) + 1)] if bounds else []
+
+            while pending_ranges:
+                low, high = pending_ranges.pop()
+                if high - low <= self.leaf_size:
+                    self.repair_range(low, high, report)
+                    continue
+
+                width = -(-(high - low) // self.fanout)
+                postgres_checksums = self.postgres_book_repository.get_range_checksums(low, high, width)
+                mongo_checksums = self.mongo_book_repository.get_range_checksums(low, high, width)
+                report["rangesCompared"] += 1
+
+                for bucket in postgres_checksums.keys() | mongo_checksums.keys():
+                    if postgres_checksums.get(bucket) != mongo_checksums.get(bucket):
+                        pending_ranges.append((low + bucket * width, min(high, low + (bucket + 1) * width)))
+
+            report["durationSeconds"] = time.perf_counter() - start
+            return report
+
+    def repair_range(self, low: int, high: int, report: dict):
+        postgres_books = {book.id: book for book in self.postgres_book_repository.get_books_in_id_range(low, high)}
+        mongo_books = {book.id: book for book in self.mongo_book_repository.get_books_in_id_range(low, high)}
+        mongo_content_hashes = self.mongo_book_repository.get_content_hashes_in_id_range(low, high)
+        report["rowsCompared"] += len(postgres_books) + len(mongo_books)
+
+        stale_ids = [id for id in mongo_books if id not in postgres_books]
+        # A document whose stored content hash is missing or stale would keep its range's checksum apart
+        books_to_replace: List[BookDTO] = [
+            book for id, book in postgres_books.items()
+            if id not in mongo_books or get_book_fields(book) != get_book_fields(mongo_books[id])
+            or mongo_content_hashes.get(id) != get_content_hash(book)
+        ]
+
+        # Deletes first, a stale book may hold the title a replaced book needs
+        report["deleted"] += self.mongo_book_repository.delete_books_by_ids(stale_ids)
+        inserted, updated, write_errors = self.mongo_book_repository.replace_books(books_to_replace)
+        report["inserted"] += inserted
+        report["updated"] += updated
+        # A book that can't be written, e.g. for a title conflict, doesn't stop the run, it is retried by the next one
+        report["failed"] += len(write_errors)
+        for id, error in write_errors.items():
+            logger.warning("Can't repair book %s in Mongo: %s", id, error)
+
+        if stale_ids or books_to_replace:
+            logger.info("Repaired ids [%s, %s) in Mongo: %s stale, %s missing or different",
+                        low, high, len(stale_ids), len(books_to_replace))
+
+
+# Runs the reconciler every RECONCILE_INTERVAL_SECONDS, `on_repaired` is called after a run that repaired books
+class ReconciliationJob(threading.Thread):
+    def __init__(self, book_reconciler: BookReconciler, on_repaired,
+                 interval_seconds: float = RECONCILE_INTERVAL_SECONDS):
+        super().__init__(name="book-reconciliation", daemon=True)
+        self.book_reconciler = book_reconciler
+        self.on_repaired = on_repaired
+        self.interval_seconds = interval_seconds
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                report = self.book_reconciler.reconcile()
+                if report["inserted"] or report["updated"] or report["deleted"]:
+                    self.on_repaired()
+            except Exception:
+                logger.exception("Reconciliation failed")
+            finally:
+                remove_session()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,68 @@
+import logging
+import os
+import threading
+from typing import Callable
+
+from enums.persistence_method import PersistenceMethod
+from repository.postgres_book_repository import remove_session
+
+logger = logging.getLogger(__name__)
+
+# Start-up configuration
+STARTUP_RETRY_SECONDS = float(os.environ.get("BOOK_STARTUP_RETRY_SECONDS", "1"))
+STARTUP_MAX_RETRY_SECONDS = float(os.environ.get("BOOK_STARTUP_MAX_RETRY_SECONDS", "30"))
+
+
+# Prepares every backend in the background, so the app starts serving (and reporting readiness)
+# before the databases are up. A backend whose preparation fails is retried with exponential
+# backoff, a backend waits for the backends it depends on.
+class BookStartup(threading.Thread):
+    def __init__(self, prepare_steps: dict[PersistenceMethod, Callable[[], None]],
+                 dependencies: dict[PersistenceMethod, list[PersistenceMethod]]):
+        super().__init__(name="book-startup", daemon=True)
+        self.prepare_steps = prepare_steps
+        self.dependencies = dependencies
+        self.ready: dict[PersistenceMethod, bool] = {persistence_method: False for persistence_method in prepare_steps}
+        self.errors: dict[PersistenceMethod, str | None] = {persistence_method: None
+                                                            for persistence_method in prepare_steps}
+        self.ready_event = threading.Event()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        failed_attempts = 0
+        while not self.stop_event.is_set():
+            for persistence_method, prepare in self.prepare_steps.items():
+                if self.ready[persistence_method] or not all(self.ready[dependency] for dependency
+                                                             in self.dependencies.get(persistence_method, [])):
+                    continue
+
+                try:
+                    prepare()
+                    self.ready[persistence_method] = True
+                    self.errors[persistence_method] = None
+                    logger.info("%s is ready", persistence_method.value)
+                except Exception as error:
+                    self.errors[persistence_method] = repr(error)
+                    logger.warning("Preparing %s failed, retrying: %r", persistence_method.value, error)
+                finally:
+                    remove_session()
+
+            if all(self.ready.values()):
+                self.ready_event.set()
+                return
+
+            failed_attempts += 1
+            self.stop_event.wait(min(STARTUP_RETRY_SECONDS * 2 ** (failed_attempts - 1), STARTUP_MAX_RETRY_SECONDS))
+
+    def stop(self):
+        self.stop_event.set()
+
+    def wait_until_ready(self, timeout_seconds: float | None = None) -> bool:
+        return self.ready_event.wait(timeout_seconds)
+
+    def get_readiness(self) -> dict:
+        return {
+            persistence_method.value: {"ready": self.ready[persistence_method],
+                                       "error": self.errors[persistence_method]}
+            for persistence_method in self.prepare_steps
+        }
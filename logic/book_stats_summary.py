@@ -0,0 +1,93 @@
+import heapq
+import os
+import threading
+from collections import Counter
+from typing import Iterable, Iterator
+
+from dto.book_dto import BookDTO
+from dto.book_stats_dto import BookStatsDTO
+
+# Catalogue statistics configuration
+STATS_PRICE_BUCKET_WIDTH = int(os.environ.get("BOOK_STATS_PRICE_BUCKET_WIDTH", "50"))
+STATS_YEAR_BUCKET_WIDTH = int(os.environ.get("BOOK_STATS_YEAR_BUCKET_WIDTH", "10"))
+DEFAULT_TOP_AUTHORS = 10
+MAX_TOP_AUTHORS = 100
+
+
+def get_bucket_start(value: int, bucket_width: int) -> int:
+    return value - value % bucket_width
+
+
+def get_top_authors(author_counts: Counter, top_authors: int) -> list[tuple[str, int]]:
+    # Most books first, ties by author name
+    return heapq.nsmallest(top_authors, author_counts.items(),
+                           key=lambda author_count: (-author_count[1], author_count[0]))
+
+
+# Catalogue statistics kept up to date by BookLogic on every write, so reading them costs
+# O(number of genres, buckets and authors) instead of a catalogue scan, and nothing while
+# the catalogue doesn't change. Filled from the same stream that warms up the memory repository.
+class BookStatsSummary:
+    def __init__(self, price_bucket_width: int = STATS_PRICE_BUCKET_WIDTH,
+                 year_bucket_width: int = STATS_YEAR_BUCKET_WIDTH):
+        self.price_bucket_width = price_bucket_width
+        self.year_bucket_width = year_bucket_width
+        self.lock = threading.Lock()
+        self._clear()
+
+    # Yields the books while adding them, so loading shares the memory repository's warm-up pass
+    def load(self, book_dtos: Iterable[BookDTO]) -> Iterator[BookDTO]:
+        with self.lock:
+            self._clear()
+        for book_dto in book_dtos:
+            self.add_book(book_dto)
+            yield book_dto
+
+    def add_book(self, book_dto: BookDTO):
+        self._apply(book_dto, 1)
+
+    def remove_book(self, book_dto: BookDTO):
+        self._apply(book_dto, -1)
+
+    def update_price(self, old_price: int, new_price: int):
+        with self.lock:
+            self._increment(self.price_counts, get_bucket_start(old_price, self.price_bucket_width), -1)
+            self._increment(self.price_counts, get_bucket_start(new_price, self.price_bucket_width), 1)
+            self._last_stats.clear()
+
+    def get_stats(self, top_authors: int) -> BookStatsDTO:
+        with self.lock:
+            stats = self._last_stats.get(top_authors)
+            if stats is None:
+                stats = self._last_stats[top_authors] = BookStatsDTO(
+                    total=self.total,
+                    genre_counts=dict(self.genre_counts),
+                    price_counts=dict(self.price_counts),
+                    year_counts=dict(self.year_counts),
+                    top_authors=get_top_authors(self.author_counts, top_authors)
+                )
+            return stats
+
+    def _clear(self):
+        self.total = 0
+        self.genre_counts: Counter = Counter()
+        self.price_counts: Counter = Counter()
+        self.year_counts: Counter = Counter()
+        self.author_counts: Counter = Counter()
+        # top authors -> stats, until the next change
+        self._last_stats: dict[int, BookStatsDTO] = {}
+
+    def _apply(self, book_dto: BookDTO, delta: int):
+        with self.lock:
+            self.total += delta
+            for genre in book_dto.genres:
+                self._increment(self.genre_counts, genre, delta)
+            self._increment(self.price_counts, get_bucket_start(book_dto.price, self.price_bucket_width), delta)
+            self._increment(self.year_counts, get_bucket_start(book_dto.year, self.year_bucket_width), delta)
+            self._increment(self.author_counts, book_dto.author, delta)
+            self._last_stats.clear()
+
+    def _increment(self, counts: Counter, key, delta: int):
+        counts[key] += delta
+        if counts[key] <= 0:
+            del counts[key]
@@ -0,0 +1,141 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from dto.book_dto import BookDTO
+from enums.write_mode import WriteMode
+from logic.outbox_replicator import (CREATE_OPERATION, DELETE_OPERATION, UPDATE_PRICE_OPERATION, OutboxReplicator,
+                                     get_book_payload)
+from repository.mongo_book_repository import MongoBookRepository
+from repository.postgres_book_repository import PostgresBookRepository
+from repository.postgres_outbox_repository import PostgresOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+# Write pipeline configuration
+WRITE_MODE = WriteMode(os.environ.get("BOOK_WRITE_MODE", WriteMode.SEQUENTIAL.value))
+WRITE_WORKERS = int(os.environ.get("BOOK_WRITE_WORKERS", "8"))
+
+
+# Writes every book change to Postgres and Mongo according to the write mode:
+# SEQUENTIAL    - Postgres then Mongo, on the request thread
+# PARALLEL      - Postgres on the request thread while Mongo is written from a worker pool
+# ASYNC_REPLICA - Postgres and an outbox row in one transaction, Mongo later by the OutboxReplicator
+class BookWritePipeline:
+    def __init__(self, postgres_book_repository: PostgresBookRepository,
+                 mongo_book_repository: MongoBookRepository,
+                 write_mode: WriteMode = WRITE_MODE,
+                 on_replicated: Callable[[List[int]], None] | None = None):
+        self.postgres_book_repository = postgres_book_repository
+        self.mongo_book_repository = mongo_book_repository
+        self.write_mode = write_mode
+        self.executor = None
+        self.outbox_repository = None
+        self.replicator = None
+
+        if write_mode == WriteMode.PARALLEL:
+            self.executor = ThreadPoolExecutor(max_workers=WRITE_WORKERS, thread_name_prefix="book-mongo-write")
+        elif write_mode == WriteMode.ASYNC_REPLICA:
+            self.outbox_repository = PostgresOutboxRepository()
+            self.replicator = OutboxReplicator(self.outbox_repository, mongo_book_repository, on_replicated)
+
+    # Creates the outbox and starts replicating it, run by BookLogic's start-up once Postgres is reachable.
+    # The start-up retries a failed step, the replicator is only started the first time.
+    def prepare(self):
+        if self.outbox_repository is not None:
+            self.outbox_repository.prepare()
+            if self.replicator.ident is None:
+                self.replicator.start()
+
+    def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        if self.write_mode == WriteMode.PARALLEL:
+            mongo_future = self.executor.submit(self.mongo_book_repository.create_book, book_dto)
+            postgres_book = self.postgres_book_repository.create_book(book_dto)
+            mongo_book = mongo_future.result()
+
+            # Postgres decides whether the book exists, undo a Mongo insert it rejected
+            if postgres_book is None and mongo_book is not None:
+                self.mongo_book_repository.delete_book_by_id(book_dto.id)
+            elif postgres_book is not None and mongo_book is None:
+                logger.warning("Book %s was created in Postgres but its title already exists in Mongo", book_dto.id)
+            return postgres_book
+
+        if self.write_mode == WriteMode.ASYNC_REPLICA:
+            return self.create_books([book_dto])[0]
+
+        postgres_book = self.postgres_book_repository.create_book(book_dto)
+        if postgres_book is not None:
+            self.mongo_book_repository.create_book(book_dto)
+        return postgres_book
+
+    def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        if self.write_mode == WriteMode.PARALLEL:
+            mongo_future = self.executor.submit(self.mongo_book_repository.create_books, book_dtos)
+            postgres_books = self.postgres_book_repository.create_books(book_dtos)
+            mongo_books = mongo_future.result()
+
+            for book_dto, postgres_book, mongo_book in zip(book_dtos, postgres_books, mongo_books):
+                if postgres_book is None and mongo_book is not None:
+                    self.mongo_book_repository.delete_book_by_id(book_dto.id)
+            return postgres_books
+
+        if self.write_mode == WriteMode.ASYNC_REPLICA:
+            try:
+                postgres_books = self.postgres_book_repository.create_books(book_dtos, commit=False)
+                self.outbox_repository.add_events(CREATE_OPERATION, [get_book_payload(book)
+                                                                     for book in postgres_books if book is not None])
+                self.postgres_book_repository.commit()
+            except Exception:
+                self.postgres_book_repository.rollback()
+                raise
+            return postgres_books
+
+        postgres_books = self.postgres_book_repository.create_books(book_dtos)
+        self.mongo_book_repository.create_books([book for book in postgres_books if book is not None])
+        return postgres_books
+
+    def update_book_price(self, book_id: int, price: int):
+        if self.write_mode == WriteMode.PARALLEL:
+            mongo_future = self.executor.submit(self.mongo_book_repository.update_book_price, book_id, price)
+            self.postgres_book_repository.update_book_price(book_id, price)
+            mongo_future.result()
+
+        elif self.write_mode == WriteMode.ASYNC_REPLICA:
+            try:
+                self.postgres_book_repository.update_book_price(book_id, price, commit=False)
+                self.outbox_repository.add_events(UPDATE_PRICE_OPERATION, [{"id": book_id, "price": price}])
+                self.postgres_book_repository.commit()
+            except Exception:
+                self.postgres_book_repository.rollback()
+                raise
+
+        else:
+            self.postgres_book_repository.update_book_price(book_id, price)
+            self.mongo_book_repository.update_book_price(book_id, price)
+
+    def delete_book_by_id(self, book_id: int):
+        if self.write_mode == WriteMode.PARALLEL:
+            mongo_future = self.executor.submit(self.mongo_book_repository.delete_book_by_id, book_id)
+            result = self.postgres_book_repository.delete_book_by_id(book_id)
+            mongo_future.result()
+            return result
+
+        if self.write_mode == WriteMode.ASYNC_REPLICA:
+            try:
+                result = self.postgres_book_repository.delete_book_by_id(book_id, commit=False)
+                self.outbox_repository.add_events(DELETE_OPERATION, [{"id": book_id}])
+                self.postgres_book_repository.commit()
+            except Exception:
+                self.postgres_book_repository.rollback()
+                raise
+            return result
+
+        self.mongo_book_repository.delete_book_by_id(book_id)
+        return self.postgres_book_repository.delete_book_by_id(book_id)
+
+    def get_replication_status(self) -> dict:
+        status = {"writeMode": self.write_mode.value}
+        if self.outbox_repository is not None:
+            status.update(self.outbox_repository.get_lag())
+        return status
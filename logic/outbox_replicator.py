@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+from typing import Callable, List
+
+from dto.book_dto import BookDTO
+from repository.mongo_book_repository import MongoBookRepository
+from repository.postgres_book_repository import remove_session
+from repository.postgres_outbox_repository import OutboxEvent, PostgresOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+# Replication configuration
+OUTBOX_BATCH_SIZE = int(os.environ.get("BOOK_OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.environ.get("BOOK_OUTBOX_POLL_INTERVAL_SECONDS", "0.2"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.environ.get("BOOK_OUTBOX_MAX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("BOOK_OUTBOX_MAX_ATTEMPTS", "10"))
+
+CREATE_OPERATION = "create"
+UPDATE_PRICE_OPERATION = "update_price"
+DELETE_OPERATION = "delete"
+
+
+def get_book_payload(book_dto: BookDTO) -> dict:
+    return book_dto.to_dict()
+
+
+def get_book_dto_from_payload(payload: dict) -> BookDTO:
+    return BookDTO(**payload)
+
+
+# Background thread that drains the Postgres outbox into Mongo in batches, in commit order.
+# A failing event stops its batch and is retried with exponential backoff, so a later event
+# for the same book is never applied before it. After OUTBOX_MAX_ATTEMPTS it is moved to the
+# dead-letter table instead and the outbox moves on, the reconciler repairs the book in Mongo.
+# on_replicated gets the ids of the books changed in Mongo, cached Mongo reads of them are stale.
+class OutboxReplicator(threading.Thread):
+    def __init__(self, outbox_repository: PostgresOutboxRepository, mongo_book_repository: MongoBookRepository,
+                 on_replicated: Callable[[List[int]], None] | None = None):
+        super().__init__(name="book-outbox-replicator", daemon=True)
+        self.outbox_repository = outbox_repository
+        self.mongo_book_repository = mongo_book_repository
+        self.on_replicated = on_replicated
+        self.stop_event = threading.Event()
+        self.consecutive_failures = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                replicated_events = self.replicate_batch()
+            except Exception:
+                logger.exception("Outbox replication failed")
+                self.outbox_repository.rollback()
+                replicated_events = 0
+            finally:
+                remove_session()
+
+            if self.consecutive_failures:
+                backoff_seconds = OUTBOX_POLL_INTERVAL_SECONDS * 2 ** self.consecutive_failures
+                self.stop_event.wait(min(backoff_seconds, OUTBOX_MAX_BACKOFF_SECONDS))
+            elif replicated_events < OUTBOX_BATCH_SIZE:
+                self.stop_event.wait(OUTBOX_POLL_INTERVAL_SECONDS)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def replicate_batch(self) -> int:
+        if not self.outbox_repository.try_lock_drain():
+            self.outbox_repository.rollback()
+            return 0
+
+        events = self.outbox_repository.fetch_events(OUTBOX_BATCH_SIZE)
+        replicated_events = []
+
+        try:
+            event_index = 0
+            while event_index < len(events):
+                # Consecutive creates go to Mongo in one insert_many
+                creates = self.get_consecutive_creates(events, event_index)
+                if creates:
+                    self.mongo_book_repository.create_books([get_book_dto_from_payload(event.payload)
+                                                             for event in creates])
+                    replicated_events.extend(creates)
+                    event_index += len(creates)
+                    continue
+
+                self.apply_event(events[event_index])
+                replicated_events.append(events[event_index])
+                event_index += 1
+
+            self.consecutive_failures = 0
+
+        except Exception as error:
+            failed_event = events[len(replicated_events)]
+            logger.warning("Replicating outbox event %s failed: %r", failed_event.id, error)
+            self.outbox_repository.record_failure(failed_event, error)
+            if failed_event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error("Outbox event %s failed %s times, moved to the dead-letter table",
+                             failed_event.id, failed_event.attempts)
+                self.outbox_repository.dead_letter_event(failed_event)
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+
+        # Read before the commit expires the events
+        replicated_book_ids = [event.payload["id"] for event in replicated_events]
+        self.outbox_repository.delete_events([event.id for event in replicated_events])
+        self.outbox_repository.commit()
+
+        if replicated_book_ids and self.on_replicated is not None:
+            self.on_replicated(replicated_book_ids)
+        return len(replicated_book_ids)
+
+    def get_consecutive_creates(self, events: List[OutboxEvent], start_index: int) -> List[OutboxEvent]:
+        end_index = start_index
+        while end_index < len(events) and events[end_index].operation == CREATE_OPERATION:
+            end_index += 1
+        return events[start_index:end_index]
+
+    def apply_event(self, event: OutboxEvent):
+        if event.operation == UPDATE_PRICE_OPERATION:
+            self.mongo_book_repository.update_book_price(event.payload["id"], event.payload["price"])
+        elif event.operation == DELETE_OPERATION:
+            self.mongo_book_repository.delete_book_by_id(event.payload["id"])
+        else:
+            raise ValueError(f"Unknown outbox operation {event.operation}")
@@ -8,4 +8,4 @@ PORT = 8574
 
 if __name__ == "__main__":
     book_controller = BookController(app)
-    app.run(host=HOST, port=PORT)
+    app.run(host=HOST, port=PORT, threaded=True)
@@ -0,0 +1,121 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics.metrics_registry import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Slow query logging configuration, every slow query is counted but only a sample of them is logged
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_LOG_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_LOG_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_LOG_MAX_LENGTH = 1000
+
+slow_queries_counter = metrics_registry.counter("book_slow_queries_total",
+                                                "Database queries slower than SLOW_QUERY_THRESHOLD_MS",
+                                                ("backend",))
+
+
+def record_query_duration(backend: str, duration_seconds: float, describe_query):
+    if duration_seconds * 1000 < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    slow_queries_counter.inc((backend,))
+    if random.random() < SLOW_QUERY_LOG_SAMPLE_RATE:
+        # describe_query is only called for logged queries, building the text has a cost
+        logger.warning("Slow %s query (%.1f ms): %s", backend, duration_seconds * 1000,
+                       describe_query()[:SLOW_QUERY_LOG_MAX_LENGTH])
+
+
+def instrument_engine(engine: Engine):
+    # Replaces echo=True, which wrote every statement to stdout on the request thread
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        duration_seconds = time.perf_counter() - connection.info["query_start_times"].pop()
+        record_query_duration("postgres", duration_seconds, lambda: statement)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        query_start_times = exception_context.connection.info.get("query_start_times") \
+            if exception_context.connection is not None else None
+        if query_start_times:
+            query_start_times.pop()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        # request id -> "command collection", started and succeeded events of a command come in pairs
+        self._commands: dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._commands[event.request_id] = f"{event.command_name} {event.command.get(event.command_name)}"
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._record(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._record(event)
+
+    def _record(self, event):
+        command = self._commands.pop(event.request_id, event.command_name)
+        record_query_duration("mongo", event.duration_micros / 1_000_000, lambda: command)
+
+
+# pymongo has no pool statistics API, the pool events are counted instead
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.open_connections = 0
+        self.checked_out_connections = 0
+        self._lock = threading.Lock()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"open": self.open_connections, "checkedOut": self.checked_out_connections}
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out_connections += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out_connections -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
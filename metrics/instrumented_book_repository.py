@@ -0,0 +1,79 @@
+import inspect
+import time
+from typing import AsyncIterator, Iterator
+
+from enums.persistence_method import PersistenceMethod
+from metrics.metrics_registry import metrics_registry
+
+# Methods returning generators, their time is measured until the generator is exhausted
+ITERATOR_METHODS = {"iter_books"}
+
+repository_duration_histogram = metrics_registry.histogram("book_repository_duration_seconds",
+                                                           "Book repository method latency",
+                                                           ("backend", "method"))
+repository_errors_counter = metrics_registry.counter("book_repository_errors_total",
+                                                     "Book repository methods that raised",
+                                                     ("backend", "method"))
+
+
+# Wraps any book repository, synchronous or asyncio, and records the latency of each of its methods,
+# by backend and method
+class InstrumentedBookRepository:
+    def __init__(self, book_repository, persistence_method: PersistenceMethod):
+        self.book_repository = book_repository
+        self.backend = persistence_method.value.lower()
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.book_repository, name)
+        if not callable(attribute):
+            return attribute
+
+        label_values = (self.backend, name)
+        if inspect.isasyncgenfunction(attribute):
+            async def timed_async_iterator(*args, **kwargs) -> AsyncIterator:
+                start = time.perf_counter()
+                try:
+                    async for item in attribute(*args, **kwargs):
+                        yield item
+                except Exception:
+                    repository_errors_counter.inc(label_values)
+                    raise
+                finally:
+                    repository_duration_histogram.observe(label_values, time.perf_counter() - start)
+            timed_method = timed_async_iterator
+        elif inspect.iscoroutinefunction(attribute):
+            async def timed_coroutine(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                except Exception:
+                    repository_errors_counter.inc(label_values)
+                    raise
+                finally:
+                    repository_duration_histogram.observe(label_values, time.perf_counter() - start)
+            timed_method = timed_coroutine
+        elif name in ITERATOR_METHODS:
+            def timed_iterator(*args, **kwargs) -> Iterator:
+                start = time.perf_counter()
+                try:
+                    yield from attribute(*args, **kwargs)
+                except Exception:
+                    repository_errors_counter.inc(label_values)
+                    raise
+                finally:
+                    repository_duration_histogram.observe(label_values, time.perf_counter() - start)
+            timed_method = timed_iterator
+        else:
+            def timed_method(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attribute(*args, **kwargs)
+                except Exception:
+                    repository_errors_counter.inc(label_values)
+                    raise
+                finally:
+                    repository_duration_histogram.observe(label_values, time.perf_counter() - start)
+
+        # Cached on the instance, __getattr__ only runs on the first lookup of each method
+        setattr(self, name, timed_method)
+        return timed_method
@@ -0,0 +1,141 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a cache hit to a slow full listing
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra_label: str = "") -> str:
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra_label:
+        labels.append(extra_label)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"
+
+
+# Read when scraped, `collect` returns (label values, value) pairs
+class Gauge:
+    def __init__(self, name: str, help_text: str, label_names: tuple,
+                 collect: Callable[[], Iterable[tuple[tuple, float]]]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        for label_values, value in self.collect():
+            yield f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"
+
+
+# Per-bucket counts are kept non-cumulative so observe() touches a single bucket,
+# render() sums them up into Prometheus' cumulative le buckets
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        bucket_index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [bucket counts, sum, count]
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][bucket_index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            all_series = [(label_values, list(bucket_counts), total, count)
+                          for label_values, (bucket_counts, total, count) in self._series.items()]
+
+        for label_values, bucket_counts, total, count in all_series:
+            cumulative_count = 0
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative_count += bucket_count
+                labels = format_labels(self.label_names, label_values, f'le="{format_value(bucket)}"')
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+            labels = format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+# Process-wide set of metrics, each one is registered once by name and rendered together
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: tuple,
+              collect: Callable[[], Iterable[tuple[tuple, float]]]) -> Gauge:
+        return self._register(Gauge(name, help_text, label_names, collect))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        # Registering a name again returns the existing metric, except for gauges whose collect
+        # function is replaced (a new BookLogic reports its own caches)
+        with self._lock:
+            existing_metric = self._metrics.get(metric.name)
+            if existing_metric is not None and not isinstance(metric, Gauge):
+                return existing_metric
+            self._metrics[metric.name] = metric
+            return metric
+
+
+metrics_registry = MetricsRegistry()
@@ -1,12 +1,17 @@
 from abc import ABC
-from typing import List
+from typing import Iterator, List
 
 from dto.book_dto import BookDTO
 from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
 
 
 class AbstractBookRepository(ABC):
-    def create_book(self, book_dto: BookDTO) -> BookDTO:
+    def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        return NotImplemented
+
+    def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
         return NotImplemented
 
     def update_book_price(self, book_id: int, new_price: int) -> int | None:
@@ -18,8 +23,21 @@ class AbstractBookRepository(ABC):
     def get_book_by_title(self, title: str) -> BookDTO:
         return NotImplemented
 
-    def get_books(self, book_filter_parameters: BookFilterParametersDTO) -> List[BookDTO]:
+    def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                  book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        return NotImplemented
+
+    def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                   book_page_parameters: BookPageParametersDTO | None = None) -> Iterator[BookDTO]:
         return NotImplemented
 
     def get_books_total(self) -> int:
         return NotImplemented
+
+    # Books whose title or author contains the query (case-insensitively), most relevant first
+    def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        return NotImplemented
+
+    # Books per genre, per price and year bucket (keyed by the bucket start) and the authors with the most books
+    def get_book_stats(self, price_bucket_width: int, year_bucket_width: int, top_authors: int) -> BookStatsDTO:
+        return NotImplemented
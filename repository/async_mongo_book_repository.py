@@ -0,0 +1,164 @@
+from typing import AsyncIterator, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument, uri_parser
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from metrics.database_metrics import MongoPoolListener
+from repository.abstract_book_repository import AbstractBookRepository
+from repository.mongo_book_repository import (BOOK_PROJECTION, BOOKS_TOTAL_NAME, BULK_INSERT_CHUNK_SIZE,
+                                              CASE_INSENSITIVE_COLLATION, DB_NAME, DB_TABLE_NAME,
+                                              DUPLICATE_KEY_ERROR_CODE, MAX_IDLE_TIME_MS, MAX_POOL_SIZE,
+                                              MIN_POOL_SIZE, MONGO_URL, SEARCH_CANDIDATE_LIMIT,
+                                              SERVER_SELECTION_TIMEOUT_MS, STREAM_BATCH_SIZE, TOTALS_COLLECTION_NAME,
+                                              WAIT_QUEUE_TIMEOUT_MS, MongoBookRepository, build_book_stats_pipeline,
+                                              build_books_filter, build_search_filter, command_listener,
+                                              get_book_document, get_book_dto_from_document, get_book_stats_dto,
+                                              get_books_fields, get_search_results)
+
+# Same order as the synchronous listings, lower(title), rawid through the collation
+BOOKS_SORT = [("title", ASCENDING), ("rawid", ASCENDING)]
+# Like mongoengine, a database in MONGO_URL wins over DB_NAME
+ASYNC_DB_NAME = uri_parser.parse_uri(MONGO_URL)["database"] or DB_NAME
+
+async_pool_listener = MongoPoolListener()
+
+# Motor connects on the first operation, from the running event loop. Replaced by the benchmarks' stand-in.
+client = AsyncIOMotorClient(MONGO_URL,
+                            maxPoolSize=MAX_POOL_SIZE,
+                            minPoolSize=MIN_POOL_SIZE,
+                            maxIdleTimeMS=MAX_IDLE_TIME_MS,
+                            waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                            event_listeners=[command_listener, async_pool_listener])
+
+
+def get_pool_stats() -> dict:
+    return async_pool_listener.get_stats()
+
+
+def get_books_collection():
+    return client[ASYNC_DB_NAME][DB_TABLE_NAME]
+
+
+def get_totals_collection():
+    return client[ASYNC_DB_NAME][TOTALS_COLLECTION_NAME]
+
+
+async def add_to_books_total(delta: int) -> int:
+    books_total = await get_totals_collection().find_one_and_update({"_id": BOOKS_TOTAL_NAME},
+                                                                    {"$inc": {"total": delta}},
+                                                                    return_document=ReturnDocument.AFTER)
+    return books_total["total"]
+
+
+# MongoBookRepository on motor, every method is a coroutine (iter_books an async generator).
+# Queries are built by the synchronous repository's module.
+class AsyncMongoBookRepository(AbstractBookRepository):
+    # The one-time index and totals set-up is the synchronous repository's, run by the start-up thread
+    def prepare(self):
+        MongoBookRepository().prepare()
+
+    async def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        new_book = get_book_document(book_dto)
+
+        try:
+            await get_books_collection().insert_one(new_book)
+        except DuplicateKeyError:
+            return None
+
+        await add_to_books_total(1)
+        return get_book_dto_from_document(new_book)
+
+    async def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        created_books = []
+
+        for chunk_start in range(0, len(book_dtos), BULK_INSERT_CHUNK_SIZE):
+            chunk = book_dtos[chunk_start:chunk_start + BULK_INSERT_CHUNK_SIZE]
+            new_books = [get_book_document(book_dto) for book_dto in chunk]
+
+            inserted_count = 0
+            failed_indexes = set()
+            try:
+                await get_books_collection().insert_many(new_books, ordered=False)
+                inserted_count = len(new_books)
+            except BulkWriteError as error:
+                inserted_count = error.details.get("nInserted", 0)
+                write_errors = error.details.get("writeErrors", [])
+                if any(write_error["code"] != DUPLICATE_KEY_ERROR_CODE for write_error in write_errors):
+                    raise
+                failed_indexes = {write_error["index"] for write_error in write_errors}
+            finally:
+                # Documents without an error are inserted even when other ones of the chunk fail for another reason
+                if inserted_count:
+                    await add_to_books_total(inserted_count)
+
+            created_books.extend(
+                get_book_dto_from_document(new_book) if index not in failed_indexes else None
+                for index, new_book in enumerate(new_books)
+            )
+
+        return created_books
+
+    async def update_book_price(self, book_id: int, new_price: int) -> None:
+        await get_books_collection().update_one({"rawid": book_id}, {"$set": {"price": new_price}})
+
+    async def get_books_total(self) -> int:
+        books_total = await get_totals_collection().find_one({"_id": BOOKS_TOTAL_NAME})
+        return books_total["total"] if books_total else 0
+
+    async def get_book_by_title(self, title: str) -> BookDTO | None:
+        document = await get_books_collection().find_one({"title": title}, BOOK_PROJECTION,
+                                                         collation=CASE_INSENSITIVE_COLLATION)
+        return get_book_dto_from_document(document)
+
+    async def get_book_by_id(self, id: int) -> BookDTO | None:
+        document = await get_books_collection().find_one({"rawid": id}, BOOK_PROJECTION)
+        return get_book_dto_from_document(document)
+
+    # Returns the books total after the delete, or None when there is no such book
+    async def delete_book_by_id(self, id: int) -> int | None:
+        result = await get_books_collection().delete_one({"rawid": id})
+        if result.deleted_count == 0:
+            return None
+        return await add_to_books_total(-result.deleted_count)
+
+    async def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                        book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        return [book async for book in self.iter_books(book_filter_parameters, book_page_parameters)]
+
+    async def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                         book_page_parameters: BookPageParametersDTO | None = None) -> AsyncIterator[BookDTO]:
+        fields = get_books_fields(book_page_parameters)
+        projection = {"_id": 0, **dict.fromkeys(fields, 1)} if fields else BOOK_PROJECTION
+        documents = (get_books_collection()
+                     .find(build_books_filter(book_filter_parameters, book_page_parameters), projection)
+                     .sort(BOOKS_SORT)
+                     .collation(CASE_INSENSITIVE_COLLATION)
+                     .batch_size(STREAM_BATCH_SIZE))
+        if book_page_parameters and book_page_parameters.limit is not None:
+            documents = documents.limit(book_page_parameters.limit)
+
+        async for document in documents:
+            yield get_book_dto_from_document(document)
+
+    async def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        search_filter = build_search_filter(query)
+        if search_filter is None:
+            return []
+
+        documents = get_books_collection().find(search_filter, BOOK_PROJECTION).limit(SEARCH_CANDIDATE_LIMIT)
+        return get_search_results(query, [document async for document in documents], limit)
+
+    async def get_book_stats(self, price_bucket_width: int, year_bucket_width: int,
+                             top_authors: int) -> BookStatsDTO:
+        pipeline = build_book_stats_pipeline(price_bucket_width, year_bucket_width, top_authors)
+        facets = await get_books_collection().aggregate(pipeline).to_list(1)
+        return get_book_stats_dto(facets[0])
+
+    def close(self):
+        client.close()
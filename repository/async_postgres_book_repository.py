@@ -0,0 +1,150 @@
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from metrics.database_metrics import instrument_engine
+from repository.abstract_book_repository import AbstractBookRepository
+from repository.postgres_book_repository import (BOOK_ROW_COLUMNS, BULK_INSERT_CHUNK_SIZE, DATABASE_URL, MAX_OVERFLOW,
+                                                 POOL_PRE_PING, POOL_RECYCLE_SECONDS, POOL_SIZE, POOL_TIMEOUT_SECONDS,
+                                                 STATS_ISOLATION_LEVEL, STREAM_BATCH_SIZE, Book, PostgresBookRepository,
+                                                 build_book_stats_queries, build_books_query, build_search_query,
+                                                 get_book_dto_copy, get_book_dto_from_row, get_book_row,
+                                                 get_book_stats_dto, get_books_total_query, get_delete_book_statement,
+                                                 get_insert_books_statement)
+
+# Same database as the synchronous repository, through asyncpg
+ASYNC_DATABASE_URL = os.environ.get("POSTGRES_ASYNC_URL",
+                                    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL,
+                                   pool_size=POOL_SIZE,
+                                   max_overflow=MAX_OVERFLOW,
+                                   pool_timeout=POOL_TIMEOUT_SECONDS,
+                                   pool_recycle=POOL_RECYCLE_SECONDS,
+                                   pool_pre_ping=POOL_PRE_PING)
+instrument_engine(async_engine.sync_engine)
+
+
+@asynccontextmanager
+async def join_transaction(connection: AsyncConnection | None = None) -> AsyncIterator[AsyncConnection]:
+    # Joins the caller's transaction when given one, otherwise runs in a transaction of its own
+    if connection is not None:
+        yield connection
+        return
+
+    async with async_engine.begin() as connection:
+        yield connection
+
+
+def get_pool_stats() -> dict:
+    return {
+        "size": async_engine.pool.size(),
+        "checkedIn": async_engine.pool.checkedin(),
+        "checkedOut": async_engine.pool.checkedout(),
+        "overflow": async_engine.pool.overflow()
+    }
+
+
+# PostgresBookRepository on SQLAlchemy's asyncio extension, every method is a coroutine (iter_books an async
+# generator) and runs on a pooled asyncpg connection. Statements are built by the synchronous repository's
+# module. Write methods take the `connection` of a transaction the caller adds more to (the outbox).
+class AsyncPostgresBookRepository(AbstractBookRepository):
+    def __init__(self):
+        self.trigram_search = False
+        self.unique_titles = True
+
+    # The one-time schema set-up is the synchronous repository's, run by the start-up thread
+    def prepare(self):
+        schema_book_repository = PostgresBookRepository()
+        schema_book_repository.prepare()
+        self.trigram_search = schema_book_repository.trigram_search
+        self.unique_titles = schema_book_repository.unique_titles
+
+    def begin(self):
+        return async_engine.begin()
+
+    async def create_book(self, book_dto: BookDTO, connection: AsyncConnection | None = None) -> BookDTO | None:
+        return (await self.create_books([book_dto], connection))[0]
+
+    async def create_books(self, book_dtos: List[BookDTO],
+                           connection: AsyncConnection | None = None) -> List[BookDTO | None]:
+        created_books = []
+
+        async with join_transaction(connection) as connection:
+            for chunk_start in range(0, len(book_dtos), BULK_INSERT_CHUNK_SIZE):
+                chunk = book_dtos[chunk_start:chunk_start + BULK_INSERT_CHUNK_SIZE]
+                created_book_ids = set(await connection.scalar(
+                    get_insert_books_statement([get_book_row(book_dto) for book_dto in chunk], self.unique_titles)
+                ) or [])
+                created_books.extend(
+                    get_book_dto_copy(book_dto) if book_dto.id in created_book_ids else None
+                    for book_dto in chunk
+                )
+
+        return created_books
+
+    async def update_book_price(self, book_id: int, new_price: int,
+                                connection: AsyncConnection | None = None) -> None:
+        async with join_transaction(connection) as connection:
+            await connection.execute(update(Book.__table__).where(Book.rawid == book_id).values(price=new_price))
+
+    async def get_books_total(self) -> int:
+        async with async_engine.connect() as connection:
+            return await connection.scalar(get_books_total_query())
+
+    async def get_book_by_title(self, title: str) -> BookDTO | None:
+        async with async_engine.connect() as connection:
+            result = await connection.execute(select(*BOOK_ROW_COLUMNS)
+                                              .where(func.lower(Book.title) == title.lower()))
+            return get_book_dto_from_row(result.first())
+
+    async def get_book_by_id(self, id: int) -> BookDTO | None:
+        async with async_engine.connect() as connection:
+            result = await connection.execute(select(*BOOK_ROW_COLUMNS).where(Book.rawid == id))
+            return get_book_dto_from_row(result.first())
+
+    # Returns the books total after the delete, or None when there is no such book
+    async def delete_book_by_id(self, id: int, connection: AsyncConnection | None = None) -> int | None:
+        async with join_transaction(connection) as connection:
+            books_total, deleted_books_count = (await connection.execute(get_delete_book_statement(id))).one()
+        return books_total if deleted_books_count else None
+
+    async def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                        book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        async with async_engine.connect() as connection:
+            result = await connection.execute(build_books_query(book_filter_parameters, book_page_parameters))
+            return [get_book_dto_from_row(row) for row in result]
+
+    async def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                         book_page_parameters: BookPageParametersDTO | None = None) -> AsyncIterator[BookDTO]:
+        query = build_books_query(book_filter_parameters, book_page_parameters)
+
+        # Server-side cursor, rows are fetched STREAM_BATCH_SIZE at a time
+        async with async_engine.connect() as connection:
+            result = await connection.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for row in result:
+                yield get_book_dto_from_row(row)
+
+    async def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        async with async_engine.connect() as connection:
+            result = await connection.execute(build_search_query(query, limit, self.trigram_search))
+            return [get_book_dto_from_row(row) for row in result]
+
+    async def get_book_stats(self, price_bucket_width: int, year_bucket_width: int,
+                             top_authors: int) -> BookStatsDTO:
+        queries = build_book_stats_queries(price_bucket_width, year_bucket_width, top_authors)
+        async with async_engine.connect() as connection:
+            await connection.execution_options(isolation_level=STATS_ISOLATION_LEVEL)
+            total = await connection.scalar(get_books_total_query())
+            results = [(await connection.execute(query)).all() for query in queries]
+        return get_book_stats_dto(total, *results)
+
+    async def close(self):
+        await async_engine.dispose()
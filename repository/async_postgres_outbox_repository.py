@@ -0,0 +1,18 @@
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from repository.async_postgres_book_repository import async_engine
+from repository.postgres_outbox_repository import get_insert_events_statement, get_lag, get_lag_query
+
+
+# Writes to the outbox of PostgresOutboxRepository from the asyncio app, the OutboxReplicator drains it as usual
+class AsyncPostgresOutboxRepository:
+    # Adds to the caller's transaction, committed together with its Postgres write
+    async def add_events(self, connection: AsyncConnection, operation: str, payloads: List[dict]):
+        if payloads:
+            await connection.execute(get_insert_events_statement(operation, payloads))
+
+    async def get_lag(self) -> dict:
+        async with async_engine.connect() as connection:
+            return get_lag(*(await connection.execute(get_lag_query())).one())
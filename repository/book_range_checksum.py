@@ -0,0 +1,20 @@
+import hashlib
+
+from dto.book_dto import BookDTO
+
+# Per-row checksum shared by the Postgres query and the Mongo pipeline, so equal rows get equal
+# checksums in both stores. A row's content hash is one plus the first 20 bits of the md5 of its fields
+# other than the price, which Mongo can't compute: Postgres hashes the row in the query, Mongo documents
+# store the hash get_content_hash gave them when they were written. The row checksum multiplies it by
+# the offset price modulo a prime, so any price change changes it and swapped or shifted values don't
+# cancel out in a range's sum. Products stay below 2^53, exact even where Mongo computes in doubles.
+CHECKSUM_MODULUS = 2147483647
+CONTENT_HASH_HEX_DIGITS = 5
+CONTENT_HASH_SEPARATOR = "\x1f"
+PRICE_OFFSET = 2 ** 31
+
+
+def get_content_hash(book_dto: BookDTO) -> int:
+    content = CONTENT_HASH_SEPARATOR.join([str(book_dto.id), book_dto.title, book_dto.author, str(book_dto.year),
+                                           ",".join(sorted(book_dto.genres))])
+    return int(hashlib.md5(content.encode()).hexdigest()[:CONTENT_HASH_HEX_DIGITS], 16) + 1
@@ -0,0 +1,48 @@
+import re
+
+# Substring search shared by the memory and Mongo repositories, ranked like the Postgres query:
+# trigram similarity to the title or the author, plus one for a prefix match.
+# Queries have at least 3 characters, so every query has a trigram to look candidates up by.
+
+# pg_trgm splits text into words of alphanumeric characters
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+# Trigrams of the lowercased text the way pg_trgm's similarity sees it: every word on its own,
+# padded with two spaces in front and one behind
+def get_trigrams(text: str) -> set[str]:
+    trigrams = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded_word = f"  {word} "
+        trigrams.update(padded_word[index:index + 3] for index in range(len(padded_word) - 2))
+    return trigrams
+
+
+# Every 3 characters of the lowercased text, spaces and punctuation included. Candidates are looked up by
+# these: a book containing the query has every substring trigram of the query in its title or author.
+def get_substring_trigrams(text: str) -> set[str]:
+    lower_text = text.lower()
+    return {lower_text[index:index + 3] for index in range(len(lower_text) - 2)}
+
+
+# The substring trigrams a book is looked up by
+def get_book_substring_trigrams(title: str, author: str) -> set[str]:
+    return get_substring_trigrams(title) | get_substring_trigrams(author)
+
+
+def get_similarity(query_trigrams: set[str], text: str) -> float:
+    text_trigrams = get_trigrams(text)
+    all_trigrams = query_trigrams | text_trigrams
+    return len(query_trigrams & text_trigrams) / len(all_trigrams) if all_trigrams else 0.0
+
+
+# Returns None for a book whose title and author don't contain the query
+def get_search_relevance(lower_query: str, query_trigrams: set[str], title: str, author: str) -> float | None:
+    lower_title, lower_author = title.lower(), author.lower()
+    if lower_query not in lower_title and lower_query not in lower_author:
+        return None
+
+    relevance = max(get_similarity(query_trigrams, lower_title), get_similarity(query_trigrams, lower_author))
+    if lower_title.startswith(lower_query) or lower_author.startswith(lower_query):
+        relevance += 1
+    return relevance
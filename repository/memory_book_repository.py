@@ -0,0 +1,336 @@
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Iterable, Iterator, List
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from repository.abstract_book_repository import AbstractBookRepository
+from repository.book_search import (get_book_substring_trigrams, get_search_relevance, get_substring_trigrams,
+                                    get_trigrams)
+
+# Sorts after every slot number, so bisect over (value, slot) pairs can find value boundaries
+MAX_SLOT = float("inf")
+
+
+# Columnar book storage, one list per field indexed by slot. Slots of deleted books are reused.
+class BookColumns:
+    __slots__ = ("ids", "titles", "authors", "years", "prices", "genres", "free_slots")
+
+    def __init__(self):
+        self.ids: List[int | None] = []
+        self.titles: List[str | None] = []
+        self.authors: List[str | None] = []
+        self.years: List[int | None] = []
+        self.prices: List[int | None] = []
+        self.genres: List[list | None] = []
+        self.free_slots: List[int] = []
+
+    def add(self, book_dto: BookDTO) -> int:
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.ids[slot] = book_dto.id
+            self.titles[slot] = book_dto.title
+            self.authors[slot] = book_dto.author
+            self.years[slot] = book_dto.year
+            self.prices[slot] = book_dto.price
+            self.genres[slot] = list(book_dto.genres)
+            return slot
+
+        self.ids.append(book_dto.id)
+        self.titles.append(book_dto.title)
+        self.authors.append(book_dto.author)
+        self.years.append(book_dto.year)
+        self.prices.append(book_dto.price)
+        self.genres.append(list(book_dto.genres))
+        return len(self.ids) - 1
+
+    def remove(self, slot: int):
+        self.ids[slot] = None
+        self.titles[slot] = None
+        self.authors[slot] = None
+        self.years[slot] = None
+        self.prices[slot] = None
+        self.genres[slot] = None
+        self.free_slots.append(slot)
+
+    def get_book_dto(self, slot: int) -> BookDTO:
+        return BookDTO(id=self.ids[slot],
+                       title=self.titles[slot],
+                       author=self.authors[slot],
+                       year=self.years[slot],
+                       price=self.prices[slot],
+                       genres=list(self.genres[slot]))
+
+
+# Python ints are immutable, any bit operation on a bitset copies all of it. Both helpers touch the
+# large int once and work on 64-bit words or bytes, instead of once per slot.
+def iter_bitset_slots(bitset: int) -> Iterator[int]:
+    words = array("Q", bitset.to_bytes((bitset.bit_length() + 63) // 64 * 8, "little"))
+    if sys.byteorder == "big":
+        words.byteswap()
+
+    for word_index, word in enumerate(words):
+        while word:
+            lowest_bit = word & -word
+            yield word_index * 64 + lowest_bit.bit_length() - 1
+            word ^= lowest_bit
+
+
+def get_bitset(slots: Iterable[int]) -> int:
+    bitset_bytes = bytearray()
+    for slot in slots:
+        byte_index = slot >> 3
+        if byte_index >= len(bitset_bytes):
+            bitset_bytes.extend(bytes(byte_index + 1 - len(bitset_bytes)))
+        bitset_bytes[byte_index] |= 1 << (slot & 7)
+    return int.from_bytes(bitset_bytes, "little")
+
+
+def get_range_bounds(index: list, bigger_than: int | None, less_than: int | None) -> tuple[int, int]:
+    start = bisect_right(index, (bigger_than, MAX_SLOT)) if bigger_than is not None else 0
+    end = bisect_left(index, (less_than, -1)) if less_than is not None else len(index)
+    return start, max(start, end)
+
+
+# Books held entirely in process and filtered by intersecting indexes:
+# sorted (value, slot) lists for price and year ranges, hash indexes on the lowercased author and title,
+# and one bitset of slots per genre (plus one for all live slots). Search uses an inverted index from
+# every substring trigram of a title or author to the slots having it.
+# Warmed up from Postgres by BookLogic, which also applies every write to it.
+class MemoryBookRepository(AbstractBookRepository):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._clear()
+
+    # Replaces the whole content. Writes applied while loading wait for the lock, so they land after it;
+    # writes applied before it are already part of `book_dtos` when it is read under the lock.
+    def load(self, book_dtos: Iterable[BookDTO]):
+        with self.lock:
+            self._clear()
+            # Bitsets and range indexes are built once at the end instead of one bit and one insort per book
+            for book_dto in book_dtos:
+                self._add_book(book_dto, bulk=True)
+
+            columns = self.columns
+            slot_count = len(columns.ids)
+            author_slots: dict[str, list[int]] = {}
+            genre_slots: dict[str, list[int]] = {}
+            for slot in range(slot_count):
+                author_slots.setdefault(columns.authors[slot].lower(), []).append(slot)
+                for genre in columns.genres[slot]:
+                    genre_slots.setdefault(genre, []).append(slot)
+
+            self.slots_by_author = {author: get_bitset(slots) for author, slots in author_slots.items()}
+            self.slots_by_genre = {genre: get_bitset(slots) for genre, slots in genre_slots.items()}
+            self.live_slots = (1 << slot_count) - 1
+            self.price_index = sorted(zip(columns.prices, range(slot_count)))
+            self.year_index = sorted(zip(columns.years, range(slot_count)))
+
+    def create_book(self, book_dto: BookDTO) -> BookDTO | None:
+        with self.lock:
+            if book_dto.title.lower() in self.slot_by_title or book_dto.id in self.slot_by_id:
+                return None
+            return self.columns.get_book_dto(self._add_book(book_dto))
+
+    def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        with self.lock:
+            return [self.create_book(book_dto) for book_dto in book_dtos]
+
+    def update_book_price(self, book_id: int, new_price: int) -> None:
+        with self.lock:
+            slot = self.slot_by_id.get(book_id)
+            if slot is None:
+                return None
+
+            self._remove_from_sorted_index(self.price_index, self.columns.prices[slot], slot)
+            self.columns.prices[slot] = new_price
+            insort(self.price_index, (new_price, slot))
+
+    def get_book_by_id(self, id: int) -> BookDTO | None:
+        with self.lock:
+            slot = self.slot_by_id.get(id)
+            return self.columns.get_book_dto(slot) if slot is not None else None
+
+    def get_book_by_title(self, title: str) -> BookDTO | None:
+        with self.lock:
+            slot = self.slot_by_title.get(title.lower())
+            return self.columns.get_book_dto(slot) if slot is not None else None
+
+    # Returns the books total after the delete, or None when there is no such book
+    def delete_book_by_id(self, id: int) -> int | None:
+        with self.lock:
+            slot = self.slot_by_id.pop(id, None)
+            if slot is None:
+                return None
+
+            slot_bit = 1 << slot
+            del self.slot_by_title[self.columns.titles[slot].lower()]
+            self._remove_from_bitset_index(self.slots_by_author, self.columns.authors[slot].lower(), slot_bit)
+            for genre in self.columns.genres[slot]:
+                self._remove_from_bitset_index(self.slots_by_genre, genre, slot_bit)
+            self._remove_from_sorted_index(self.price_index, self.columns.prices[slot], slot)
+            self._remove_from_sorted_index(self.year_index, self.columns.years[slot], slot)
+            for trigram in get_book_substring_trigrams(self.columns.titles[slot], self.columns.authors[slot]):
+                trigram_slots = self.slots_by_trigram[trigram]
+                trigram_slots.discard(slot)
+                if not trigram_slots:
+                    del self.slots_by_trigram[trigram]
+            self.live_slots &= ~slot_bit
+
+            self.columns.remove(slot)
+            return len(self.slot_by_id)
+
+    def get_books_total(self) -> int:
+        return len(self.slot_by_id)
+
+    def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                  book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        with self.lock:
+            slots = self._get_matching_slots(book_filter_parameters)
+            columns = self.columns
+
+            # Same order and keyset pagination as the database backends: lower(title), then id
+            sort_keys = ((columns.titles[slot].lower(), columns.ids[slot], slot) for slot in iter_bitset_slots(slots))
+            if book_page_parameters and book_page_parameters.after_title is not None:
+                after_key = (book_page_parameters.after_title, book_page_parameters.after_id)
+                sort_keys = (sort_key for sort_key in sort_keys if sort_key[:2] > after_key)
+
+            if book_page_parameters and book_page_parameters.limit is not None:
+                page_keys = heapq.nsmallest(book_page_parameters.limit, sort_keys)
+            else:
+                page_keys = sorted(sort_keys)
+
+            return [columns.get_book_dto(slot) for _, _, slot in page_keys]
+
+    def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                   book_page_parameters: BookPageParametersDTO | None = None) -> Iterator[BookDTO]:
+        yield from self.get_books(book_filter_parameters, book_page_parameters)
+
+    def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        lower_query = query.lower()
+        with self.lock:
+            columns = self.columns
+            # Slots having every trigram of the query, starting from the rarest one. Queries shorter than
+            # a trigram are rejected by the controllers.
+            posting_lists = [self.slots_by_trigram.get(trigram, set())
+                             for trigram in get_substring_trigrams(lower_query)]
+            if not posting_lists:
+                return []
+            posting_lists.sort(key=len)
+            candidate_slots = posting_lists[0].intersection(*posting_lists[1:])
+
+            query_trigrams = get_trigrams(lower_query)
+            ranked_slots = []
+            for slot in candidate_slots:
+                relevance = get_search_relevance(lower_query, query_trigrams, columns.titles[slot],
+                                                 columns.authors[slot])
+                if relevance is not None:
+                    ranked_slots.append((-relevance, columns.titles[slot].lower(), columns.ids[slot], slot))
+
+            return [columns.get_book_dto(slot) for _, _, _, slot in heapq.nsmallest(limit, ranked_slots)]
+
+    def get_book_stats(self, price_bucket_width: int, year_bucket_width: int, top_authors: int) -> BookStatsDTO:
+        with self.lock:
+            columns = self.columns
+            price_counts, year_counts, author_counts = Counter(), Counter(), Counter()
+            # Free slots hold None in every column
+            for price, year, author in zip(columns.prices, columns.years, columns.authors):
+                if author is not None:
+                    price_counts[price - price % price_bucket_width] += 1
+                    year_counts[year - year % year_bucket_width] += 1
+                    author_counts[author] += 1
+
+            return BookStatsDTO(
+                total=len(self.slot_by_id),
+                # The genre index already holds every genre's books
+                genre_counts={genre: slots.bit_count() for genre, slots in self.slots_by_genre.items()},
+                price_counts=dict(price_counts),
+                year_counts=dict(year_counts),
+                top_authors=heapq.nsmallest(top_authors, author_counts.items(),
+                                            key=lambda author_count: (-author_count[1], author_count[0]))
+            )
+
+    def _get_matching_slots(self, book_filter_parameters: BookFilterParametersDTO) -> int:
+        slots = self.live_slots
+
+        # Hash and genre indexes first, they are single bitset operations
+        if book_filter_parameters.author:
+            slots &= self.slots_by_author.get(book_filter_parameters.author.lower(), 0)
+
+        if book_filter_parameters.genres:
+            genre_slots = 0
+            for genre in book_filter_parameters.genres:
+                genre_slots |= self.slots_by_genre.get(genre.upper(), 0)
+            slots &= genre_slots
+
+        # Range indexes last, a range wider than the remaining candidates is checked on the columns instead
+        range_filters = [
+            (self.price_index, self.columns.prices,
+             book_filter_parameters.price_bigger_than, book_filter_parameters.price_less_than),
+            (self.year_index, self.columns.years,
+             book_filter_parameters.year_bigger_than, book_filter_parameters.year_less_than)
+        ]
+        for index, column, bigger_than, less_than in range_filters:
+            if bigger_than is None and less_than is None:
+                continue
+
+            start, end = get_range_bounds(index, bigger_than, less_than)
+            if end - start < slots.bit_count():
+                slots &= get_bitset(slot for _, slot in index[start:end])
+            else:
+                slots = get_bitset(slot for slot in iter_bitset_slots(slots)
+                                   if (bigger_than is None or column[slot] > bigger_than) and
+                                   (less_than is None or column[slot] < less_than))
+
+        return slots
+
+    def _clear(self):
+        self.columns = BookColumns()
+        self.slot_by_id: dict[int, int] = {}
+        self.slot_by_title: dict[str, int] = {}
+        self.slots_by_author: dict[str, int] = {}
+        self.slots_by_genre: dict[str, int] = {}
+        self.live_slots = 0
+        self.price_index: list[tuple[int, int]] = []
+        self.year_index: list[tuple[int, int]] = []
+        self.slots_by_trigram: dict[str, set[int]] = {}
+
+    # In bulk the bitsets and range indexes are left to the caller
+    def _add_book(self, book_dto: BookDTO, bulk: bool = False) -> int:
+        slot = self.columns.add(book_dto)
+
+        self.slot_by_id[book_dto.id] = slot
+        self.slot_by_title[book_dto.title.lower()] = slot
+        for trigram in get_book_substring_trigrams(book_dto.title, book_dto.author):
+            self.slots_by_trigram.setdefault(trigram, set()).add(slot)
+        if bulk:
+            return slot
+
+        slot_bit = 1 << slot
+        author = book_dto.author.lower()
+        self.slots_by_author[author] = self.slots_by_author.get(author, 0) | slot_bit
+        for genre in book_dto.genres:
+            self.slots_by_genre[genre] = self.slots_by_genre.get(genre, 0) | slot_bit
+        insort(self.price_index, (book_dto.price, slot))
+        insort(self.year_index, (book_dto.year, slot))
+        self.live_slots |= slot_bit
+
+        return slot
+
+    def _remove_from_sorted_index(self, index: list, value: int, slot: int):
+        position = bisect_left(index, (value, slot))
+        if position < len(index) and index[position] == (value, slot):
+            del index[position]
+
+    def _remove_from_bitset_index(self, bitset_index: dict, key: str, slot_bit: int):
+        remaining_slots = bitset_index.get(key, 0) & ~slot_bit
+        if remaining_slots:
+            bitset_index[key] = remaining_slots
+        else:
+            bitset_index.pop(key, None)
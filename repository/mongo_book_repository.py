@@ -1,23 +1,97 @@
+import heapq
+import logging
+import os
+import re
+
 import mongoengine as me
-from typing import List
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from typing import Iterable, Iterator, List
 from dto.book_dto import BookDTO
 from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from metrics.database_metrics import MongoCommandListener, MongoPoolListener
 from repository.abstract_book_repository import AbstractBookRepository
+from repository.book_range_checksum import CHECKSUM_MODULUS, PRICE_OFFSET, get_content_hash
+from repository.book_search import (get_book_substring_trigrams, get_search_relevance, get_substring_trigrams,
+                                    get_trigrams)
+
+logger = logging.getLogger(__name__)
 
-# Database configuration
-HOSTNAME = "mongo"
-# HOSTNAME = "localhost"
-PORT = "27017"
+# Database configuration, from the environment docker-compose sets
+HOSTNAME = os.environ.get("MONGO_HOST", "mongo")
+PORT = os.environ.get("MONGO_PORT", "27017")
 DB_NAME = "books"
 DB_TABLE_NAME = "books"
+BULK_INSERT_CHUNK_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+CASE_INSENSITIVE_COLLATION = {"locale": "en", "strength": 2}
+DUPLICATE_KEY_ERROR_CODE = 11000
+TOTALS_COLLECTION_NAME = "book_totals"
+TITLE_UNIQUE_INDEX_FIELDS = [("title", 1)]
+BOOKS_TOTAL_NAME = DB_TABLE_NAME
+# MONGO_URL points the app at another server, e.g. a local mongod for the benchmarks
+MONGO_URL = os.environ.get("MONGO_URL", f"mongodb://{HOSTNAME}:{PORT}/{DB_NAME}")
+
+BOOK_FIELDS_BY_DTO_FIELD = {
+    "id": "rawid",
+    "title": "title",
+    "author": "author",
+    "year": "year",
+    "price": "price",
+    "genres": "genres"
+}
+# Hot reads skip the ODM: raw pymongo documents with only the fields a BookDTO needs
+BOOK_PROJECTION = {"_id": 0, "rawid": 1, "title": 1, "author": 1, "year": 1, "price": 1, "genres": 1}
+
+# Connection pool configuration, pymongo clients are thread-safe and pool their own sockets
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "30"))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "1800000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "30000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+# Most matches a search ranks, a query contained in more books is answered from the first ones found
+SEARCH_CANDIDATE_LIMIT = int(os.environ.get("MONGO_SEARCH_CANDIDATE_LIMIT", "5000"))
+
+# Slow commands are counted and sampled into the log, pool events are counted for the pool gauges
+command_listener = MongoCommandListener()
+pool_listener = MongoPoolListener()
 
-# Connect to MongoDB with mongoengine
-me.connect(DB_NAME, host=f"mongodb://{HOSTNAME}:{PORT}/{DB_NAME}")
+# Connect to MongoDB with mongoengine, connect=False defers the connection to the first operation
+me.connect(DB_NAME,
+           host=MONGO_URL,
+           maxPoolSize=MAX_POOL_SIZE,
+           minPoolSize=MIN_POOL_SIZE,
+           maxIdleTimeMS=MAX_IDLE_TIME_MS,
+           waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+           serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+           event_listeners=[command_listener, pool_listener],
+           connect=False)
 
 
 # Mongoengine Book model
 class Book(me.Document):
-    meta = {'collection': DB_TABLE_NAME}
+    meta = {
+        'collection': DB_TABLE_NAME,
+        # The indexes are created by ensure_indexes, one at a time, from MongoBookRepository.prepare
+        'auto_create_index': False,
+        'indexes': [
+            # Supports case-insensitive title ordering and keyset pagination over it
+            {'fields': ['title', 'rawid'], 'collation': CASE_INSENSITIVE_COLLATION},
+            # Titles are unique case-insensitively, like lower(title) in Postgres
+            {'fields': ['title'], 'unique': True, 'collation': CASE_INSENSITIVE_COLLATION},
+            # Multikey index, answers genres__in filters
+            'genres',
+            {'fields': ['rawid'], 'unique': True},
+            # Same collation as the listing queries, so author filters are case-insensitive and indexed
+            {'fields': ['author'], 'collation': CASE_INSENSITIVE_COLLATION},
+            'price',
+            'year',
+            # Multikey index, substring search looks books up by the trigrams of the query
+            'search_trigrams'
+        ]
+    }
 
     rawid = me.IntField(required=True)
     title = me.StringField(required=True)
@@ -25,6 +99,10 @@ class Book(me.Document):
     year = me.IntField(required=True)
     price = me.IntField(required=True)
     genres = me.ListField(me.StringField(), required=True)
+    # Hash of the fields above other than the price, for the reconciliation checksums
+    content_hash = me.IntField()
+    # Substring trigrams of the title and the author, for search
+    search_trigrams = me.ListField(me.StringField())
 
 
 # Convert book to DTO
@@ -42,77 +120,385 @@ def get_book_dto(book: Book) -> BookDTO | None:
     )
 
 
+# Query builders, shared with AsyncMongoBookRepository
+def build_books_filter(book_filter_parameters: BookFilterParametersDTO,
+                       book_page_parameters: BookPageParametersDTO | None) -> dict:
+    query = {}
+
+    # Add filters dynamically
+    if book_filter_parameters.author:
+        # Case-insensitive through the query collation, unlike a regex this uses the author index
+        query["author"] = book_filter_parameters.author
+
+    price_range = {}
+    if book_filter_parameters.price_bigger_than is not None:
+        price_range["$gt"] = book_filter_parameters.price_bigger_than
+    if book_filter_parameters.price_less_than is not None:
+        price_range["$lt"] = book_filter_parameters.price_less_than
+    if price_range:
+        query["price"] = price_range
+
+    year_range = {}
+    if book_filter_parameters.year_bigger_than is not None:
+        year_range["$gt"] = book_filter_parameters.year_bigger_than
+    if book_filter_parameters.year_less_than is not None:
+        year_range["$lt"] = book_filter_parameters.year_less_than
+    if year_range:
+        query["year"] = year_range
+
+    if book_filter_parameters.genres is not None:
+        query["genres"] = {"$in": [genre.upper() for genre in book_filter_parameters.genres]}
+
+    # Sort and paginate in the database, keyset style, so a page costs O(page size)
+    if book_page_parameters and book_page_parameters.after_title is not None:
+        query["$or"] = [
+            {"title": {"$gt": book_page_parameters.after_title}},
+            {"title": book_page_parameters.after_title, "rawid": {"$gt": book_page_parameters.after_id}}
+        ]
+
+    return query
+
+
+# Document fields to read, None for all of them
+def get_books_fields(book_page_parameters: BookPageParametersDTO | None) -> set[str] | None:
+    if not book_page_parameters or not book_page_parameters.fields:
+        return None
+
+    # id and title are always read, they make up the sort key and the pagination cursor
+    return {"rawid", "title"} | {BOOK_FIELDS_BY_DTO_FIELD[field] for field in book_page_parameters.fields}
+
+
+def build_books_queryset(book_filter_parameters: BookFilterParametersDTO,
+                         book_page_parameters: BookPageParametersDTO | None):
+    books = (Book.objects(__raw__=build_books_filter(book_filter_parameters, book_page_parameters))
+             .order_by("title", "rawid")
+             .collation(CASE_INSENSITIVE_COLLATION))
+
+    fields = get_books_fields(book_page_parameters)
+    if fields:
+        books = books.only(*fields)
+
+    if book_page_parameters and book_page_parameters.limit is not None:
+        books = books.limit(book_page_parameters.limit)
+
+    return books.as_pymongo()
+
+
+def build_book_stats_pipeline(price_bucket_width: int, year_bucket_width: int, top_authors: int) -> list:
+    # One pass over the collection for the total and all four groupings, so they count the same documents
+    return [
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "genres": [{"$unwind": "$genres"}, {"$group": {"_id": "$genres", "count": {"$sum": 1}}}],
+            "prices": [{"$group": {
+                "_id": {"$subtract": ["$price", {"$mod": ["$price", price_bucket_width]}]},
+                "count": {"$sum": 1}
+            }}],
+            "years": [{"$group": {
+                "_id": {"$subtract": ["$year", {"$mod": ["$year", year_bucket_width]}]},
+                "count": {"$sum": 1}
+            }}],
+            "authors": [{"$group": {"_id": "$author", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1, "_id": 1}},
+                        {"$limit": top_authors}]
+        }}
+    ]
+
+
+# Books having every substring trigram of the query, narrowed on the server to the ones containing it,
+# the candidates get_search_results ranks. None for queries shorter than a trigram, the controllers reject them.
+def build_search_filter(query: str) -> dict | None:
+    query_trigrams = get_substring_trigrams(query)
+    if not query_trigrams:
+        return None
+
+    contains_query = {"$regex": re.escape(query.lower()), "$options": "i"}
+    return {"search_trigrams": {"$all": sorted(query_trigrams)},
+            "$or": [{"title": contains_query}, {"author": contains_query}]}
+
+
+def get_search_results(query: str, documents: Iterable[dict], limit: int) -> List[BookDTO]:
+    lower_query = query.lower()
+    query_trigrams = get_trigrams(lower_query)
+    ranked_documents = []
+    for document in documents:
+        relevance = get_search_relevance(lower_query, query_trigrams, document["title"], document["author"])
+        if relevance is not None:
+            ranked_documents.append((-relevance, document["title"].lower(), document["rawid"], document))
+
+    return [get_book_dto_from_document(document) for _, _, _, document in heapq.nsmallest(limit, ranked_documents)]
+
+
+# Documents written with the padded trigrams of earlier versions hold a superset of these, they still match
+def get_search_trigrams(title: str, author: str) -> list[str]:
+    return sorted(get_book_substring_trigrams(title, author))
+
+
+def get_book_stats_dto(facets: dict) -> BookStatsDTO:
+    # $count yields no document at all for an empty collection
+    return BookStatsDTO(total=facets["total"][0]["count"] if facets["total"] else 0,
+                        genre_counts={facet["_id"]: facet["count"] for facet in facets["genres"]},
+                        price_counts={int(facet["_id"]): facet["count"] for facet in facets["prices"]},
+                        year_counts={int(facet["_id"]): facet["count"] for facet in facets["years"]},
+                        top_authors=[(facet["_id"], facet["count"]) for facet in facets["authors"]])
+
+
+def get_book_document(book_dto: BookDTO) -> dict:
+    return {
+        "rawid": book_dto.id,
+        "title": book_dto.title,
+        "author": book_dto.author,
+        "year": book_dto.year,
+        "price": book_dto.price,
+        "genres": book_dto.genres,
+        "content_hash": get_content_hash(book_dto),
+        "search_trigrams": get_search_trigrams(book_dto.title, book_dto.author)
+    }
+
+
+def warm_up_pool():
+    # The first command connects, the pool then opens up to MONGO_MIN_POOL_SIZE connections in the background
+    Book._get_db().command("ping")
+
+
+def get_pool_stats() -> dict:
+    return pool_listener.get_stats()
+
+
+def get_totals_collection():
+    return Book._get_db()[TOTALS_COLLECTION_NAME]
+
+
+def ensure_books_total():
+    # One-time count, later kept up to date by $inc next to every insert and delete
+    if get_totals_collection().find_one({"_id": BOOKS_TOTAL_NAME}) is None:
+        get_totals_collection().update_one({"_id": BOOKS_TOTAL_NAME},
+                                           {"$setOnInsert": {"total": Book.objects.count()}},
+                                           upsert=True)
+
+
+def ensure_search_trigrams():
+    # One-time migration, documents written before search trigrams existed get them here
+    collection = Book._get_collection()
+    documents = collection.find({"search_trigrams": {"$exists": False}}, {"_id": 1, "title": 1, "author": 1})
+    updates = []
+    for document in documents:
+        updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {
+            "search_trigrams": get_search_trigrams(document["title"], document["author"])
+        }}))
+        if len(updates) == BULK_INSERT_CHUNK_SIZE:
+            collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        collection.bulk_write(updates, ordered=False)
+
+
+def add_to_books_total(delta: int) -> int:
+    books_total = get_totals_collection().find_one_and_update({"_id": BOOKS_TOTAL_NAME},
+                                                              {"$inc": {"total": delta}},
+                                                              return_document=ReturnDocument.AFTER)
+    return books_total["total"]
+
+
+def get_book_dto_from_document(document: dict | None) -> BookDTO | None:
+    if not document:
+        return None
+
+    return BookDTO(
+        id=document["rawid"],
+        title=document["title"],
+        author=document.get("author"),
+        year=document.get("year"),
+        price=document.get("price"),
+        genres=document.get("genres")
+    )
+
+
+# Creates the indexes of Book.meta one by one, unlike Book.ensure_indexes a failing one doesn't skip the rest
+def ensure_indexes():
+    collection = Book._get_collection()
+    for index_spec in Book._meta["index_specs"]:
+        index_options = dict(index_spec)
+        fields = index_options.pop("fields")
+        try:
+            collection.create_index(fields, **index_options)
+        except OperationFailure as error:
+            if fields != TITLE_UNIQUE_INDEX_FIELDS or not index_options.get("unique"):
+                raise
+            # Without the unique title index creates still work, but duplicate titles are no longer rejected
+            logger.warning("Can't create the unique title index, the books collection has case-insensitive "
+                           "duplicate titles: %s", error)
+
+
 class MongoBookRepository(AbstractBookRepository):
-    def __init__(self):
-        self.books_counter = Book.objects.count()
+    # One-time index and totals set-up, run by BookLogic's start-up once the database is reachable
+    def prepare(self):
+        ensure_indexes()
+        ensure_books_total()
+        ensure_search_trigrams()
 
     def create_book(self, book_dto: BookDTO) -> BookDTO:
-        # Insert data into MongoDB
-        new_book = Book(
-            rawid=self.books_counter+1,
-            title=book_dto.title,
-            author=book_dto.author,
-            year=book_dto.year,
-            price=book_dto.price,
-            genres=book_dto.genres
-        )
+        # Insert data into MongoDB, the id was allocated by BookLogic
+        new_book = get_book_document(book_dto)
 
-        new_book.save()
-        self.books_counter += 1
+        try:
+            Book._get_collection().insert_one(new_book)
+        except DuplicateKeyError:
+            return None
 
-        return get_book_dto(new_book)
+        add_to_books_total(1)
+        return get_book_dto_from_document(new_book)
 
-    def update_book_price(self, book_id: int, new_price: int) -> None:
-        # Find the book by rawid (unique identifier)
-        book = Book.objects(rawid=book_id).first()
+    def create_books(self, book_dtos: List[BookDTO]) -> List[BookDTO | None]:
+        created_books = []
+        collection = Book._get_collection()
 
-        # If the book is found, update the price
-        if book:
-            book.update(set__price=new_price)
-        else:
-            return None
+        for chunk_start in range(0, len(book_dtos), BULK_INSERT_CHUNK_SIZE):
+            chunk = book_dtos[chunk_start:chunk_start + BULK_INSERT_CHUNK_SIZE]
+            new_books = [get_book_document(book_dto) for book_dto in chunk]
+
+            # One insert_many per chunk instead of a save() per book, unordered so a duplicate
+            # title only fails its own document
+            inserted_count = 0
+            failed_indexes = set()
+            try:
+                collection.insert_many(new_books, ordered=False)
+                inserted_count = len(new_books)
+            except BulkWriteError as error:
+                inserted_count = error.details.get("nInserted", 0)
+                write_errors = error.details.get("writeErrors", [])
+                if any(write_error["code"] != DUPLICATE_KEY_ERROR_CODE for write_error in write_errors):
+                    raise
+                failed_indexes = {write_error["index"] for write_error in write_errors}
+            finally:
+                # Documents without an error are inserted even when other ones of the chunk fail for another reason
+                if inserted_count:
+                    add_to_books_total(inserted_count)
+
+            created_books.extend(
+                get_book_dto_from_document(new_book) if index not in failed_indexes else None
+                for index, new_book in enumerate(new_books)
+            )
+
+        return created_books
+
+    def update_book_price(self, book_id: int, new_price: int) -> None:
+        # Find and update the book by rawid (unique identifier) in one round trip
+        Book._get_collection().update_one({"rawid": book_id}, {"$set": {"price": new_price}})
 
     def get_books_total(self) -> int:
-        return Book.objects.count()
+        books_total = get_totals_collection().find_one({"_id": BOOKS_TOTAL_NAME})
+        return books_total["total"] if books_total else 0
 
     def get_book_by_title(self, title: str) -> BookDTO | None:
-        book = Book.objects(title__icontains=title).first()
-        return get_book_dto(book)
+        # Exact, case-insensitive match answered by the collated unique title index
+        document = Book._get_collection().find_one({"title": title}, BOOK_PROJECTION,
+                                                   collation=CASE_INSENSITIVE_COLLATION)
+        return get_book_dto_from_document(document)
 
     def get_book_by_id(self, id: int) -> BookDTO | None:
-        book = Book.objects(rawid=id).first()
-        return get_book_dto(book)
+        document = Book._get_collection().find_one({"rawid": id}, BOOK_PROJECTION)
+        return get_book_dto_from_document(document)
 
-    def delete_book_by_id(self, id: int) -> bool:
-        result = Book.objects(rawid=id).delete()
-        return result > 0
+    # Returns the books total after the delete, or None when there is no such book
+    def delete_book_by_id(self, id: int) -> int | None:
+        result = Book._get_collection().delete_one({"rawid": id})
+        if result.deleted_count == 0:
+            return None
+        return add_to_books_total(-result.deleted_count)
 
-    def get_books(self, book_filter_parameters: BookFilterParametersDTO) -> List[BookDTO]:
-        query = {}
+    def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                  book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        books = build_books_queryset(book_filter_parameters, book_page_parameters)
 
-        # Add filters dynamically
-        if book_filter_parameters.author:
-            query["author__iexact"] = book_filter_parameters.author
+        # Map to DTOs
+        filtered_books_dto = [get_book_dto_from_document(book) for book in books]
 
-        if book_filter_parameters.price_bigger_than is not None:
-            query["price__gt"] = book_filter_parameters.price_bigger_than
+        return filtered_books_dto
 
-        if book_filter_parameters.price_less_than is not None:
-            query["price__lt"] = book_filter_parameters.price_less_than
+    def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                   book_page_parameters: BookPageParametersDTO | None = None) -> Iterator[BookDTO]:
+        books = build_books_queryset(book_filter_parameters, book_page_parameters)
 
-        if book_filter_parameters.year_bigger_than is not None:
-            query["year__gt"] = book_filter_parameters.year_bigger_than
+        # Batched cursor, documents are fetched STREAM_BATCH_SIZE at a time
+        for book in books.batch_size(STREAM_BATCH_SIZE):
+            yield get_book_dto_from_document(book)
 
-        if book_filter_parameters.year_less_than is not None:
-            query["year__lt"] = book_filter_parameters.year_less_than
+    # Substrings of titles and authors, like the other backends, see build_search_filter
+    def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        search_filter = build_search_filter(query)
+        if search_filter is None:
+            return []
 
-        if book_filter_parameters.genres is not None:
-            query["genres__in"] = [genre.upper() for genre in book_filter_parameters.genres]
+        documents = Book._get_collection().find(search_filter, BOOK_PROJECTION).limit(SEARCH_CANDIDATE_LIMIT)
+        return get_search_results(query, documents, limit)
 
-        # Execute the query and fetch results
-        filtered_without_genres_books = Book.objects(**query)
+    def get_book_stats(self, price_bucket_width: int, year_bucket_width: int, top_authors: int) -> BookStatsDTO:
+        pipeline = build_book_stats_pipeline(price_bucket_width, year_bucket_width, top_authors)
+        return get_book_stats_dto(next(Book._get_collection().aggregate(pipeline)))
 
-        # Map to DTOs
-        filtered_books_dto = [get_book_dto(book) for book in filtered_without_genres_books]
+    # Reconciliation reads and repairs, see BookReconciler
+    def get_id_bounds(self) -> tuple[int | None, int | None]:
+        bounds = list(Book._get_collection().aggregate([
+            {"$group": {"_id": None, "low": {"$min": "$rawid"}, "high": {"$max": "$rawid"}}}
+        ]))
+        return (bounds[0]["low"], bounds[0]["high"]) if bounds else (None, None)
 
-        return filtered_books_dto
+    # Returns {bucket: (count, checksum)} for the buckets of `width` ids that [low, high) is split into,
+    # computed in the same way as PostgresBookRepository.get_range_checksums
+    def get_range_checksums(self, low: int, high: int, width: int) -> dict[int, tuple[int, int]]:
+        # Documents written before content hashes existed count as 0, their ranges get repaired and hashed
+        row_checksum = {"$mod": [{"$multiply": [
+            {"$toLong": {"$ifNull": ["$content_hash", 0]}},
+            {"$add": [{"$toLong": "$price"}, PRICE_OFFSET]}
+        ]}, CHECKSUM_MODULUS]}
+
+        buckets = Book._get_collection().aggregate([
+            {"$match": {"rawid": {"$gte": low, "$lt": high}}},
+            {"$group": {
+                "_id": {"$floor": {"$divide": [{"$subtract": ["$rawid", low]}, width]}},
+                "count": {"$sum": 1},
+                "checksum": {"$sum": row_checksum}
+            }}
+        ])
+        return {int(bucket["_id"]): (bucket["count"], int(bucket["checksum"])) for bucket in buckets}
+
+    def get_books_in_id_range(self, low: int, high: int) -> List[BookDTO]:
+        documents = Book._get_collection().find({"rawid": {"$gte": low, "$lt": high}}, BOOK_PROJECTION)
+        return [get_book_dto_from_document(document) for document in documents]
+
+    # Returns {id: content hash}, None for documents written before content hashes existed
+    def get_content_hashes_in_id_range(self, low: int, high: int) -> dict[int, int | None]:
+        documents = Book._get_collection().find({"rawid": {"$gte": low, "$lt": high}},
+                                                {"_id": 0, "rawid": 1, "content_hash": 1})
+        return {document["rawid"]: document.get("content_hash") for document in documents}
+
+    # Inserts or overwrites the books by id. Returns the numbers of inserted and of changed books, and the error
+    # of every book that couldn't be written by id, e.g. because another document holds its title.
+    def replace_books(self, book_dtos: List[BookDTO]) -> tuple[int, int, dict[int, str]]:
+        if not book_dtos:
+            return 0, 0, {}
+
+        try:
+            result = Book._get_collection().bulk_write([
+                ReplaceOne({"rawid": book_dto.id}, get_book_document(book_dto), upsert=True)
+                for book_dto in book_dtos
+            ], ordered=False).bulk_api_result
+        except BulkWriteError as error:
+            # Unordered, the books without an error were still written
+            result = error.details
+
+        write_errors = {book_dtos[write_error["index"]].id: write_error["errmsg"]
+                        for write_error in result.get("writeErrors", [])}
+        if result["nUpserted"]:
+            add_to_books_total(result["nUpserted"])
+        return result["nUpserted"], result["nModified"], write_errors
+
+    def delete_books_by_ids(self, ids: List[int]) -> int:
+        if not ids:
+            return 0
+
+        deleted_count = Book._get_collection().delete_many({"rawid": {"$in": ids}}).deleted_count
+        if deleted_count:
+            add_to_books_total(-deleted_count)
+        return deleted_count
@@ -1,27 +1,53 @@
-import ast
-from operator import or_
-from typing import List
+import logging
+import os
+from typing import Iterator, List
 
 from dto.book_dto import BookDTO
 from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from dto.book_stats_dto import BookStatsDTO
+from metrics.database_metrics import instrument_engine
 from repository.abstract_book_repository import AbstractBookRepository
-from sqlalchemy import create_engine, Column, Integer, String, func
+from repository.book_range_checksum import (CHECKSUM_MODULUS, CONTENT_HASH_HEX_DIGITS, CONTENT_HASH_SEPARATOR,
+                                            PRICE_OFFSET)
+from sqlalchemy import (create_engine, BigInteger, Column, Index, Integer, String, Text, case, delete, func, literal,
+                        null, select, text, tuple_, update)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import NoResultFound
-
-# Database configuration
-USERNAME = "postgres"
-PASSWORD = "docker"
-HOSTNAME = "postgres"
-# HOSTNAME = "localhost"
-PORT = "5432"
-DB_NAME = "books"
-DB_TABLE_NAME = "books"
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.exc import DBAPIError, IntegrityError, NoResultFound
+
+logger = logging.getLogger(__name__)
 
-# Create the database engine
-DATABASE_URL = f"postgresql://{USERNAME}:{PASSWORD}@{HOSTNAME}:{PORT}/{DB_NAME}"
-engine = create_engine(DATABASE_URL, echo=True)
+# Database configuration, from the environment docker-compose sets
+USERNAME = os.environ.get("POSTGRES_USER", "postgres")
+PASSWORD = os.environ.get("POSTGRES_PASSWORD", "docker")
+HOSTNAME = os.environ.get("POSTGRES_HOST", "postgres")
+PORT = os.environ.get("POSTGRES_PORT", "5432")
+DB_NAME = os.environ.get("POSTGRES_DB", "books")
+DB_TABLE_NAME = "books"
+BOOKS_TOTAL_NAME = DB_TABLE_NAME
+BULK_INSERT_CHUNK_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+
+# Connection pool configuration
+POOL_SIZE = int(os.environ.get("POSTGRES_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.environ.get("POSTGRES_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT_SECONDS = float(os.environ.get("POSTGRES_POOL_TIMEOUT_SECONDS", "30"))
+POOL_RECYCLE_SECONDS = int(os.environ.get("POSTGRES_POOL_RECYCLE_SECONDS", "1800"))
+POOL_PRE_PING = os.environ.get("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+
+# Create the database engine, it opens no connection until the first query
+# POSTGRES_URL points the app at another server, e.g. the embedded one of the benchmarks
+DATABASE_URL = os.environ.get("POSTGRES_URL", f"postgresql://{USERNAME}:{PASSWORD}@{HOSTNAME}:{PORT}/{DB_NAME}")
+engine = create_engine(DATABASE_URL,
+                       pool_size=POOL_SIZE,
+                       max_overflow=MAX_OVERFLOW,
+                       pool_timeout=POOL_TIMEOUT_SECONDS,
+                       pool_recycle=POOL_RECYCLE_SECONDS,
+                       pool_pre_ping=POOL_PRE_PING)
+# Slow statements are counted and sampled into the log
+instrument_engine(engine)
 
 # Base class for ORM models
 Base = declarative_base()
@@ -37,109 +63,434 @@ class Book(Base):
     year = Column(Integer, nullable=False)
     price = Column(Integer, nullable=False)
     genres = Column(String, nullable=False) # Was requested to be a string instead of multiple tables
+    # Indexed copy of genres, filters use it instead of LIKE over the string column
+    genre_list = Column(ARRAY(Text), nullable=True)
+
+
+# Number of rows in the books table, kept up to date in the same transaction as every insert and delete
+class BookTotal(Base):
+    __tablename__ = "book_totals"
+
+    name = Column(String, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+# Supports ORDER BY lower(title), rawid and keyset pagination over it
+title_order_index = Index("ix_books_lower_title_rawid", func.lower(Book.title), Book.rawid)
+# Titles are unique case-insensitively, also serves exact title lookups
+title_unique_index = Index("uq_books_lower_title", func.lower(Book.title), unique=True)
+# Supports genre_list && ARRAY[...] (any of the genres) filters
+genre_list_index = Index("ix_books_genre_list", Book.genre_list, postgresql_using="gin")
 
+# Trigram indexes answering LIKE '%...%' on the lowercased title and author, used by search
+SEARCH_INDEX_COLUMNS = {"ix_books_lower_title_trgm": "title", "ix_books_lower_author_trgm": "author"}
 
-# Create a session to interact with the database
-Session = sessionmaker(bind=engine)
-session = Session()
+# Every book read selects these columns in this order, so rows unpack straight into a BookDTO
+BOOK_ROW_COLUMNS = (Book.rawid, Book.title, Book.author, Book.year, Book.price, Book.genre_list, Book.genres)
+# The DTO field each of the BOOK_ROW_COLUMNS is read for
+BOOK_ROW_FIELDS = ("id", "title", "author", "year", "price", "genres", "genres")
+
+
+# Thread-local session registry, every request (or worker thread) gets its own session,
+# which is closed and returned to the pool by remove_session() when the request ends
+Session = scoped_session(sessionmaker(bind=engine))
 
 
 def convert_genres_list_to_str(genres: list) -> str:
     return f'["{",".join(map(str, genres))}"]'
 
 
-def get_book_dto(book: Book) -> BookDTO | None:
-    if book is None:
+def convert_genres_str_to_list(genres: str) -> list:
+    # Accepts both '["SCI_FI,NOVEL"]' (written by convert_genres_list_to_str) and "['SCI_FI', 'NOVEL']"
+    stripped_genres = genres.translate(str.maketrans("", "", "[]\"' "))
+    return stripped_genres.split(",") if stripped_genres else []
+
+
+def get_genres(genre_list: list | None, genres: str | None) -> list | None:
+    # Rows written before the genre_list migration only have the string column
+    if genre_list is not None:
+        return genre_list
+    if genres is not None:
+        return convert_genres_str_to_list(genres)
+    return None
+
+
+def migrate_genres():
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {DB_TABLE_NAME} ADD COLUMN IF NOT EXISTS genre_list text[]"))
+        # Same parsing as convert_genres_str_to_list, done in place so no rows are shipped to the app
+        connection.execute(text(
+            f"UPDATE {DB_TABLE_NAME} "
+            f"SET genre_list = string_to_array(translate(genres, '[]\"'' ', ''), ',') "
+            f"WHERE genre_list IS NULL"
+        ))
+
+
+def ensure_books_total():
+    Base.metadata.create_all(engine, tables=[BookTotal.__table__])
+    with engine.begin() as connection:
+        if connection.execute(select(BookTotal.total).where(BookTotal.name == BOOKS_TOTAL_NAME)).first():
+            return
+
+        # One-time count, books writers wait for it so the initial total can't miss a row
+        connection.execute(text(f"LOCK TABLE {DB_TABLE_NAME} IN SHARE MODE"))
+        connection.execute(pg_insert(BookTotal.__table__)
+                           .from_select(["name", "total"],
+                                        select(literal(BOOKS_TOTAL_NAME), func.count()).select_from(Book))
+                           .on_conflict_do_nothing(index_elements=[BookTotal.name]))
+
+
+def add_to_books_total(delta):
+    return (update(BookTotal.__table__)
+            .where(BookTotal.name == BOOKS_TOTAL_NAME)
+            .values(total=BookTotal.total + delta))
+
+
+def insert_books(rows: List[dict], unique_titles: bool) -> set[int]:
+    created_book_ids = Session.execute(get_insert_books_statement(rows, unique_titles)).scalar()
+    return set(created_book_ids or [])
+
+
+def remove_session():
+    Session.remove()
+
+
+def warm_up_pool():
+    # Opens the pool's connections up front instead of on the first requests
+    connections = []
+    try:
+        for _ in range(POOL_SIZE):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def get_pool_stats() -> dict:
+    return {
+        "size": engine.pool.size(),
+        "checkedIn": engine.pool.checkedin(),
+        "checkedOut": engine.pool.checkedout(),
+        "overflow": engine.pool.overflow()
+    }
+
+
+# Returns whether titles are unique (case-insensitively)
+def ensure_indexes() -> bool:
+    title_order_index.create(engine, checkfirst=True)
+    genre_list_index.create(engine, checkfirst=True)
+    try:
+        title_unique_index.create(engine, checkfirst=True)
+    except IntegrityError:
+        # Without the index creates still work, but duplicate titles are no longer rejected
+        logger.warning("Can't create %s, the books table has case-insensitive duplicate titles",
+                       title_unique_index.name)
+        return False
+    return True
+
+
+# Returns whether pg_trgm is available
+def ensure_search_indexes() -> bool:
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for index_name, column_name in SEARCH_INDEX_COLUMNS.items():
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {DB_TABLE_NAME} "
+                                        f"USING gin (lower({column_name}) gin_trgm_ops)"))
+    except DBAPIError as error:
+        # pg_trgm needs to be installed on the server, without it search scans the table and ranks prefix matches only
+        logger.warning("Can't create the search indexes: %s", error)
+        return False
+
+    return True
+
+
+def escape_like_pattern(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# `row` has the BOOK_ROW_COLUMNS, NULL for the fields that weren't requested
+def get_book_dto_from_row(row) -> BookDTO | None:
+    if row is None:
         return None
 
-    return BookDTO(id=book.rawid,
-                   title=book.title,
-                   author=book.author,
-                   year=book.year,
-                   price=book.price,
-                   genres=ast.literal_eval(book.genres))
+    rawid, title, author, year, price, genre_list, genres = row
+    return BookDTO(rawid, title, author, year, price, get_genres(genre_list, genres))
+
+
+def get_book_row(book_dto: BookDTO) -> dict:
+    return {
+        "rawid": book_dto.id,
+        "title": book_dto.title,
+        "author": book_dto.author,
+        "year": book_dto.year,
+        "price": book_dto.price,
+        "genres": convert_genres_list_to_str(book_dto.genres),
+        "genre_list": list(book_dto.genres)
+    }
 
 
+def get_book_dto_copy(book_dto: BookDTO) -> BookDTO:
+    return BookDTO(id=book_dto.id,
+                   title=book_dto.title,
+                   author=book_dto.author,
+                   year=book_dto.year,
+                   price=book_dto.price,
+                   genres=book_dto.genres)
+
+
+# Query builders, shared with AsyncPostgresBookRepository
+def build_books_query(book_filter_parameters: BookFilterParametersDTO,
+                      book_page_parameters: BookPageParametersDTO | None):
+    fields = book_page_parameters.fields if book_page_parameters and book_page_parameters.fields else None
+
+    # id and title are always read, they make up the sort key and the pagination cursor
+    if fields is None:
+        columns = BOOK_ROW_COLUMNS
+    else:
+        selected_fields = {"id", "title", *fields}
+        columns = [column if field in selected_fields else null()
+                   for column, field in zip(BOOK_ROW_COLUMNS, BOOK_ROW_FIELDS)]
+
+    query = select(*columns)
+
+    # Add filters dynamically
+    if book_filter_parameters.author:
+        query = query.filter(func.lower(Book.author) == book_filter_parameters.author.lower())
+
+    if book_filter_parameters.price_bigger_than is not None:
+        query = query.filter(Book.price > book_filter_parameters.price_bigger_than)
+
+    if book_filter_parameters.price_less_than is not None:
+        query = query.filter(Book.price < book_filter_parameters.price_less_than)
+
+    if book_filter_parameters.year_bigger_than is not None:
+        query = query.filter(Book.year > book_filter_parameters.year_bigger_than)
+
+    if book_filter_parameters.year_less_than is not None:
+        query = query.filter(Book.year < book_filter_parameters.year_less_than)
+
+    if book_filter_parameters.genres:
+        # Books having any of the genres, answered by the GIN index on genre_list
+        query = query.filter(Book.genre_list.overlap([genre.upper() for genre in book_filter_parameters.genres]))
+
+    # Sort and paginate in the database, keyset style, so a page costs O(page size)
+    if book_page_parameters and book_page_parameters.after_title is not None:
+        query = query.filter(tuple_(func.lower(Book.title), Book.rawid) >
+                             tuple_(book_page_parameters.after_title, book_page_parameters.after_id))
+
+    query = query.order_by(func.lower(Book.title), Book.rawid)
+
+    if book_page_parameters and book_page_parameters.limit is not None:
+        query = query.limit(book_page_parameters.limit)
+
+    return query
+
+
+def get_books_total_query():
+    return select(BookTotal.total).where(BookTotal.name == BOOKS_TOTAL_NAME)
+
+
+def get_insert_books_statement(rows: List[dict], unique_titles: bool):
+    # INSERT ... ON CONFLICT DO NOTHING and the books total update in one statement (data-modifying CTE),
+    # returns the ids of the rows that were inserted. Only a title conflict skips a row, an id that is
+    # already taken is an allocation bug and raises.
+    insert_books_statement = pg_insert(Book.__table__).values(rows)
+    if unique_titles:
+        insert_books_statement = insert_books_statement.on_conflict_do_nothing(
+            index_elements=[func.lower(Book.title)]
+        )
+    inserted_books = (insert_books_statement
+                      .returning(Book.rawid)
+                      .cte("inserted_books"))
+    inserted_count = select(func.count()).select_from(inserted_books).scalar_subquery()
+    inserted_ids = select(func.array_agg(inserted_books.c.rawid)).scalar_subquery()
+    return add_to_books_total(inserted_count).returning(inserted_ids)
+
+
+def get_delete_book_statement(id: int):
+    # DELETE ... RETURNING and the books total update in one statement (data-modifying CTE),
+    # returns the books total and the number of deleted books
+    deleted_books = (delete(Book.__table__)
+                     .where(Book.rawid == id)
+                     .returning(Book.rawid)
+                     .cte("deleted_books"))
+    deleted_count = select(func.count()).select_from(deleted_books).scalar_subquery()
+    return add_to_books_total(-deleted_count).returning(BookTotal.total, deleted_count)
+
+
+def build_search_query(query: str, limit: int, trigram_search: bool):
+    lower_query = query.lower()
+    contains_pattern = f"%{escape_like_pattern(lower_query)}%"
+    prefix_pattern = f"{escape_like_pattern(lower_query)}%"
+    lower_title, lower_author = func.lower(Book.title), func.lower(Book.author)
+
+    # Trigram similarity, plus one for a title or author that starts with the query
+    relevance = case((lower_title.like(prefix_pattern) | lower_author.like(prefix_pattern), 1), else_=0)
+    if trigram_search:
+        relevance = relevance + func.greatest(func.similarity(lower_title, lower_query),
+                                              func.similarity(lower_author, lower_query))
+
+    return (select(*BOOK_ROW_COLUMNS)
+            .where(lower_title.like(contains_pattern) | lower_author.like(contains_pattern))
+            .order_by(relevance.desc(), lower_title, Book.rawid)
+            .limit(limit))
+
+
+# Genre, price bucket, year bucket and top author counts, see get_book_stats_dto
+def build_book_stats_queries(price_bucket_width: int, year_bucket_width: int, top_authors: int) -> tuple:
+    genre = func.unnest(Book.genre_list).label("genre")
+    price_bucket = (Book.price - Book.price % price_bucket_width).label("price_bucket")
+    year_bucket = (Book.year - Book.year % year_bucket_width).label("year_bucket")
+    return (
+        select(genre, func.count()).select_from(Book).group_by(genre),
+        select(price_bucket, func.count()).group_by(price_bucket),
+        select(year_bucket, func.count()).group_by(year_bucket),
+        select(Book.author, func.count()).group_by(Book.author).order_by(func.count().desc(), Book.author)
+        .limit(top_authors)
+    )
+
+
+# Isolation of the stats queries, shared with AsyncPostgresBookRepository
+STATS_ISOLATION_LEVEL = "REPEATABLE READ"
+
+
+def get_book_stats_dto(total: int, genre_rows, price_rows, year_rows, author_rows) -> BookStatsDTO:
+    return BookStatsDTO(total=total,
+                        genre_counts={genre: count for genre, count in genre_rows},
+                        price_counts={bucket: count for bucket, count in price_rows},
+                        year_counts={bucket: count for bucket, count in year_rows},
+                        top_authors=[(author, count) for author, count in author_rows])
+
 class PostgresBookRepository(AbstractBookRepository):
     def __init__(self):
-        self.books_counter = session.query(Book).count()
-
-    def create_book(self, book_dto: BookDTO) -> BookDTO:
-        # Insert data into the Books table
-        new_book = Book(
-            rawid=self.books_counter+1,
-            title=book_dto.title,
-            author=book_dto.author,
-            year=book_dto.year,
-            price=book_dto.price,
-            genres=convert_genres_list_to_str(book_dto.genres)
-        )
+        self.trigram_search = False
+        self.unique_titles = True
+
+    # One-time schema set-up, run by BookLogic's start-up once the database is reachable
+    def prepare(self):
+        migrate_genres()
+        self.unique_titles = ensure_indexes()
+        self.trigram_search = ensure_search_indexes()
+        ensure_books_total()
+
+    # Write methods take commit=False when the caller adds more to the same transaction (the outbox)
+    # and commits it through commit() itself
+    def create_book(self, book_dto: BookDTO, commit: bool = True) -> BookDTO | None:
+        # Insert data into the Books table in one round trip, a title that already exists
+        # (case-insensitively, enforced by the unique index on lower(title)) inserts nothing
+        created_book_ids = insert_books([get_book_row(book_dto)], self.unique_titles)
+        if commit:
+            Session.commit()
+
+        if not created_book_ids:
+            return None
+
+        return get_book_dto_copy(book_dto)
+
+    def create_books(self, book_dtos: List[BookDTO], commit: bool = True) -> List[BookDTO | None]:
+        created_books = []
 
-        session.add(new_book)
-        session.commit()
-        self.books_counter += 1
+        for chunk_start in range(0, len(book_dtos), BULK_INSERT_CHUNK_SIZE):
+            chunk = book_dtos[chunk_start:chunk_start + BULK_INSERT_CHUNK_SIZE]
 
-        return get_book_dto(new_book)
+            # One multi-row INSERT per chunk instead of a commit per book, rows whose title
+            # already exists are skipped
+            created_book_ids = insert_books([get_book_row(book_dto) for book_dto in chunk], self.unique_titles)
+            if commit:
+                Session.commit()
 
-    def update_book_price(self, book_id: int, new_price: int) -> None:
+            created_books.extend(
+                get_book_dto_copy(book_dto) if book_dto.id in created_book_ids else None
+                for book_dto in chunk
+            )
+
+        return created_books
+
+    def update_book_price(self, book_id: int, new_price: int, commit: bool = True) -> None:
         try:
-            book = session.query(Book).filter(Book.rawid == book_id).one()
+            book = Session.query(Book).filter(Book.rawid == book_id).one()
             book.price = new_price
-            session.commit()
+            if commit:
+                Session.commit()
 
         except NoResultFound:
             # Return None or handle it as per the requirement when the book is not found
             return None
 
     def get_books_total(self) -> int:
-        return session.query(Book).count()
+        return Session.execute(get_books_total_query()).scalar()
 
     def get_book_by_title(self, title: str) -> BookDTO | None:
-        book: Book | None = session.query(Book).filter(Book.title.ilike(title)).first()
-        return get_book_dto(book)
+        return get_book_dto_from_row(Session.execute(select(*BOOK_ROW_COLUMNS)
+                                                     .where(func.lower(Book.title) == title.lower())).first())
 
     def get_book_by_id(self, id: int) -> BookDTO | None:
-        book: Book | None = session.query(Book).filter(Book.rawid == id).first()
-        return get_book_dto(book)
-
-    def delete_book_by_id(self, id: int) -> None:
-        existing_book: Book | None = session.query(Book).filter(Book.rawid == id).first()
-        if existing_book:
-            session.delete(existing_book)
-            session.commit()
-
-    def get_books(self, book_filter_parameters: BookFilterParametersDTO) -> List[BookDTO]:
-        query = session.query(Book)
-
-        # Add filters dynamically
-        if book_filter_parameters.author:
-            query = query.filter(func.lower(Book.author) == book_filter_parameters.author.lower())
-
-        if book_filter_parameters.price_bigger_than is not None:
-            query = query.filter(Book.price > book_filter_parameters.price_bigger_than)
+        return get_book_dto_from_row(Session.execute(select(*BOOK_ROW_COLUMNS).where(Book.rawid == id)).first())
+
+    # Returns the books total after the delete, or None when there is no such book
+    def delete_book_by_id(self, id: int, commit: bool = True) -> int | None:
+        books_total, deleted_books_count = Session.execute(get_delete_book_statement(id)).one()
+        if commit:
+            Session.commit()
+
+        return books_total if deleted_books_count else None
+
+    def search_books(self, query: str, limit: int) -> List[BookDTO]:
+        rows = Session.execute(build_search_query(query, limit, self.trigram_search))
+        return [get_book_dto_from_row(row) for row in rows]
+
+    def get_book_stats(self, price_bucket_width: int, year_bucket_width: int, top_authors: int) -> BookStatsDTO:
+        queries = build_book_stats_queries(price_bucket_width, year_bucket_width, top_authors)
+        # One snapshot for the total and the groupings, so they add up even while books are written
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level=STATS_ISOLATION_LEVEL)
+            total = connection.scalar(get_books_total_query())
+            return get_book_stats_dto(total, *(connection.execute(query).all() for query in queries))
+
+    # Reconciliation reads, see BookReconciler
+    def get_id_bounds(self) -> tuple[int | None, int | None]:
+        return tuple(Session.execute(select(func.min(Book.rawid), func.max(Book.rawid))).one())
+
+    # Returns {bucket: (count, checksum)} for the buckets of `width` ids that [low, high) is split into
+    def get_range_checksums(self, low: int, high: int, width: int) -> dict[int, tuple[int, int]]:
+        # The content hash of get_content_hash, genres sorted by code point like Python does
+        content_hash = (
+            f"('x' || substr(md5(concat_ws(:separator, rawid, title, author, year, array_to_string("
+            f"ARRAY(SELECT genre FROM unnest(genre_list) AS genre ORDER BY genre COLLATE \"C\"), ','))), "
+            f"1, {CONTENT_HASH_HEX_DIGITS}))::bit({CONTENT_HASH_HEX_DIGITS * 4})::bigint + 1"
+        )
+        rows = Session.execute(text(
+            f"SELECT (rawid - :low) / :width AS bucket, count(*), "
+            f"sum(mod(({content_hash}) * (price::bigint + {PRICE_OFFSET}), {CHECKSUM_MODULUS})) "
+            f"FROM {DB_TABLE_NAME} WHERE rawid >= :low AND rawid < :high GROUP BY bucket"
+        ), {"low": low, "high": high, "width": width, "separator": CONTENT_HASH_SEPARATOR})
+        return {bucket: (count, int(checksum)) for bucket, count, checksum in rows}
 
-        if book_filter_parameters.price_less_than is not None:
-            query = query.filter(Book.price < book_filter_parameters.price_less_than)
+    def get_books_in_id_range(self, low: int, high: int) -> List[BookDTO]:
+        rows = Session.execute(select(*BOOK_ROW_COLUMNS).where(Book.rawid >= low, Book.rawid < high))
+        return [get_book_dto_from_row(row) for row in rows]
 
-        if book_filter_parameters.year_bigger_than is not None:
-            query = query.filter(Book.year > book_filter_parameters.year_bigger_than)
+    def commit(self):
+        Session.commit()
 
-        if book_filter_parameters.year_less_than is not None:
-            query = query.filter(Book.year < book_filter_parameters.year_less_than)
+    def rollback(self):
+        Session.rollback()
 
-        if book_filter_parameters.genres:
-            genre_filters = [Book.genres.contains(genre) for genre in book_filter_parameters.genres]
-            if len(genre_filters) == 1:
-                query = query.filter(genre_filters[0])  # Directly filter with the single condition
-            else:
-                query = query.filter(or_(*genre_filters))  # Use `or_` for multiple conditions
+    def close_session(self):
+        remove_session()
 
-        # Execute the query and fetch results
-        filtered_books: List[Book] = query.all()  # Corrected type hint
+    def get_books(self, book_filter_parameters: BookFilterParametersDTO,
+                  book_page_parameters: BookPageParametersDTO | None = None) -> List[BookDTO]:
+        query = build_books_query(book_filter_parameters, book_page_parameters)
 
         # Map to DTOs
-        filtered_books_dto = [
-            get_book_dto(filtered_book) for filtered_book in filtered_books
-        ]
+        return [get_book_dto_from_row(row) for row in Session.execute(query)]
+
+    def iter_books(self, book_filter_parameters: BookFilterParametersDTO,
+                   book_page_parameters: BookPageParametersDTO | None = None) -> Iterator[BookDTO]:
+        query = build_books_query(book_filter_parameters, book_page_parameters)
 
-        return filtered_books_dto
+        # Server-side cursor, rows are fetched STREAM_BATCH_SIZE at a time
+        for row in Session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE)):
+            yield get_book_dto_from_row(row)
@@ -0,0 +1,80 @@
+import os
+import threading
+from typing import List
+
+from sqlalchemy import text
+
+from repository.postgres_book_repository import DB_TABLE_NAME, engine
+
+# Id allocation configuration
+ID_SEQUENCE_NAME = "books_rawid_hilo_seq"
+ID_BLOCK_SIZE = int(os.environ.get("BOOK_ID_BLOCK_SIZE", "50"))
+
+
+def ensure_id_sequence(block_size: int) -> int:
+    with engine.begin() as connection:
+        max_id = connection.execute(text(f"SELECT coalesce(max(rawid), 0) FROM {DB_TABLE_NAME}")).scalar()
+        connection.execute(text(
+            f"CREATE SEQUENCE IF NOT EXISTS {ID_SEQUENCE_NAME} INCREMENT BY {block_size} START WITH {max_id + 1}"
+        ))
+        # The sequence may have been created by a process configured with another block size
+        block_size = connection.execute(text(
+            "SELECT increment_by FROM pg_sequences WHERE sequencename = :sequence_name"
+        ), {"sequence_name": ID_SEQUENCE_NAME}).scalar()
+
+        # Ids written by the old per-process counters may be ahead of an existing sequence. The last block
+        # handed out, [last_value, last_value + block_size), may still be in use by a running process, so the
+        # sequence only moves when the ids in the table are past the end of it.
+        connection.execute(text(
+            f"SELECT setval('{ID_SEQUENCE_NAME}', :next_id, false) FROM {ID_SEQUENCE_NAME} "
+            f"WHERE CASE WHEN is_called THEN last_value + :block_size ELSE last_value END <= :max_id"
+        ), {"next_id": max_id + 1, "max_id": max_id, "block_size": block_size})
+
+        return block_size
+
+
+# Hi/lo id allocation shared by every process and both stores. Each nextval() of the sequence
+# reserves a block of block_size ids [hi, hi + block_size), which the process then hands out from
+# memory, so most creates don't need a round trip for their id.
+class PostgresIdAllocator:
+    def __init__(self, block_size: int = ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self.next_id = 0
+        self.block_end = 0
+        self.reserved_block_starts: List[int] = []
+        self.lock = threading.Lock()
+
+    # Creates the sequence, run by BookLogic's start-up once the database is reachable
+    def prepare(self):
+        with self.lock:
+            self.block_size = ensure_id_sequence(self.block_size)
+
+    def allocate_id(self) -> int:
+        return self.allocate_ids(1)[0]
+
+    def allocate_ids(self, count: int) -> List[int]:
+        with self.lock:
+            ids = []
+            while len(ids) < count:
+                if self.next_id >= self.block_end:
+                    if not self.reserved_block_starts:
+                        missing_ids = count - len(ids)
+                        self._reserve_blocks(-(-missing_ids // self.block_size))
+
+                    self.next_id = self.reserved_block_starts.pop(0)
+                    self.block_end = self.next_id + self.block_size
+
+                taken = min(count - len(ids), self.block_end - self.next_id)
+                ids.extend(range(self.next_id, self.next_id + taken))
+                self.next_id += taken
+
+            return ids
+
+    def _reserve_blocks(self, blocks_count: int):
+        # One round trip reserves every block a bulk create needs
+        with engine.connect() as connection:
+            block_starts = connection.execute(text(
+                f"SELECT nextval('{ID_SEQUENCE_NAME}') FROM generate_series(1, :blocks_count)"
+            ), {"blocks_count": blocks_count}).scalars().all()
+
+        self.reserved_block_starts.extend(sorted(block_starts))
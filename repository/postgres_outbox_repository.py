@@ -0,0 +1,117 @@
+import datetime
+from typing import List
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text, func, insert, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from repository.postgres_book_repository import Base, Session, engine
+
+OUTBOX_TABLE_NAME = "book_outbox"
+OUTBOX_DEAD_LETTER_TABLE_NAME = "book_outbox_dead_letters"
+# Arbitrary application-wide key, held by the single process that drains the outbox
+OUTBOX_DRAIN_LOCK_KEY = 4785
+
+
+# Mongo writes waiting to be replicated, committed in the same transaction as the Postgres write
+class OutboxEvent(Base):
+    __tablename__ = OUTBOX_TABLE_NAME
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    operation = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(Text, nullable=True)
+
+
+# Events the replicator gave up on after too many attempts, kept for inspection and manual replay
+class OutboxDeadLetter(Base):
+    __tablename__ = OUTBOX_DEAD_LETTER_TABLE_NAME
+
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    operation = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    dead_lettered_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# Shared with AsyncPostgresOutboxRepository
+def get_insert_events_statement(operation: str, payloads: List[dict]):
+    return insert(OutboxEvent).values([{"operation": operation, "payload": payload} for payload in payloads])
+
+
+def get_lag_query():
+    return select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at), func.max(OutboxEvent.attempts),
+                  select(func.count(OutboxDeadLetter.id)).scalar_subquery())
+
+
+def get_lag(pending_events: int, oldest_created_at: datetime.datetime | None, max_attempts: int | None,
+            dead_letter_events: int) -> dict:
+    lag_seconds = 0.0
+    if oldest_created_at is not None:
+        lag_seconds = (datetime.datetime.now(datetime.timezone.utc) - oldest_created_at).total_seconds()
+
+    return {
+        "pendingEvents": pending_events,
+        "lagSeconds": lag_seconds,
+        "maxAttempts": max_attempts or 0,
+        "deadLetterEvents": dead_letter_events
+    }
+
+
+class PostgresOutboxRepository:
+    def prepare(self):
+        Base.metadata.create_all(engine, tables=[OutboxEvent.__table__, OutboxDeadLetter.__table__])
+        # The id of the writing transaction, outboxes created before it existed get the column here
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {OUTBOX_TABLE_NAME} ADD COLUMN IF NOT EXISTS xact_id xid8 "
+                                    f"NOT NULL DEFAULT pg_current_xact_id()"))
+
+    # Adds to the current transaction, the caller commits it together with its Postgres write
+    def add_events(self, operation: str, payloads: List[dict]):
+        if payloads:
+            Session.execute(get_insert_events_statement(operation, payloads))
+
+    # Only one process drains the outbox at a time, so events are replicated in commit order.
+    # The lock is released when the current transaction ends.
+    def try_lock_drain(self) -> bool:
+        return Session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                               {"key": OUTBOX_DRAIN_LOCK_KEY}).scalar()
+
+    # Ids are taken before commit, so a lower id can still be in flight after a higher one committed.
+    # Only events of transactions older than every running one are read, so an event never overtakes
+    # one of a transaction that started writing before it.
+    def fetch_events(self, limit: int) -> List[OutboxEvent]:
+        return (Session.query(OutboxEvent)
+                .filter(text("xact_id < pg_snapshot_xmin(pg_current_snapshot())"))
+                .order_by(OutboxEvent.id)
+                .limit(limit)
+                .all())
+
+    def delete_events(self, event_ids: List[int]):
+        if event_ids:
+            Session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)).delete(synchronize_session=False)
+
+    def record_failure(self, event: OutboxEvent, error: Exception):
+        event.attempts += 1
+        event.last_error = repr(error)
+
+    def dead_letter_event(self, event: OutboxEvent):
+        Session.execute(insert(OutboxDeadLetter).values(id=event.id,
+                                                        operation=event.operation,
+                                                        payload=event.payload,
+                                                        created_at=event.created_at,
+                                                        attempts=event.attempts,
+                                                        last_error=event.last_error))
+        Session.delete(event)
+
+    def get_lag(self) -> dict:
+        return get_lag(*Session.execute(get_lag_query()).one())
+
+    def commit(self):
+        Session.commit()
+
+    def rollback(self):
+        Session.rollback()
@@ -0,0 +1,32 @@
+import pytest
+
+from repository.book_search import (get_book_substring_trigrams, get_search_relevance, get_similarity,
+                                    get_substring_trigrams, get_trigrams)
+
+
+# Expected values are the ones pg_trgm's show_trgm and similarity return
+def test_trigrams_pad_every_word_like_pg_trgm():
+    assert get_trigrams("Word") == {"  w", " wo", "wor", "ord", "rd "}
+    assert get_trigrams("k 1") == {"  k", " k ", "  1", " 1 "}
+    assert get_trigrams("a-b_c") == {"  a", " a ", "  b", " b ", "  c", " c "}
+    assert get_trigrams("!!") == set()
+
+
+def test_similarity_matches_pg_trgm():
+    assert get_similarity(get_trigrams("dune"), "dune messiah") == pytest.approx(5 / 13)
+    assert get_similarity(get_trigrams("dune"), "Dune") == 1
+    assert get_similarity(get_trigrams("!!"), "??") == 0
+
+
+@pytest.mark.parametrize("query", ["k 1", "of dune", "e. h", "k. le"])
+def test_query_substring_trigrams_are_looked_up_by_the_book_ones(query):
+    book_trigrams = get_book_substring_trigrams("Book 12 of Dune", "Ursula K. Le Guin, Frank E. Herbert")
+    assert get_substring_trigrams(query) <= book_trigrams
+
+
+def test_relevance_ranks_prefix_matches_first():
+    query_trigrams = get_trigrams("dune")
+    prefix_relevance = get_search_relevance("dune", query_trigrams, "Dune Messiah", "Frank Herbert")
+    contains_relevance = get_search_relevance("dune", query_trigrams, "Children of Dune", "Frank Herbert")
+    assert prefix_relevance > 1 > contains_relevance > 0
+    assert get_search_relevance("dune", query_trigrams, "Akira", "Katsuhiro Otomo") is None
@@ -0,0 +1,202 @@
+import random
+
+import pytest
+
+from dto.book_dto import BookDTO
+from dto.book_filter_parameters_dto import BookFilterParametersDTO
+from dto.book_page_parameters_dto import BookPageParametersDTO
+from repository.memory_book_repository import MemoryBookRepository, get_bitset, iter_bitset_slots
+
+AUTHORS = ["Frank Herbert", "Ursula K. Le Guin", "Katsuhiro Otomo", "Ann Leckie"]
+GENRES = ["SCI_FI", "NOVEL", "HISTORY", "MANGA", "ROMANCE", "PROFESSIONAL"]
+
+
+def get_filter(author=None, price_bigger_than=None, price_less_than=None, year_bigger_than=None,
+               year_less_than=None, genres=None) -> BookFilterParametersDTO:
+    return BookFilterParametersDTO(author=author,
+                                   price_bigger_than=price_bigger_than,
+                                   price_less_than=price_less_than,
+                                   year_bigger_than=year_bigger_than,
+                                   year_less_than=year_less_than,
+                                   genres=genres)
+
+
+def get_random_books(count: int, seed: int = 0) -> list[BookDTO]:
+    rng = random.Random(seed)
+    return [BookDTO(id=index + 1,
+                    title=f"Book {index} of {rng.choice(['Dune', 'Akira', 'Ancillary'])}",
+                    author=rng.choice(AUTHORS),
+                    year=rng.randint(1940, 2100),
+                    price=rng.randint(0, 500),
+                    genres=rng.sample(GENRES, rng.randint(1, 2)))
+            for index in range(count)]
+
+
+# The books a filter must return, checked one by one in listing order
+def get_expected_ids(books: list[BookDTO], book_filter: BookFilterParametersDTO) -> list[int]:
+    matching_books = [
+        book for book in books
+        if (book_filter.author is None or book.author.lower() == book_filter.author.lower())
+        and (book_filter.genres is None or any(genre in book.genres for genre in book_filter.genres))
+        and (book_filter.price_bigger_than is None or book.price > book_filter.price_bigger_than)
+        and (book_filter.price_less_than is None or book.price < book_filter.price_less_than)
+        and (book_filter.year_bigger_than is None or book.year > book_filter.year_bigger_than)
+        and (book_filter.year_less_than is None or book.year < book_filter.year_less_than)
+    ]
+    return [book.id for book in sorted(matching_books, key=lambda book: (book.title.lower(), book.id))]
+
+
+def get_ids(books: list[BookDTO]) -> list[int]:
+    return [book.id for book in books]
+
+
+FILTERS = [
+    get_filter(),
+    get_filter(author="frank HERBERT"),
+    get_filter(author="Nobody"),
+    get_filter(genres=["MANGA"]),
+    get_filter(genres=["MANGA", "ROMANCE"]),
+    get_filter(price_bigger_than=100),
+    get_filter(price_less_than=100),
+    get_filter(price_bigger_than=100, price_less_than=120),
+    get_filter(price_bigger_than=300, price_less_than=200),
+    get_filter(year_bigger_than=1990, year_less_than=2000),
+    get_filter(author="Ann Leckie", genres=["SCI_FI", "NOVEL"], price_less_than=250),
+    get_filter(author="Katsuhiro Otomo", price_bigger_than=50, year_bigger_than=1980, year_less_than=2050),
+    get_filter(genres=["HISTORY"], price_bigger_than=0, price_less_than=500, year_less_than=2100)
+]
+
+
+@pytest.fixture(params=["load", "create"])
+def repository_and_books(request) -> tuple[MemoryBookRepository, list[BookDTO]]:
+    # The warm-up builds the indexes in bulk, writes one book at a time, both must give the same answers
+    books = get_random_books(300)
+    repository = MemoryBookRepository()
+    if request.param == "load":
+        repository.load(books)
+    else:
+        repository.create_books(books)
+    return repository, books
+
+
+def test_bitset_round_trip():
+    slots = [0, 1, 63, 64, 65, 127, 128, 1000]
+    assert list(iter_bitset_slots(get_bitset(slots))) == slots
+    assert list(iter_bitset_slots(get_bitset([]))) == []
+
+
+@pytest.mark.parametrize("book_filter", FILTERS)
+def test_filter_combinations(repository_and_books, book_filter):
+    repository, books = repository_and_books
+    assert get_ids(repository.get_books(book_filter)) == get_expected_ids(books, book_filter)
+
+
+def test_keyset_pages_cover_the_listing(repository_and_books):
+    repository, books = repository_and_books
+    book_filter = get_filter(price_less_than=300)
+    page_ids = []
+    after_title, after_id = None, None
+    while True:
+        page = repository.get_books(book_filter, BookPageParametersDTO(limit=7, after_title=after_title,
+                                                                       after_id=after_id, fields=None))
+        if not page:
+            break
+        page_ids += get_ids(page)
+        after_title, after_id = page[-1].title.lower(), page[-1].id
+
+    assert page_ids == get_expected_ids(books, book_filter)
+
+
+def test_price_update_moves_the_price_index_entry(repository_and_books):
+    repository, books = repository_and_books
+    book = books[0]
+    old_price = book.price
+    new_price = 1000 if old_price < 1000 else 0
+
+    repository.update_book_price(book.id, new_price)
+    book.price = new_price
+
+    assert book.id in get_ids(repository.get_books(get_filter(price_bigger_than=999)))
+    assert book.id not in get_ids(repository.get_books(get_filter(price_bigger_than=old_price - 1,
+                                                                  price_less_than=old_price + 1)))
+    assert repository.get_book_by_id(book.id).price == new_price
+    for book_filter in FILTERS:
+        assert get_ids(repository.get_books(book_filter)) == get_expected_ids(books, book_filter)
+
+
+def test_price_update_of_a_missing_book_changes_nothing(repository_and_books):
+    repository, books = repository_and_books
+    repository.update_book_price(10 ** 6, 42)
+    for book_filter in FILTERS:
+        assert get_ids(repository.get_books(book_filter)) == get_expected_ids(books, book_filter)
+
+
+def test_delete_removes_the_book_from_every_index(repository_and_books):
+    repository, books = repository_and_books
+    deleted_book = books.pop(5)
+
+    assert repository.delete_book_by_id(deleted_book.id) == len(books)
+    assert repository.delete_book_by_id(deleted_book.id) is None
+    assert repository.get_book_by_id(deleted_book.id) is None
+    assert repository.get_book_by_title(deleted_book.title.upper()) is None
+    assert repository.get_books_total() == len(books)
+    assert deleted_book.id not in get_ids(repository.search_books(deleted_book.title, 10))
+    for book_filter in FILTERS + [get_filter(author=deleted_book.author, genres=deleted_book.genres,
+                                             price_bigger_than=deleted_book.price - 1,
+                                             price_less_than=deleted_book.price + 1)]:
+        assert get_ids(repository.get_books(book_filter)) == get_expected_ids(books, book_filter)
+
+
+def test_reused_slot_starts_clean(repository_and_books):
+    repository, books = repository_and_books
+    deleted_book = books.pop(0)
+    repository.delete_book_by_id(deleted_book.id)
+
+    # The new book takes the freed slot, none of the deleted book's index entries may point at it
+    new_book = BookDTO(id=10 ** 6, title="A brand new title", author="Someone Else", year=1941, price=1,
+                       genres=["PROFESSIONAL"])
+    assert repository.create_book(new_book).id == new_book.id
+    books.append(new_book)
+
+    assert get_ids(repository.get_books(get_filter(author=deleted_book.author))) == \
+        get_expected_ids(books, get_filter(author=deleted_book.author))
+    assert get_ids(repository.get_books(get_filter(author="someone else"))) == [new_book.id]
+    assert get_ids(repository.search_books("brand new", 10)) == [new_book.id]
+    for book_filter in FILTERS:
+        assert get_ids(repository.get_books(book_filter)) == get_expected_ids(books, book_filter)
+
+
+def test_create_rejects_existing_titles_and_ids():
+    repository = MemoryBookRepository()
+    book = BookDTO(id=1, title="Dune", author="Frank Herbert", year=1965, price=30, genres=["SCI_FI"])
+    assert repository.create_book(book) is not None
+    assert repository.create_book(BookDTO(id=2, title="DUNE", author="X", year=2000, price=1,
+                                          genres=["NOVEL"])) is None
+    assert repository.create_book(BookDTO(id=1, title="Other", author="X", year=2000, price=1,
+                                          genres=["NOVEL"])) is None
+    assert repository.get_books_total() == 1
+
+
+def test_search_matches_substrings_of_titles_and_authors(repository_and_books):
+    repository, books = repository_and_books
+    for query in ["akira", "K 1", "Leckie", "of dun", "book 12"]:
+        lower_query = query.lower()
+        expected_ids = {book.id for book in books
+                        if lower_query in book.title.lower() or lower_query in book.author.lower()}
+        assert set(get_ids(repository.search_books(query, len(books)))) == expected_ids
+
+    assert repository.search_books("no such book", 10) == []
+
+
+def test_stats_follow_writes(repository_and_books):
+    repository, books = repository_and_books
+    repository.update_book_price(books[0].id, 499)
+    books[0].price = 499
+    repository.delete_book_by_id(books.pop().id)
+
+    stats = repository.get_book_stats(50, 10, 2)
+    assert stats.total == len(books)
+    assert sum(stats.price_counts.values()) == len(books)
+    assert stats.price_counts.get(450) == sum(1 for book in books if 450 <= book.price < 500)
+    assert stats.genre_counts == {genre: sum(1 for book in books if genre in book.genres)
+                                  for genre in GENRES if any(genre in book.genres for book in books)}